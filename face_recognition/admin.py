@@ -1,5 +1,14 @@
-from django.contrib import admin
-from .models import Class, Student, Attendance, AttendanceSession
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils.translation import ngettext
+
+from . import analytics
+from .dashboard import bump_for_classes
+from .db import update_in_batches
+from .large_tables import EstimatedCountPaginator, SeekingQuerySet
+from .models import Class, Person, Student, Attendance, AttendanceSession, RosterImport, RosterImportRow
+from .signals import attendance_deleted
 
 # Register your models here.
 
@@ -7,23 +16,116 @@ from .models import Class, Student, Attendance, AttendanceSession
 class ClassAdmin(admin.ModelAdmin):
     list_display = ['title', 'time', 'enrollment_code', 'created_by', 'created_at']
     list_filter = ['created_at', 'created_by']
+    list_select_related = ['created_by']
     search_fields = ['title', 'enrollment_code']
     readonly_fields = ['enrollment_code']
 
+@admin.register(Person)
+class PersonAdmin(admin.ModelAdmin):
+    list_display = ['name', 'student_id', 'email', 'template_enrolled_at', 'created_at']
+    list_filter = ['template_enrolled_at']
+    search_fields = ['name', 'student_id', 'email']
+
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
     list_display = ['name', 'student_id', 'email', 'class_enrolled', 'registered_at']
     list_filter = ['class_enrolled', 'registered_at']
+    list_select_related = ['class_enrolled']
     search_fields = ['name', 'student_id', 'email']
+    ordering = ['-registered_at', '-id']
+    raw_id_fields = ['person', 'class_enrolled']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
 
 @admin.register(AttendanceSession)
 class AttendanceSessionAdmin(admin.ModelAdmin):
     list_display = ['class_session', 'date', 'time', 'method', 'processing_status', 'created_by']
     list_filter = ['method', 'processing_status', 'date']
+    list_select_related = ['class_session', 'created_by']
     search_fields = ['class_session__title']
 
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
+    """
+    Sized for tens of millions of rows: related objects are joined, counts
+    are estimated and the date hierarchy seeks its index (large_tables.py),
+    every filter has an index, and the bulk actions update in batched
+    set-based queries
+    """
     list_display = ['student', 'class_session', 'date', 'time', 'status', 'marked_by']
-    list_filter = ['status', 'marked_by', 'date', 'class_session']
+    list_filter = ['status', 'marked_by', 'class_session']
+    list_select_related = ['student', 'class_session']
     search_fields = ['student__name', 'student__student_id']
+    date_hierarchy = 'date'
+    ordering = ['-date', '-id']
+    raw_id_fields = ['student', 'class_session', 'attendance_session']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    actions = ['mark_present', 'mark_absent', 'mark_late']
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return SeekingQuerySet(model=queryset.model, query=queryset.query, using=queryset.db)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Match students first; Attendance is then reached through its (student, ...) unique index"""
+        if not search_term:
+            return queryset, False
+        students = Student.objects.filter(
+            Q(name__icontains=search_term) | Q(student_id__icontains=search_term)
+        ).values('pk')
+        return queryset.filter(student__in=students), False
+
+    def delete_model(self, request, obj):
+        # Attendance has no delete signal receivers (see signals.py)
+        with transaction.atomic():
+            attendance_deleted(Attendance.objects.filter(pk=obj.pk))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            attendance_deleted(queryset)
+            super().delete_queryset(request, queryset)
+
+    def _set_status(self, request, queryset, status):
+        classes = Class.objects.filter(Exists(queryset.filter(class_session=OuterRef('pk')).order_by()))
+        class_ids = list(classes.values_list('id', flat=True))
+        months = analytics.class_months(queryset)
+        updated = update_in_batches(queryset, status=status)
+        # Set-based updates send no signals
+        bump_for_classes('attendance', class_ids)
+        analytics.invalidate(months)
+        self.message_user(request, ngettext(
+            '%(count)d attendance record marked %(status)s.',
+            '%(count)d attendance records marked %(status)s.',
+            updated,
+        ) % {'count': updated, 'status': status}, messages.SUCCESS)
+
+    @admin.action(description='Mark selected records present', permissions=['change'])
+    def mark_present(self, request, queryset):
+        self._set_status(request, queryset, 'present')
+
+    @admin.action(description='Mark selected records absent', permissions=['change'])
+    def mark_absent(self, request, queryset):
+        self._set_status(request, queryset, 'absent')
+
+    @admin.action(description='Mark selected records late', permissions=['change'])
+    def mark_late(self, request, queryset):
+        self._set_status(request, queryset, 'late')
+
+class RosterImportRowInline(admin.TabularInline):
+    model = RosterImportRow
+    fields = ['line_number', 'student', 'status', 'error']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+@admin.register(RosterImport)
+class RosterImportAdmin(admin.ModelAdmin):
+    list_display = ['class_enrolled', 'status', 'total', 'enrolled', 'failed', 'created_by', 'created_at']
+    list_filter = ['status', 'created_at']
+    list_select_related = ['class_enrolled', 'created_by']
+    readonly_fields = ['total', 'enrolled', 'failed', 'started_at', 'finished_at', 'elapsed_seconds']
+    inlines = [RosterImportRowInline]
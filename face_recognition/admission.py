@@ -0,0 +1,240 @@
+"""
+Cross-process admission control for face service calls
+
+Every FaceAPIClient request takes a slot in its pool before it is sent:
+    heavy   mark_attendance and enrollment uploads (seconds of GPU time)
+    light   everything else (pose frames, session start/complete, links)
+Each pool has its own limit (FACE_API_ADMISSION), so a roll-call burst can
+fill the heavy pool without delaying light calls.
+
+Slots are lock files in FACE_API_ADMISSION_DIR, held with flock for the
+length of the call, so every worker process on the host shares them, and a
+crashed process releases its slots. Callers that find no free slot join the
+pool's wait queue (a JSON file guarded by another lock). The queue is served
+round-robin by owner (the lecturer): each call is stamped with the round
+after its owner's previous call and served in round order, so one
+lecturer's burst can't starve the others. When the queue is full, or a
+caller has waited max_wait seconds, FaceServiceBusy is raised at once with
+a retry-after estimate based on the pool's recent call durations.
+
+On platforms without fcntl, calls are admitted without limits.
+"""
+import contextlib
+import json
+import math
+import os
+import tempfile
+import time
+import uuid
+
+import requests
+from django.conf import settings
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DEFAULT_POOLS = {
+    'heavy': {'max_in_flight': 4, 'max_queue': 32, 'max_wait': 30},
+    'light': {'max_in_flight': 16, 'max_queue': 64, 'max_wait': 5},
+}
+
+POLL_INTERVAL = 0.02
+DURATION_SMOOTHING = 0.2  # Weight of the newest call in the pool's average duration
+
+
+class FaceServiceBusy(requests.exceptions.RequestException):
+    """The face service pool is saturated; try again after retry_after seconds"""
+
+    def __init__(self, pool, retry_after, reason):
+        self.pool = pool
+        self.retry_after = retry_after
+        self.reason = reason
+        super().__init__(f'Face service is busy ({pool} calls, {reason}); retry in {retry_after}s')
+
+
+def pool_config(pool):
+    """Limits for a pool, or None when admission control is off"""
+    pools = getattr(settings, 'FACE_API_ADMISSION', DEFAULT_POOLS)
+    if not pools or fcntl is None:
+        return None
+    return pools.get(pool)
+
+
+def _directory():
+    path = getattr(settings, 'FACE_API_ADMISSION_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'identiface-face-admission'
+    )
+    os.makedirs(path, exist_ok=True)
+    return str(path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def fair_order(waiting):
+    """Ticket ids in serving order: by round, then by arrival"""
+    return [t['id'] for t in sorted(waiting, key=lambda t: (t['round'], t['since']))]
+
+
+def next_round(state, owner):
+    """
+    Round for a new call by `owner`: one after the owner's previous call,
+    but never before the round currently being served
+    """
+    rounds = state.setdefault('owners', {})
+    current = state.setdefault('round', 0)
+    number = max(current, rounds.get(owner, current - 1) + 1)
+    rounds[owner] = number
+    # Owners behind the current round need no memory
+    state['owners'] = {o: n for o, n in rounds.items() if n >= current}
+    return number
+
+
+class _Pool:
+    """Slot files and wait queue of one pool"""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.limit = config['max_in_flight']
+        self.max_queue = config['max_queue']
+        self.max_wait = config['max_wait']
+        directory = _directory()
+        self.lock_path = os.path.join(directory, f'{name}.lock')
+        self.state_path = os.path.join(directory, f'{name}.queue.json')
+        self.slot_paths = [os.path.join(directory, f'{name}-{n}.slot') for n in range(self.limit)]
+
+    @contextlib.contextmanager
+    def state(self):
+        """The pool's queue state, locked against every other process"""
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.state_path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {'waiting': [], 'avg_seconds': None, 'round': 0, 'owners': {}}
+            before = json.dumps(state, sort_keys=True)
+
+            # Drop tickets whose caller died without leaving the queue
+            stale = time.time() - 2 * self.max_wait - 5
+            state['waiting'] = [
+                t for t in state['waiting'] if t['since'] > stale and _alive(t['pid'])
+            ]
+            yield state
+
+            if json.dumps(state, sort_keys=True) != before:
+                tmp = f'{self.state_path}.{os.getpid()}.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump(state, f)
+                os.replace(tmp, self.state_path)
+
+    def free_slots(self):
+        """Lock every free slot; the caller keeps one and closes the rest"""
+        held = []
+        for path in self.slot_paths:
+            f = open(path, 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+            else:
+                held.append(f)
+        return held
+
+    def claim(self, state, ticket_id=None):
+        """A held slot file if this caller may run now, else None"""
+        if ticket_id is None and state['waiting']:
+            return None
+        free = self.free_slots()
+        position = fair_order(state['waiting']).index(ticket_id) if ticket_id else 0
+        slot = free.pop() if position < len(free) else None
+        for f in free:
+            f.close()
+        return slot
+
+    def retry_after(self, state):
+        average = state['avg_seconds'] or 1.0
+        return max(1, math.ceil((len(state['waiting']) + 1) / self.limit * average))
+
+    def reject(self, state, reason):
+        metrics.inc('face_admission_rejected_total', pool=self.name, reason=reason)
+        return FaceServiceBusy(self.name, self.retry_after(state), reason)
+
+
+@contextlib.contextmanager
+def admit(pool, owner=None):
+    """
+    Hold a slot in `pool` for the duration of the block
+
+    Raises:
+        FaceServiceBusy: the queue is full, or no slot freed up within the
+            pool's max_wait seconds
+    """
+    config = pool_config(pool)
+    if config is None:
+        yield
+        return
+
+    limiter = _Pool(pool, config)
+    owner = str(owner)
+    started = time.monotonic()
+    with limiter.state() as state:
+        slot = limiter.claim(state)
+        if slot is not None:
+            state['round'] = next_round(state, owner)
+        elif len(state['waiting']) >= limiter.max_queue:
+            raise limiter.reject(state, 'queue_full')
+        else:
+            ticket = {
+                'id': uuid.uuid4().hex, 'owner': owner, 'round': next_round(state, owner),
+                'pid': os.getpid(), 'since': time.time(),
+            }
+            state['waiting'].append(ticket)
+
+    try:
+        while slot is None:
+            time.sleep(POLL_INTERVAL)
+            with limiter.state() as state:
+                if ticket['id'] not in {t['id'] for t in state['waiting']}:
+                    state['waiting'].append(ticket)  # Pruned while this process was stalled
+                slot = limiter.claim(state, ticket['id'])
+                timed_out = slot is None and time.monotonic() - started >= limiter.max_wait
+                if slot is not None:
+                    state['round'] = max(state.get('round', 0), ticket['round'])
+                if slot is not None or timed_out:
+                    state['waiting'] = [t for t in state['waiting'] if t['id'] != ticket['id']]
+                busy = limiter.reject(state, 'timeout') if timed_out else None
+            if busy:
+                raise busy
+    except BaseException:
+        if slot is None:
+            with contextlib.suppress(OSError), limiter.state() as state:
+                state['waiting'] = [t for t in state['waiting'] if t['id'] != ticket['id']]
+        raise
+
+    metrics.observe('face_admission_wait_seconds', time.monotonic() - started, pool=pool)
+    call_started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - call_started
+        try:
+            with limiter.state() as state:
+                previous = state['avg_seconds']
+                state['avg_seconds'] = elapsed if previous is None else (
+                    DURATION_SMOOTHING * elapsed + (1 - DURATION_SMOOTHING) * previous
+                )
+        finally:
+            slot.close()
@@ -0,0 +1,196 @@
+"""
+Attendance analytics aggregates for the lecturer JSON API
+
+Every figure is derived from attendance counts bucketed by (student,
+weekday, status, marked_by). Buckets are cached per class and month, one
+entry holding the month's days cached so far, so the number of keys stays
+bounded and any date range, including the rolling default window, reuses
+the days already cached and queries only the missing ones (in one grouped
+query). Today is always queried.
+
+Past attendance can still change (admin edits, bulk status actions), so
+each cached day carries the version stamp of its (class, month). Every
+write path calls invalidate() for the months it touched: the Attendance
+signals, record_attendance and the admin's set-based updates. The stamps
+work like the dashboard's (dashboard.py) and need a shared cache with
+several worker processes.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Attendance
+
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+STATUSES = ['present', 'absent', 'late']
+METHODS = ['facial', 'manual']
+
+
+def _version_key(class_id, month):
+    return f"analytics:version:{class_id}:{month:%Y-%m}"
+
+
+def _month_key(class_id, month, version):
+    return f"analytics:month:{class_id}:{month:%Y-%m}:{version}"
+
+
+def _versions(class_id, months):
+    """Current stamp of each (class, month), creating missing stamps"""
+    keys = {month: _version_key(class_id, month) for month in months}
+    found = cache.get_many(list(keys.values()))
+    versions = {}
+    for month, key in keys.items():
+        if key not in found:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = cache.get(key)
+        versions[month] = found[key]
+    return versions
+
+
+def invalidate(class_days, using=None):
+    """
+    Drop cached buckets for the months of these (class_id, date) pairs once
+    the current transaction commits
+    """
+    keys = {_version_key(class_id, day.replace(day=1)) for class_id, day in class_days}
+    if keys:
+        transaction.on_commit(
+            lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None), using=using
+        )
+
+
+def class_months(queryset):
+    """(class_id, month) pairs with rows in an Attendance queryset, to invalidate() after a set-based write"""
+    months = queryset.order_by().annotate(month=TruncMonth('date')).values_list('class_session_id', 'month')
+    return list(months.distinct())
+
+
+def _query_days(class_id, start, end):
+    """
+    Run the grouped aggregate query for one class over [start, end]
+
+    Returns:
+        dict: date -> [student_id, iso_weekday, status, marked_by, count]
+            rows, for every day in the range (empty for days without attendance)
+    """
+    days = {start + timedelta(days=n): [] for n in range((end - start).days + 1)}
+    rows = (
+        Attendance.objects
+        .filter(class_session_id=class_id, date__range=(start, end))
+        .values_list('date', 'student_id', 'status', 'marked_by')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for day, student_id, status, method, n in rows:
+        days[day].append([student_id, day.isoweekday(), status, method, n])
+    return days
+
+
+def get_buckets(class_id, start, end):
+    """
+    Get attendance buckets for a class, caching the days before today
+
+    The cached months are read in one get_many; the missing days are
+    queried together (from the first to the last missing day) and added to
+    their months' entries.
+    """
+    today = timezone.now().date()
+    end = min(end, today)
+    if start > end:
+        return []
+
+    buckets = []
+    closed_end = min(end, today - timedelta(days=1))
+    if start <= closed_end:
+        days = [start + timedelta(days=n) for n in range((closed_end - start).days + 1)]
+        months = {day.replace(day=1) for day in days}
+        versions = _versions(class_id, months)
+        keys = {month: _month_key(class_id, month, versions[month]) for month in months}
+        cached = cache.get_many(list(keys.values()))
+        entries = {month: cached.get(keys[month], {}) for month in months}  # month -> {date: rows}
+        missing = [day for day in days if day not in entries[day.replace(day=1)]]
+        if missing:
+            for day, rows in _query_days(class_id, missing[0], missing[-1]).items():
+                entries[day.replace(day=1)][day] = rows
+            changed = {day.replace(day=1) for day in missing}
+            cache.set_many(
+                {keys[month]: entries[month] for month in changed},
+                getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 7 * 24 * 60 * 60),
+            )
+        for day in days:
+            buckets.extend(entries[day.replace(day=1)][day])
+
+    if end == today:
+        buckets.extend(_query_days(class_id, today, today)[today])
+    return buckets
+
+
+def _empty_counts():
+    return {'total': 0, 'status': dict.fromkeys(STATUSES, 0), 'method': dict.fromkeys(METHODS, 0)}
+
+
+def _add(counts, status, method, n):
+    counts['total'] += n
+    counts['status'][status] = counts['status'].get(status, 0) + n
+    counts['method'][method] = counts['method'].get(method, 0) + n
+
+
+def _percent(part, whole):
+    return round(part / whole * 100, 1) if whole > 0 else 0
+
+
+def _summarize(counts):
+    """Turn raw counts into the rate/share figures returned by the API"""
+    total = counts['total']
+    return {
+        'total_marked': total,
+        'present': counts['status']['present'],
+        'absent': counts['status']['absent'],
+        'late': counts['status']['late'],
+        'attendance_rate': _percent(counts['status']['present'], total),
+        'facial_share': _percent(counts['method']['facial'], total),
+        'manual_share': _percent(counts['method']['manual'], total),
+    }
+
+
+def empty_summary():
+    """Summary for a student or class with no attendance in range"""
+    return _summarize(_empty_counts())
+
+
+def summarize_buckets(buckets, student_id=None):
+    """
+    Build overall, weekday and per-student summaries from bucket rows
+
+    Args:
+        buckets: Rows returned by get_buckets
+        student_id: Optional Student primary key to restrict the summary to
+
+    Returns:
+        dict: 'overall', 'weekdays' and 'students' (keyed by Student pk)
+    """
+    overall = _empty_counts()
+    weekdays = {day: _empty_counts() for day in range(1, 8)}
+    students = {}
+
+    for sid, weekday, status, method, n in buckets:
+        if student_id is not None and sid != student_id:
+            continue
+        _add(overall, status, method, n)
+        _add(weekdays[weekday], status, method, n)
+        _add(students.setdefault(sid, _empty_counts()), status, method, n)
+
+    return {
+        'overall': _summarize(overall),
+        'weekdays': {
+            WEEKDAYS[day - 1]: _summarize(counts) for day, counts in weekdays.items()
+        },
+        'students': {sid: _summarize(counts) for sid, counts in students.items()},
+    }
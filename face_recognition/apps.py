@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def restore_student_search_index(sender, using, **kwargs):
+    """Schema changes that rebuild the student table drop the search index triggers"""
+    from .student_search import ensure_index
+    applied = MigrationRecorder(connections[using]).applied_migrations()
+    if (sender.label, '0009_student_search_index') in applied:
+        ensure_index(using)
 
 
 class FaceRecognitionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'face_recognition'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .middleware import install_query_counter
+        connection_created.connect(install_query_counter)
+        post_migrate.connect(restore_student_search_index, sender=self)
@@ -0,0 +1,127 @@
+"""
+Facial attendance recognition, run in the background after photo upload
+
+mark_attendance_facial stores the classroom photos (or the uploaded video
+or burst) on an AttendanceSession and returns at once.
+process_facial_attendance then picks the keyframes of a clip, sends the
+photos to the face service and records the result, moving
+processing_status through
+    pending [-> selecting] -> processing -> saving -> completed | failed
+Every transition goes through session_events.update_status, which the
+live status stream follows.
+"""
+import logging
+import threading
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+
+from .db import atomic_with_retry, record_attendance
+from .keyframes import UnreadableClip, select_keyframes
+from .models import AttendanceSession
+from .session_events import update_status
+
+
+logger = logging.getLogger(__name__)
+
+
+def _select_photos(session):
+    """
+    Save the three keyframes of the session's clip as its photos and
+    delete the clip
+
+    Returns:
+        dict: The photo fields to store with the next status change
+    Raises:
+        UnreadableClip: the clip isn't a readable video or set of images
+    """
+    uploads = [default_storage.open(name) for name in session.clip]
+    try:
+        keyframes = select_keyframes(uploads, k=3)
+    finally:
+        for upload in uploads:
+            upload.close()
+        for name in session.clip:
+            default_storage.delete(name)
+    photos = {}
+    for n, data in enumerate(keyframes, 1):
+        photo = getattr(session, f'photo{n}')
+        photo.save(f'keyframe{n}.jpg', ContentFile(data), save=False)
+        photos[f'photo{n}'] = photo.name
+    return photos
+
+
+def process_facial_attendance(session_id):
+    """Recognise the session's photos and mark the class; returns the session"""
+    from .face_api_client import FaceAPIClient
+
+    session = AttendanceSession.objects.select_related('class_session').get(pk=session_id)
+    class_obj = session.class_session
+    try:
+        selected = {}
+        if session.clip:
+            update_status(session, 'selecting')
+            try:
+                selected = _select_photos(session)
+            except UnreadableClip as e:
+                update_status(session, 'failed', processing_error=str(e)[:255], clip=[])
+                return session
+            selected['clip'] = []
+        update_status(session, 'processing', **selected)
+        photos = [session.photo1, session.photo2, session.photo3]
+        try:
+            for photo in photos:
+                photo.open('rb')
+            result = FaceAPIClient(owner=session.created_by_id).mark_attendance(
+                class_code=class_obj.enrollment_code,
+                image_files=photos
+            )
+        finally:
+            for photo in photos:
+                photo.close()
+
+        if not result['success']:
+            if result.get('retry_after'):
+                error = (f'Face recognition is busy with other classes. '
+                         f'Please try again in {result["retry_after"]} seconds.')
+            else:
+                error = f'Face recognition failed: {result.get("error", "Unknown error")}. Please try manual attendance.'
+            update_status(session, 'failed', processing_error=error[:255])
+            return session
+
+        # Mark students as present based on FastAPI response
+        present_student_ids = set(result.get('present_students', []))
+        statuses = {
+            pk: 'present' if student_id in present_student_ids else 'absent'
+            for pk, student_id in class_obj.students.values_list('id', 'student_id')
+        }
+        update_status(
+            session, 'saving',
+            faces_detected=result.get('total_detected', 0),
+            present_count=sum(status == 'present' for status in statuses.values()),
+            total_students=len(statuses)
+        )
+
+        def save_results():
+            record_attendance(class_obj, session, statuses, 'facial')
+            update_status(session, 'completed', processed=True)
+
+        atomic_with_retry(save_results)
+    except Exception:
+        logger.exception('Facial attendance processing failed for session %s', session_id)
+        update_status(session, 'failed', processing_error='Unexpected error while processing the photos.')
+    return session
+
+
+def start_facial_attendance(session_id):
+    """Process a session in a background thread so the upload request returns at once"""
+    def target():
+        try:
+            process_facial_attendance(session_id)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=target, name=f'facial-attendance-{session_id}', daemon=True)
+    thread.start()
+    return thread
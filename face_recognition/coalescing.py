@@ -0,0 +1,126 @@
+"""
+Coalescing and short-lived caching of idempotent face service reads
+
+read_through() answers a read in one of four ways, counted in
+face_read_requests_total by outcome:
+    hit        a cached result younger than FACE_API_READ_CACHE_TTL
+    stale      a cached result younger than TTL + FACE_API_READ_STALE_TTL;
+               it is returned at once while one background call refreshes it
+    coalesced  another thread in this process is already making the same
+               call; wait for it and share its result
+    miss       make the call
+Results live in the default cache, so with a shared cache backend every
+worker process benefits; coalescing is per process. Only successful
+results are cached. Results are shared between callers and must be treated
+as read-only.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run a function once for every concurrent caller asking for the same key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, fn):
+        """
+        Returns:
+            tuple: (result, shared), where shared is True when the result
+                came from another caller's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+_flight = SingleFlight()
+
+
+def _cache_key(call, key):
+    return f'face_read:{call}:{key}'
+
+
+def _store(call, key, fetch, ttl, stale_ttl):
+    result = fetch()
+    if ttl and result.get('success'):
+        cache.set(_cache_key(call, key), {'result': result, 'fetched_at': time.time()}, ttl + stale_ttl)
+    return result
+
+
+def _refresh(call, key, fetch, ttl, stale_ttl):
+    try:
+        _flight.do(_cache_key(call, key), lambda: _store(call, key, fetch, ttl, stale_ttl))
+    except Exception:
+        logger.exception('Background refresh of %s %s failed', call, key)
+
+
+def read_through(call, key, fetch):
+    """
+    Result of fetch() (a FaceAPIClient result dict) for the read `call` of
+    `key`, served from the cache or a shared in-flight call when possible
+    """
+    ttl = getattr(settings, 'FACE_API_READ_CACHE_TTL', 5)
+    stale_ttl = getattr(settings, 'FACE_API_READ_STALE_TTL', 30)
+
+    entry = cache.get(_cache_key(call, key)) if ttl else None
+    if entry is not None:
+        if time.time() - entry['fetched_at'] < ttl:
+            metrics.inc('face_read_requests_total', call=call, outcome='hit')
+        else:
+            metrics.inc('face_read_requests_total', call=call, outcome='stale')
+            if not _flight.in_flight(_cache_key(call, key)):
+                threading.Thread(
+                    target=_refresh, args=(call, key, fetch, ttl, stale_ttl), daemon=True
+                ).start()
+        return entry['result']
+
+    result, shared = _flight.do(_cache_key(call, key), lambda: _store(call, key, fetch, ttl, stale_ttl))
+    metrics.inc('face_read_requests_total', call=call, outcome='coalesced' if shared else 'miss')
+    return result
+
+
+def forget(call, key):
+    """Drop a cached read after a write changed what it returns"""
+    cache.delete(_cache_key(call, key))
@@ -0,0 +1,136 @@
+"""
+Lecturer dashboard data and the version stamps of its cached fragments
+
+The dashboard template caches three fragments per lecturer: the metric
+tiles, today's absences and the class cards. Each fragment's cache key
+includes version stamps that are replaced whenever the data behind it
+changes (see signals.py), so a cached fragment is never served stale:
+    classes     a Class or Student of the lecturer was saved or deleted
+    attendance  Attendance in one of the lecturer's classes was written
+Stamps live in the default cache. With several worker processes that
+cache must be shared (Redis, Memcached, file or database) so that every
+process sees a bump.
+
+DashboardStats is lazy: when all fragments come from the cache the
+dashboard runs no queries of its own.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils.functional import cached_property
+
+from .models import Attendance, Class
+
+
+SCOPES = ('classes', 'attendance')
+
+
+def _key(scope, user_id):
+    return f'dashboard:version:{scope}:{user_id}'
+
+
+def get_versions(user_id):
+    """Current {scope: stamp} for a lecturer, creating missing stamps"""
+    keys = {scope: _key(scope, user_id) for scope in SCOPES}
+    found = cache.get_many(list(keys.values()))
+    versions = {}
+    for scope, key in keys.items():
+        if key not in found:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = cache.get(key)
+        versions[scope] = found[key]
+    return versions
+
+
+def forget(user_id):
+    """
+    Delete a lecturer's stamps, so their next dashboard renders every fragment
+    as if from an empty cache; other lecturers' entries are left alone
+    """
+    cache.delete_many([_key(scope, user_id) for scope in SCOPES])
+
+
+def bump(scope, user_ids, using=None):
+    """Invalidate a scope's fragments for these lecturers once the current transaction commits"""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+
+    def replace():
+        cache.set_many({_key(scope, user_id): uuid.uuid4().hex for user_id in user_ids}, timeout=None)
+
+    transaction.on_commit(replace, using=using)
+
+
+def bump_for_classes(scope, class_ids, using=None):
+    """bump() for the lecturers owning these classes"""
+    owners = Class.objects.using(using).filter(id__in=set(class_ids)).values_list('created_by_id', flat=True)
+    bump(scope, set(owners), using=using)
+
+
+class DashboardStats:
+    """Everything the dashboard shows, computed only when a fragment needs it"""
+
+    def __init__(self, user, today):
+        self.user = user
+        self.today = today
+
+    @cached_property
+    def classes(self):
+        return list(
+            Class.objects.filter(created_by=self.user)
+            .annotate(student_count=Count('students'))
+            .order_by('-created_at')
+        )
+
+    @cached_property
+    def total_classes(self):
+        if 'classes' in self.__dict__:
+            return len(self.classes)
+        return Class.objects.filter(created_by=self.user).count()
+
+    @cached_property
+    def total_students(self):
+        return sum(class_obj.student_count for class_obj in self.classes)
+
+    @cached_property
+    def today_attendance(self):
+        return Attendance.objects.filter(class_session__created_by=self.user, date=self.today)
+
+    @cached_property
+    def _status_counts(self):
+        return dict(self.today_attendance.values_list('status').annotate(n=Count('id')).order_by())
+
+    @property
+    def total_present_today(self):
+        return self._status_counts.get('present', 0)
+
+    @property
+    def total_absent_today(self):
+        return self._status_counts.get('absent', 0)
+
+    @property
+    def total_late_today(self):
+        return self._status_counts.get('late', 0)
+
+    @property
+    def attendance_rate(self):
+        total_marked = sum(self._status_counts.values())
+        return round(self.total_present_today / total_marked * 100, 1) if total_marked > 0 else 0
+
+    @cached_property
+    def pending_classes_count(self):
+        return (
+            Class.objects.filter(created_by=self.user)
+            .exclude(id__in=self.today_attendance.values('class_session_id'))
+            .count()
+        )
+
+    @cached_property
+    def todays_absences(self):
+        return list(
+            self.today_attendance.filter(status='absent')
+            .select_related('student', 'class_session')[:10]  # Limit to 10 recent
+        )
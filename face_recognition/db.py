@@ -0,0 +1,126 @@
+"""
+Database write helpers for running on SQLite under concurrent requests
+
+SQLite allows one writer at a time. With IMMEDIATE transactions (see
+DATABASES in settings) a writer waits for the lock at BEGIN, for up to
+the connection "timeout"; atomic_with_retry covers the rare case where
+that wait runs out. Attendance writes are batched so a whole class is
+marked in one short transaction instead of one transaction per student.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.utils import timezone
+
+from . import analytics, metrics
+from .dashboard import bump
+from .models import Attendance
+
+
+def is_busy(error):
+    """True for SQLite's "database is locked" / "database table is locked" / "busy" errors"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def atomic_with_retry(func, *args, using=DEFAULT_DB_ALIAS, retries=None, **kwargs):
+    """
+    Run func(*args, **kwargs) in its own transaction, retrying if SQLite is busy
+
+    The whole transaction is re-run, so func must only touch the database.
+    Inside an outer atomic block nothing is retried (the outer transaction
+    is already broken), and the error is raised as usual.
+    """
+    if retries is None:
+        retries = getattr(settings, 'DB_BUSY_RETRIES', 3)
+    backoff = getattr(settings, 'DB_BUSY_BACKOFF', 0.05)
+
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        except OperationalError as e:
+            if not is_busy(e):
+                raise
+            if attempt == retries or connections[using].in_atomic_block:
+                metrics.inc('db_busy_errors_total', database=using)
+                raise
+            metrics.inc('db_busy_retries_total', database=using)
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def record_attendance(class_obj, session, statuses, marked_by, using=DEFAULT_DB_ALIAS):
+    """
+    Set today's attendance for a class in one batch
+
+    Args:
+        class_obj: Class being marked
+        session: AttendanceSession the marks belong to
+        statuses: dict of Student pk -> status ('present', 'absent', ...)
+        marked_by: 'facial' or 'manual'
+
+    Existing rows for today are updated, missing ones created: two writes
+    per class instead of one update_or_create per student.
+    """
+    today = timezone.now().date()
+    existing = {
+        row.student_id: row
+        for row in Attendance.objects.using(using).filter(
+            class_session=class_obj, date=today, student_id__in=list(statuses)
+        )
+    }
+
+    to_update, to_create = [], []
+    for student_pk, status in statuses.items():
+        row = existing.get(student_pk)
+        if row is None:
+            to_create.append(Attendance(
+                student_id=student_pk,
+                class_session=class_obj,
+                attendance_session=session,
+                status=status,
+                marked_by=marked_by
+            ))
+        else:
+            row.status = status
+            row.marked_by = marked_by
+            row.attendance_session = session
+            to_update.append(row)
+
+    Attendance.objects.using(using).bulk_update(to_update, ['status', 'marked_by', 'attendance_session'], batch_size=500)
+    Attendance.objects.using(using).bulk_create(to_create, batch_size=500)
+    bump('attendance', [class_obj.created_by_id], using=using)  # bulk writes send no signals
+    analytics.invalidate([(class_obj.id, today)], using=using)
+    return len(to_update), len(to_create)
+
+
+def update_in_batches(queryset, batch_size=None, **values):
+    """
+    queryset.update(**values) as a series of primary-key range UPDATEs
+
+    One UPDATE over millions of rows would hold SQLite's write lock until
+    it finished and block attendance marking. Batches are found by keyset
+    pagination: the next batch_size matching pks after the last batch (a
+    walk of the primary key index), updated as one pk range in its own
+    short transaction, so other writers get in between batches. Sparse
+    selections cost one batch per batch_size rows, however far apart the
+    pks are.
+
+    Returns:
+        int: number of rows updated
+    """
+    batch_size = batch_size or getattr(settings, 'DB_UPDATE_BATCH_SIZE', 20_000)
+    queryset = queryset.order_by('pk')
+    updated = 0
+    after = None
+    while True:
+        page = queryset if after is None else queryset.filter(pk__gt=after)
+        pks = list(page.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        batch = queryset.order_by().filter(pk__gte=pks[0], pk__lte=pks[-1])
+        updated += atomic_with_retry(batch.update, using=queryset.db, **values)
+        after = pks[-1]
+    return updated
@@ -0,0 +1,115 @@
+"""
+Multi-template face embeddings: compaction and matching
+
+Pose-based enrollment captures many frames per person. Averaging them into
+one vector blurs profile views, while keeping every frame makes matching
+cost grow with capture length. Instead the captured embeddings are
+compacted with k-medoids into K representative templates, and a probe is
+scored against a person by the best cosine similarity over their templates.
+
+Recognition itself runs in the face service, which never hands probe
+embeddings to Django, so nothing here is on the request path: this is the
+reference for the face service's template store, measured by
+benchmark_templates.
+"""
+import numpy as np
+
+
+def normalize(matrix):
+    """L2-normalize rows so dot products are cosine similarities"""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def k_medoids(embeddings, k, max_iter=50):
+    """
+    Pick k representative rows of `embeddings` by cosine k-medoids
+
+    Initialisation is deterministic (the most central point, then repeatedly
+    the point farthest from the chosen medoids), followed by alternating
+    assignment / medoid update until the medoids stop changing. Fewer than
+    k medoids are returned when the rest of the rows duplicate chosen ones.
+
+    Args:
+        embeddings: (n, d) array of captured embeddings
+        k: Number of templates to keep
+
+    Returns:
+        np.ndarray: Sorted indices of the chosen medoid rows
+    """
+    X = normalize(embeddings)
+    n = len(X)
+    if k >= n:
+        return np.arange(n)
+
+    distances = 1.0 - X @ X.T
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < k:
+        nearest = distances[:, medoids].min(axis=1)
+        farthest = int(np.argmax(nearest))
+        if nearest[farthest] <= 1e-6:
+            break  # Every row is (a copy of) a medoid already
+        medoids.append(farthest)
+    medoids = np.array(medoids)
+
+    for _ in range(max_iter):
+        labels = np.argmin(distances[:, medoids], axis=1)
+        updated = medoids.copy()
+        for cluster in range(len(medoids)):
+            members = np.flatnonzero(labels == cluster)
+            if len(members):
+                costs = distances[np.ix_(members, members)].sum(axis=1)
+                updated[cluster] = members[np.argmin(costs)]
+        if np.array_equal(np.sort(updated), np.sort(medoids)):
+            break
+        medoids = updated
+
+    return np.sort(medoids)
+
+
+class TemplateGallery:
+    """
+    All templates of a set of people stacked into one normalized matrix
+
+    Rows are grouped by owner so per-person best scores can be taken with a
+    single np.maximum.reduceat instead of a Python loop over people.
+    """
+
+    def __init__(self, owners, templates):
+        """
+        Args:
+            owners: Owner key for each template row (e.g. student_id)
+            templates: (t, d) array of template embeddings
+        """
+        owners = np.asarray(owners)
+        order = np.argsort(owners, kind='stable')
+        self.matrix = normalize(np.asarray(templates)[order])
+        owners = owners[order]
+        self.starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        self.owners = owners[self.starts]
+
+    def scores(self, probes):
+        """
+        Best cosine similarity of every probe against every owner
+
+        Returns:
+            np.ndarray: (n_probes, n_owners) scores, columns ordered as self.owners
+        """
+        similarities = normalize(probes) @ self.matrix.T
+        return np.maximum.reduceat(similarities, self.starts, axis=1)
+
+    def match(self, probes, threshold=0.5):
+        """
+        Identify each probe embedding
+
+        Returns:
+            list: (owner, score) per probe, owner None when below threshold
+        """
+        scores = self.scores(probes)
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(best)), best]
+        return [
+            (self.owners[i].item() if score >= threshold else None, float(score))
+            for i, score in zip(best, best_scores)
+        ]
@@ -3,15 +3,126 @@ Client for communicating with the FastAPI face recognition service
 """
 import requests
 import json
+import os
+import time
+import uuid
+from urllib.parse import quote
 from django.conf import settings
 
+from . import metrics
+from .admission import FaceServiceBusy, admit
+from .coalescing import forget, read_through
+
+
+# Calls that occupy the face service for seconds; everything else is light
+HEAVY_CALLS = {'mark_attendance', 'enroll_student', 'enroll_students_batch'}
+
+
+def _file_size(file_obj):
+    """Size in bytes of an uploaded file, bytes buffer or open file"""
+    size = getattr(file_obj, 'size', None)
+    if size is not None:
+        return size
+    position = file_obj.tell()
+    size = file_obj.seek(0, os.SEEK_END)
+    file_obj.seek(position)
+    return size
+
+
+class MultipartStream:
+    """
+    multipart/form-data body that is streamed rather than built in memory
+
+    The total length is known up front (so requests sends a Content-Length
+    instead of chunked encoding) and file contents are read in small blocks
+    while the body is being sent.
+    """
+    block_size = 64 * 1024
+
+    def __init__(self, fields, files):
+        self.boundary = uuid.uuid4().hex
+        self._parts = []
+        for name, value in fields.items():
+            header = (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            ).encode()
+            self._parts.append((header, str(value).encode(), None))
+        for name, (filename, file_obj, content_type) in files.items():
+            header = (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f'Content-Type: {content_type}\r\n\r\n'
+            ).encode()
+            self._parts.append((header, None, file_obj))
+        self._closing = f'--{self.boundary}--\r\n'.encode()
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        total = len(self._closing)
+        for header, value, file_obj in self._parts:
+            total += len(header) + 2
+            total += len(value) if file_obj is None else _file_size(file_obj)
+        return total
+
+    def __iter__(self):
+        for header, value, file_obj in self._parts:
+            yield header
+            if file_obj is None:
+                yield value
+            else:
+                while True:
+                    block = file_obj.read(self.block_size)
+                    if not block:
+                        break
+                    yield block
+            yield b'\r\n'
+        yield self._closing
+
 
 class FaceAPIClient:
     """Client to interact with FastAPI face service backend"""
     
-    def __init__(self):
+    def __init__(self, owner=None):
         # You'll configure this URL in settings.py
         self.base_url = getattr(settings, 'FACE_API_URL', 'http://localhost:8000')
+        # Who the calls are made for (the lecturer); admission queues are fair per owner
+        self.owner = owner
+    
+    def _request(self, call, method, url, **kwargs):
+        """
+        Send one HTTP request to the face service, recording its latency and
+        bytes sent/received for /metrics under the client method name `call`
+        
+        The request first waits for a slot in its admission pool (see
+        admission.py). FaceServiceBusy, a RequestException, is raised if no
+        slot is available.
+        """
+        with admit('heavy' if call in HEAVY_CALLS else 'light', owner=self.owner):
+            return self._send(call, method, url, **kwargs)
+    
+    def _send(self, call, method, url, **kwargs):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = requests.request(method, url, **kwargs)
+            return response
+        finally:
+            sent = received = 0
+            if response is not None:
+                body = response.request.body
+                sent = len(body) if body is not None and hasattr(body, '__len__') else 0
+                received = len(response.content)
+            metrics.record_face_call(
+                call,
+                time.perf_counter() - started,
+                sent,
+                received,
+                error=response is None or not response.ok
+            )
     
     def enroll_student(self, student_id, student_name, class_code, image_files):
         """
@@ -42,8 +153,9 @@ class FaceAPIClient:
         }
         
         try:
-            response = requests.post(url, files=files, data=data, timeout=30)
+            response = self._request('enroll_student', 'POST', url, files=files, data=data, timeout=30)
             response.raise_for_status()
+            forget('get_student_encodings', class_code)
             return {
                 'success': True,
                 'data': response.json()
@@ -79,7 +191,7 @@ class FaceAPIClient:
         }
         
         try:
-            response = requests.post(url, files=files, data=data, timeout=60)
+            response = self._request('mark_attendance', 'POST', url, files=files, data=data, timeout=60)
             response.raise_for_status()
             result = response.json()
             
@@ -89,6 +201,12 @@ class FaceAPIClient:
                 'total_detected': result.get('total_detected', 0),
                 'confidence_scores': result.get('confidence_scores', {})
             }
+        except FaceServiceBusy as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'retry_after': e.retry_after
+            }
         except requests.exceptions.RequestException as e:
             return {
                 'success': False,
@@ -99,16 +217,25 @@ class FaceAPIClient:
         """
         Retrieve all face encodings for students in a specific class
         
+        Concurrent calls for the same class share one request and results
+        are cached briefly (see coalescing.py), so treat the result as
+        read-only.
+        
         Args:
             class_code: Unique class enrollment code
         
         Returns:
             dict: Student encodings data
         """
+        return read_through(
+            'get_student_encodings', class_code, lambda: self._fetch_student_encodings(class_code)
+        )
+    
+    def _fetch_student_encodings(self, class_code):
         url = f"{self.base_url}/api/encodings/{class_code}"
         
         try:
-            response = requests.get(url, timeout=10)
+            response = self._request('get_student_encodings', 'GET', url, timeout=10)
             response.raise_for_status()
             return {
                 'success': True,
@@ -120,6 +247,42 @@ class FaceAPIClient:
                 'error': str(e)
             }
     
+    def link_student_to_class(self, student_id, class_code):
+        """
+        Add an already-enrolled person's face template to a class
+        
+        The face service derives each class's encoding set from the shared
+        per-person templates, so no images are sent and nothing is copied.
+        
+        Args:
+            student_id: Student identifier the template was enrolled under
+            class_code: Unique class enrollment code
+        
+        Returns:
+            dict: Link status
+        """
+        url = f"{self.base_url}/api/classes/{class_code}/students"
+        
+        try:
+            response = self._request('link_student_to_class', 'POST', url, json={'student_id': student_id}, timeout=10)
+            response.raise_for_status()
+            forget('get_student_encodings', class_code)
+            return {
+                'success': True,
+                'data': response.json()
+            }
+        except FaceServiceBusy as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'retry_after': e.retry_after
+            }
+        except requests.exceptions.RequestException as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
     def start_enrollment_session(self, user_id):
         """
         Start a pose-based enrollment session
@@ -133,12 +296,18 @@ class FaceAPIClient:
         url = f"{self.base_url}/enroll/start"
         
         try:
-            response = requests.post(url, json={'user_id': user_id}, timeout=10)
+            response = self._request('start_enrollment_session', 'POST', url, json={'user_id': user_id}, timeout=10)
             response.raise_for_status()
             return {
                 'success': True,
                 'data': response.json()
             }
+        except FaceServiceBusy as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'retry_after': e.retry_after
+            }
         except requests.exceptions.RequestException as e:
             return {
                 'success': False,
@@ -156,16 +325,22 @@ class FaceAPIClient:
         Returns:
             dict: Feedback with pose guidance and capture status
         """
-        url = f"{self.base_url}/enroll/process-frame/{user_id}"
+        url = f"{self.base_url}/enroll/process-frame/{quote(user_id, safe='')}"
         
         try:
             files = {'file': image_file}
-            response = requests.post(url, files=files, timeout=10)
+            response = self._request('process_enrollment_frame', 'POST', url, files=files, timeout=10)
             response.raise_for_status()
             return {
                 'success': True,
                 'data': response.json()
             }
+        except FaceServiceBusy as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'retry_after': e.retry_after
+            }
         except requests.exceptions.RequestException as e:
             return {
                 'success': False,
@@ -182,15 +357,21 @@ class FaceAPIClient:
         Returns:
             dict: Completion status
         """
-        url = f"{self.base_url}/enroll/complete/{user_id}"
+        url = f"{self.base_url}/enroll/complete/{quote(user_id, safe='')}"
         
         try:
-            response = requests.post(url, timeout=10)
+            response = self._request('complete_enrollment', 'POST', url, timeout=10)
             response.raise_for_status()
             return {
                 'success': True,
                 'data': response.json()
             }
+        except FaceServiceBusy as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'retry_after': e.retry_after
+            }
         except requests.exceptions.RequestException as e:
             return {
                 'success': False,
@@ -207,17 +388,150 @@ class FaceAPIClient:
         Returns:
             dict: Cancellation status
         """
-        url = f"{self.base_url}/enroll/cancel/{user_id}"
+        url = f"{self.base_url}/enroll/cancel/{quote(user_id, safe='')}"
         
         try:
-            response = requests.post(url, timeout=10)
+            response = self._request('cancel_enrollment', 'POST', url, timeout=10)
             response.raise_for_status()
             return {
                 'success': True,
                 'data': response.json()
             }
+        except FaceServiceBusy as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'retry_after': e.retry_after
+            }
         except requests.exceptions.RequestException as e:
             return {
                 'success': False,
                 'error': str(e)
             }
+    
+    def _chunk_students(self, students):
+        """
+        Split students into batches that stay under the configured limits
+        
+        A student whose images alone exceed FACE_API_BATCH_MAX_BYTES is sent
+        in a batch of their own rather than rejected.
+        """
+        max_bytes = getattr(settings, 'FACE_API_BATCH_MAX_BYTES', 20 * 1024 * 1024)
+        max_students = getattr(settings, 'FACE_API_BATCH_MAX_STUDENTS', 50)
+        
+        chunk, chunk_bytes = [], 0
+        for student in students:
+            size = sum(_file_size(f) for f in student['image_files'])
+            if chunk and (chunk_bytes + size > max_bytes or len(chunk) >= max_students):
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(student)
+            chunk_bytes += size
+        if chunk:
+            yield chunk
+    
+    def _send_batch(self, class_code, students):
+        """
+        POST one batch to /api/enroll/batch
+        
+        Returns:
+            dict: student_id -> per-student result (transport errors fail every student)
+        """
+        url = f"{self.base_url}/api/enroll/batch"
+        
+        manifest = []
+        files = {}
+        for index, student in enumerate(students):
+            names = []
+            for number, image_file in enumerate(student['image_files'], start=1):
+                image_file.seek(0)
+                name = f's{index}_image{number}'
+                files[name] = (f'{name}.jpg', image_file, 'image/jpeg')
+                names.append(name)
+            manifest.append({
+                'student_id': student['student_id'],
+                'student_name': student['student_name'],
+                'images': names
+            })
+        
+        body = MultipartStream({'class_code': class_code, 'manifest': json.dumps(manifest)}, files)
+        
+        try:
+            response = self._request('enroll_students_batch', 'POST', url, data=body, headers={'Content-Type': body.content_type}, timeout=120)
+            response.raise_for_status()
+            returned = {r.get('student_id'): r for r in response.json().get('results', [])}
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return {s['student_id']: {'success': False, 'error': str(e), 'retryable': True} for s in students}
+        
+        results = {}
+        for student in students:
+            result = returned.get(student['student_id'])
+            if result is None:
+                results[student['student_id']] = {'success': False, 'error': 'Missing from batch response', 'retryable': True}
+            elif result.get('success'):
+                results[student['student_id']] = {'success': True, 'data': result}
+            else:
+                results[student['student_id']] = {
+                    'success': False,
+                    'error': result.get('error', 'Unknown error'),
+                    'retryable': result.get('retryable', True)
+                }
+        return results
+    
+    def enroll_students_batch(self, class_code, students, max_retries=1):
+        """
+        Enroll many students in as few streamed requests as possible
+        
+        Students are chunked to stay under FACE_API_BATCH_MAX_BYTES and
+        FACE_API_BATCH_MAX_STUDENTS. After every chunk has been sent, only
+        the students that failed with a retryable error are sent again.
+        
+        Args:
+            class_code: Unique class enrollment code
+            students: List of dicts with student_id, student_name and
+                image_files (3 seekable image file objects)
+            max_retries: How many times failed students are re-sent
+        
+        Returns:
+            dict: success (no failures), results (student_id -> result) and
+                failed (list of student_ids that still failed). Results are
+                keyed by student_id, so a list that repeats one is rejected
+                before anything is sent.
+        """
+        seen, duplicates = set(), []
+        for student in students:
+            if student['student_id'] in seen and student['student_id'] not in duplicates:
+                duplicates.append(student['student_id'])
+            seen.add(student['student_id'])
+        if duplicates:
+            return {
+                'success': False,
+                'error': f"Duplicate student IDs: {', '.join(duplicates)}",
+                'results': {},
+                'failed': duplicates
+            }
+        
+        results = {}
+        pending = list(students)
+        
+        for attempt in range(max_retries + 1):
+            for chunk in self._chunk_students(pending):
+                results.update(self._send_batch(class_code, chunk))
+            pending = [
+                s for s in pending
+                if not results[s['student_id']]['success'] and results[s['student_id']].get('retryable')
+            ]
+            if not pending:
+                break
+        
+        failed = [sid for sid, result in results.items() if not result['success']]
+        if len(failed) < len(results):
+            forget('get_student_encodings', class_code)
+        for result in results.values():
+            result.pop('retryable', None)
+        
+        return {
+            'success': not failed,
+            'results': results,
+            'failed': failed
+        }
@@ -0,0 +1,460 @@
+"""
+Local stand-in for the FastAPI face service
+
+Implements every endpoint FaceAPIClient calls, as
+described in SYSTEM_ARCHITECTURE.md:
+    POST /api/enroll, /api/enroll/batch, /api/mark-attendance
+    GET  /api/encodings/{class_code}
+    POST /api/classes/{class_code}/students
+    POST /enroll/start, /enroll/process-frame/{user_id},
+         /enroll/complete/{user_id}, /enroll/cancel/{user_id}
+
+Results are deterministic: encodings are a hash of the image bytes, an
+empty image means "no face detected", and whether a student is "seen" in
+a set of classroom photos is a hash of the photos and the student_id.
+Latency, error rate and timeouts can be set globally or per endpoint to
+load-test the Django tier without the GPU service (see load_test).
+
+Stub-only helpers:
+    POST /stub/classes/{class_code}  {"student_ids": [...]}  pre-register a roster
+    GET  /stub/stats                 request/error/timeout counts per endpoint
+    POST /stub/reset                 forget all state and counters
+
+Run with:
+    python -m face_recognition.face_service_stub --port 8001 \\
+        --latency lognormal:40:0.5 --latency mark-attendance=lognormal:900:0.4 \\
+        --error-rate 0.01 --timeout-rate mark-attendance=0.005
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import date
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+ENDPOINTS = [
+    'enroll', 'enroll-batch', 'mark-attendance', 'encodings', 'classes',
+    'enroll-start', 'enroll-frame', 'enroll-complete', 'enroll-cancel',
+]
+POSES = ['front', 'left', 'right', 'down']
+
+
+def parse_multipart(content_type, body):
+    """
+    Parse a multipart/form-data body
+
+    Returns:
+        tuple: (fields, files) dicts keyed by part name; files map to bytes
+    """
+    message = BytesParser(policy=HTTP).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+    )
+    fields, files = {}, {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        payload = part.get_payload(decode=True) or b''
+        if part.get_filename() is None:
+            fields[name] = payload.decode()
+        else:
+            files[name] = payload
+    return fields, files
+
+
+def _unit(*parts):
+    """Deterministic float in [0, 1) from the given strings/bytes"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b'\0')
+    return int.from_bytes(digest.digest()[:8], 'big') / 2 ** 64
+
+
+def fake_enrollment(student_id, images):
+    """Deterministic enrollment result for one student's images"""
+    if not images or any(len(image) == 0 for image in images):
+        return {'student_id': student_id, 'success': False, 'error': 'No face detected', 'retryable': False}
+    digest = hashlib.sha256(b''.join(images)).hexdigest()
+    return {'student_id': student_id, 'success': True, 'face_encoding': digest, 'confidence': 0.95}
+
+
+def fake_recognition(student_ids, images, present_rate):
+    """Deterministic present list and confidences for a class and its photos"""
+    photos = hashlib.sha256(b''.join(images)).digest()
+    present, scores = [], {}
+    for student_id in sorted(student_ids):
+        if _unit(photos, student_id) < present_rate:
+            present.append(student_id)
+            scores[student_id] = round(0.75 + 0.24 * _unit(student_id, photos), 3)
+    return {'success': True, 'present_students': present, 'total_detected': len(present), 'confidence_scores': scores}
+
+
+class Latency:
+    """
+    Response delay distribution, parsed from a spec string:
+        fixed:MS | uniform:MIN_MS:MAX_MS | lognormal:MEDIAN_MS:SIGMA
+    """
+
+    def __init__(self, spec):
+        kind, *args = spec.split(':')
+        try:
+            args = [float(a) for a in args]
+        except ValueError:
+            raise ValueError(f'Invalid latency spec: {spec}')
+        if (kind, len(args)) not in (('fixed', 1), ('uniform', 2), ('lognormal', 2)):
+            raise ValueError(f'Invalid latency spec: {spec}')
+        self.kind, self.args = kind, args
+
+    def sample(self, rng):
+        """Delay in seconds"""
+        if self.kind == 'fixed':
+            ms = self.args[0]
+        elif self.kind == 'uniform':
+            ms = rng.uniform(*self.args)
+        else:
+            ms = self.args[0] * math.exp(rng.gauss(0, self.args[1]))
+        return max(ms, 0) / 1000
+
+
+class Faults:
+    """Per-endpoint latency, error and timeout injection with a seeded RNG"""
+
+    def __init__(self, latency=None, error_rate=None, timeout_rate=None, timeout_seconds=120.0, seed=0):
+        self.latency = latency or {}
+        self.error_rate = error_rate or {}
+        self.timeout_rate = timeout_rate or {}
+        self.timeout_seconds = timeout_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _lookup(table, endpoint, default):
+        return table.get(endpoint, table.get('*', default))
+
+    def decide(self, endpoint):
+        """(delay seconds, outcome) where outcome is 'ok', 'error' or 'timeout'"""
+        with self._lock:
+            latency = self._lookup(self.latency, endpoint, None)
+            delay = latency.sample(self._rng) if latency else 0.0
+            roll = self._rng.random()
+        timeout_rate = self._lookup(self.timeout_rate, endpoint, 0.0)
+        if roll < timeout_rate:
+            return self.timeout_seconds, 'timeout'
+        if roll < timeout_rate + self._lookup(self.error_rate, endpoint, 0.0):
+            return delay, 'error'
+        return delay, 'ok'
+
+
+class StubState:
+    """In-memory face database shared by all handler threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.templates = {}  # student_id -> fake encoding, shared across classes
+        self.names = {}  # student_id -> name
+        self.enrolled_on = {}  # student_id -> ISO date
+        self.classes = {}  # class_code -> set of student_ids
+        self.sessions = {}  # user_id -> {'poses': {...}, 'frames': [bytes]}
+        self.stats = {}  # endpoint -> {'requests', 'errors', 'timeouts'}
+
+    def remember(self, class_code, result, name=None):
+        if not result['success']:
+            return
+        with self.lock:
+            self.templates[result['student_id']] = result['face_encoding']
+            self.enrolled_on[result['student_id']] = date.today().isoformat()
+            if name:
+                self.names[result['student_id']] = name
+            if class_code:
+                self.classes.setdefault(class_code, set()).add(result['student_id'])
+
+    def count(self, endpoint, outcome):
+        with self.lock:
+            stats = self.stats.setdefault(endpoint, {'requests': 0, 'errors': 0, 'timeouts': 0})
+            stats['requests'] += 1
+            if outcome == 'error':
+                stats['errors'] += 1
+            elif outcome == 'timeout':
+                stats['timeouts'] += 1
+
+
+ROUTES = [
+    ('POST', re.compile(r'^/api/enroll$'), 'enroll'),
+    ('POST', re.compile(r'^/api/enroll/batch$'), 'enroll-batch'),
+    ('POST', re.compile(r'^/api/mark-attendance$'), 'mark-attendance'),
+    ('GET', re.compile(r'^/api/encodings/(?P<class_code>[^/]+)$'), 'encodings'),
+    ('POST', re.compile(r'^/api/classes/(?P<class_code>[^/]+)/students$'), 'classes'),
+    ('POST', re.compile(r'^/enroll/start$'), 'enroll-start'),
+    ('POST', re.compile(r'^/enroll/process-frame/(?P<user_id>[^/]+)$'), 'enroll-frame'),
+    ('POST', re.compile(r'^/enroll/complete/(?P<user_id>[^/]+)$'), 'enroll-complete'),
+    ('POST', re.compile(r'^/enroll/cancel/(?P<user_id>[^/]+)$'), 'enroll-cancel'),
+    ('POST', re.compile(r'^/stub/classes/(?P<class_code>[^/]+)$'), 'stub-classes'),
+    ('GET', re.compile(r'^/stub/stats$'), 'stub-stats'),
+    ('POST', re.compile(r'^/stub/reset$'), 'stub-reset'),
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = StubState()
+    faults = Faults()
+    present_rate = 0.85
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _form(self):
+        return parse_multipart(self.headers.get('Content-Type', ''), self.body)
+
+    def _json(self):
+        try:
+            return json.loads(self.body or b'{}')
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        self.body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.split('?', 1)[0]
+        for route_method, pattern, endpoint in ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            return self._send_json({'success': False, 'error': 'Not found'}, status=404)
+
+        if not endpoint.startswith('stub-'):
+            delay, outcome = self.faults.decide(endpoint)
+            self.state.count(endpoint, outcome)
+            time.sleep(delay)
+            if outcome == 'timeout':
+                self.close_connection = True  # Hang up without answering
+                return
+            if outcome == 'error':
+                return self._send_json({'success': False, 'error': 'Injected failure', 'retryable': True}, status=503)
+
+        handler = getattr(self, 'handle_' + endpoint.replace('-', '_'))
+        handler(**{name: unquote(value) for name, value in match.groupdict().items()})
+
+    # Face API
+
+    def handle_enroll(self):
+        fields, files = self._form()
+        images = [files.get(f'image{n}', b'') for n in (1, 2, 3)]
+        result = fake_enrollment(fields.get('student_id'), images)
+        self.state.remember(fields.get('class_code'), result, fields.get('student_name'))
+        self._send_json(result, status=200 if result['success'] else 422)
+
+    def handle_enroll_batch(self):
+        fields, files = self._form()
+        try:
+            manifest = json.loads(fields.get('manifest', '[]'))
+        except ValueError:
+            return self._send_json({'success': False, 'error': 'Invalid manifest'}, status=400)
+        results = []
+        for entry in manifest:
+            result = fake_enrollment(entry.get('student_id'), [files.get(name, b'') for name in entry.get('images', [])])
+            self.state.remember(fields.get('class_code'), result, entry.get('student_name'))
+            results.append(result)
+        self._send_json({'class_code': fields.get('class_code'), 'results': results})
+
+    def handle_mark_attendance(self):
+        fields, files = self._form()
+        images = [files.get(f'classroom_image{n}', b'') for n in (1, 2, 3)]
+        with self.state.lock:
+            roster = set(self.state.classes.get(fields.get('class_code'), ()))
+        self._send_json(fake_recognition(roster, images, self.present_rate))
+
+    def handle_encodings(self, class_code):
+        with self.state.lock:
+            students = [
+                {
+                    'student_id': student_id,
+                    'student_name': self.state.names.get(student_id, ''),
+                    'face_encoding': self.state.templates.get(student_id, ''),
+                    'enrolled_date': self.state.enrolled_on.get(student_id, ''),
+                }
+                for student_id in sorted(self.state.classes.get(class_code, ()))
+            ]
+        self._send_json({'class_code': class_code, 'students': students})
+
+    def handle_classes(self, class_code):
+        student_id = self._json().get('student_id')
+        with self.state.lock:
+            if student_id not in self.state.templates:
+                known = False
+            else:
+                known = True
+                self.state.classes.setdefault(class_code, set()).add(student_id)
+        if not known:
+            return self._send_json({'success': False, 'error': 'No face template for student'}, status=404)
+        self._send_json({'success': True, 'class_code': class_code, 'student_id': student_id})
+
+    # Pose-based enrollment sessions
+
+    def handle_enroll_start(self):
+        user_id = self._json().get('user_id')
+        if not user_id:
+            return self._send_json({'success': False, 'message': 'user_id is required'}, status=400)
+        with self.state.lock:
+            self.state.sessions[user_id] = {'poses': {pose: False for pose in POSES}, 'frames': []}
+        self._send_json({'success': True, 'user_id': user_id, 'required_poses': POSES,
+                         'message': 'Enrollment session started'})
+
+    def handle_enroll_frame(self, user_id):
+        _, files = self._form()
+        frame = files.get('file', b'')
+        with self.state.lock:
+            session = self.state.sessions.get(user_id)
+            if session is None:
+                return self._send_json({'success': False, 'message': 'No active session'}, status=404)
+            if not frame:
+                return self._send_json({'success': True, 'status': 'no_face', 'captured': False})
+            pending = [pose for pose in POSES if not session['poses'][pose]]
+            if pending:
+                session['poses'][pending[0]] = True
+                session['frames'].append(frame)
+                pending = pending[1:]
+            captured = sum(session['poses'].values())
+            progress = {
+                'poses_captured': dict(session['poses']),
+                'poses_captured_count': captured,
+                'total_poses_required': len(POSES),
+                'current_pose': pending[0] if pending else None,
+                'complete': not pending,
+            }
+        self._send_json({
+            'success': True,
+            'status': 'complete' if not pending else 'ready',
+            'captured': True,
+            'feedback': f'Now: {pending[0]}' if pending else 'All poses captured',
+            'progress': progress,
+        })
+
+    def handle_enroll_complete(self, user_id):
+        with self.state.lock:
+            session = self.state.sessions.get(user_id)
+            if session is None or not all(session['poses'].values()):
+                return self._send_json({'success': False, 'message': 'Not all poses captured'}, status=400)
+            del self.state.sessions[user_id]
+        result = fake_enrollment(user_id, session['frames'])
+        self.state.remember(None, result)
+        self._send_json({'success': True, 'user_id': user_id, 'face_encoding': result['face_encoding'],
+                         'poses_captured': len(session['frames'])})
+
+    def handle_enroll_cancel(self, user_id):
+        with self.state.lock:
+            existed = self.state.sessions.pop(user_id, None) is not None
+        self._send_json({'success': True, 'cancelled': existed})
+
+    # Stub control
+
+    def handle_stub_classes(self, class_code):
+        student_ids = self._json().get('student_ids', [])
+        with self.state.lock:
+            for student_id in student_ids:
+                self.state.templates.setdefault(student_id, hashlib.sha256(student_id.encode()).hexdigest())
+            self.state.classes.setdefault(class_code, set()).update(student_ids)
+            size = len(self.state.classes[class_code])
+        self._send_json({'success': True, 'class_code': class_code, 'students': size})
+
+    def handle_stub_stats(self):
+        with self.state.lock:
+            payload = {'endpoints': {k: dict(v) for k, v in self.state.stats.items()},
+                       'templates': len(self.state.templates), 'classes': len(self.state.classes),
+                       'open_sessions': len(self.state.sessions)}
+        self._send_json(payload)
+
+    def handle_stub_reset(self):
+        type(self).state = StubState()
+        self._send_json({'success': True})
+
+
+def _per_endpoint(values, convert, option):
+    """Parse repeated VALUE / ENDPOINT=VALUE options into {endpoint or '*': value}"""
+    table = {}
+    for value in values or []:
+        endpoint, _, raw = value.rpartition('=')
+        endpoint = endpoint or '*'
+        if endpoint != '*' and endpoint not in ENDPOINTS:
+            raise SystemExit(f'{option}: unknown endpoint "{endpoint}" (choose from {", ".join(ENDPOINTS)})')
+        try:
+            table[endpoint] = convert(raw)
+        except ValueError as e:
+            raise SystemExit(f'{option}: {e}')
+    return table
+
+
+def make_server(host='127.0.0.1', port=8001, faults=None, present_rate=0.85, verbose=False):
+    """Build (but don't start) a stub server; handy for running it in a thread"""
+    handler = type('ConfiguredStubHandler', (StubHandler,), {
+        'faults': faults or Faults(),
+        'present_rate': present_rate,
+    })
+    handler.state = StubState()
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Local stand-in for the face service API',
+        epilog='Options taking ENDPOINT=VALUE may be repeated; a bare VALUE sets the default. '
+               f'Endpoints: {", ".join(ENDPOINTS)}'
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', action='append', metavar='[ENDPOINT=]SPEC',
+                        help='fixed:MS, uniform:MIN_MS:MAX_MS or lognormal:MEDIAN_MS:SIGMA')
+    parser.add_argument('--error-rate', action='append', metavar='[ENDPOINT=]RATE',
+                        help='Share of requests answered with HTTP 503')
+    parser.add_argument('--timeout-rate', action='append', metavar='[ENDPOINT=]RATE',
+                        help='Share of requests that hang and are then dropped without a response')
+    parser.add_argument('--timeout-seconds', type=float, default=120.0,
+                        help='How long a "timed out" request hangs (longer than the client timeout)')
+    parser.add_argument('--present-rate', type=float, default=0.85,
+                        help='Share of a class recognised in attendance photos')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    faults = Faults(
+        latency=_per_endpoint(args.latency, Latency, '--latency'),
+        error_rate=_per_endpoint(args.error_rate, float, '--error-rate'),
+        timeout_rate=_per_endpoint(args.timeout_rate, float, '--timeout-rate'),
+        timeout_seconds=args.timeout_seconds,
+        seed=args.seed,
+    )
+    server = make_server(args.host, args.port, faults, args.present_rate, args.verbose)
+    print(f'Face service stub listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Keyframe selection for video / burst attendance uploads
+
+The face service takes three classroom photos. Instead of framing three
+shots by hand, a lecturer can pan across the room with a short video or a
+burst of frames; the server picks the frames worth sending.
+
+Frames are decoded and scored one at a time on a small grayscale copy:
+    sharpness      variance of the Laplacian (motion blur and defocus lower it)
+    signature      a zero-mean, unit-norm 16x16 thumbnail of the frame layout
+A new scene starts when a frame's signature moves SCENE_CHANGE (1 - cosine)
+away from the first frame of the current scene, so pauses and slow drifts
+don't yield near-identical frames. Only the sharpest frame of each scene is
+kept, in a pool of at most pool_size candidates; when the pool overflows,
+the blurrier frame of its most similar pair is dropped. The final K frames
+are picked greedily by sharpness times distance from the frames already
+picked, which spreads them over the room.
+
+Memory is bounded by the pool (JPEG bytes) plus the current scene's best
+frame, whatever the length of the clip. Video needs PyAV (`pip install av`);
+bursts of still images only need Pillow.
+"""
+import io
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageSequence, UnidentifiedImageError
+
+from . import metrics
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+ANALYSIS_SIZE = 192  # Longest side of the grayscale copy frames are scored on
+SIGNATURE_SIZE = 16
+SCENE_CHANGE = 0.35
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.webm', '.mkv', '.avi', '.m4v', '.3gp'}
+
+
+class UnreadableClip(ValueError):
+    """The upload can't be read as video or image frames"""
+
+
+@dataclass
+class Keyframe:
+    index: int  # Position of the frame in the upload
+    sharpness: float
+    signature: np.ndarray
+    keep: Callable[[], bytes] = None  # JPEG of the full frame, while it's a scene's best so far
+    data: bytes = None  # JPEG of the full frame, once it's in the pool
+
+
+def _jpeg(image):
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def analyse(image):
+    """(sharpness, signature) of a PIL image"""
+    gray = image.convert('L')
+    gray.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    pixels = np.asarray(gray, dtype=np.float32)
+
+    laplacian = (pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:]
+                 - 4 * pixels[1:-1, 1:-1])
+    sharpness = float(laplacian.var()) if laplacian.size else 0.0
+
+    signature = np.asarray(gray.resize((SIGNATURE_SIZE, SIGNATURE_SIZE), Image.BOX), dtype=np.float32).ravel()
+    signature -= signature.mean()
+    signature /= max(float(np.linalg.norm(signature)), 1e-6)
+    return sharpness, signature
+
+
+class KeyframeSelector:
+    """Streaming keyframe selection; add() frames in order, then select()"""
+
+    def __init__(self, k, pool_size=None, scene_change=SCENE_CHANGE):
+        self.k = k
+        self.pool_size = max(pool_size or 4 * k, k)
+        self.scene_change = scene_change
+        self.pool = []
+        self.frames = 0
+        self._scene_start = None  # Signature of the current scene's first frame
+        self._best = None  # Sharpest frame of the current scene
+
+    def add(self, image, keep=None):
+        """
+        Score one frame
+
+        Args:
+            image: PIL image of the frame
+            keep: callable returning the full frame as JPEG bytes, called only
+                if the frame ends up in the pool; defaults to encoding `image`
+        """
+        sharpness, signature = analyse(image)
+        frame = Keyframe(self.frames, sharpness, signature, keep or (lambda: _jpeg(image)))
+        self.frames += 1
+
+        if self._scene_start is not None and 1 - float(signature @ self._scene_start) < self.scene_change:
+            if sharpness > self._best.sharpness:
+                self._best = frame
+            return
+        self._close_scene()
+        self._scene_start, self._best = signature, frame
+
+    def _close_scene(self):
+        best, self._best = self._best, None
+        if best is None:
+            return
+        best.data, best.keep = best.keep(), None
+        self.pool.append(best)
+        if len(self.pool) > self.pool_size:
+            signatures = np.stack([f.signature for f in self.pool])
+            similarity = signatures @ signatures.T
+            np.fill_diagonal(similarity, -np.inf)
+            a, b = np.unravel_index(np.argmax(similarity), similarity.shape)
+            self.pool.pop(a if self.pool[a].sharpness < self.pool[b].sharpness else b)
+
+    def select(self):
+        """The chosen keyframes in clip order (fewer than k if the clip has fewer scenes)"""
+        self._close_scene()
+        if not self.pool:
+            return []
+        signatures = np.stack([f.signature for f in self.pool])
+        sharpness = np.array([f.sharpness for f in self.pool])
+        sharpness = sharpness / max(sharpness.max(), 1e-6)
+
+        chosen = [int(np.argmax(sharpness))]
+        distance = 1 - signatures @ signatures[chosen[0]]
+        while len(chosen) < min(self.k, len(self.pool)):
+            score = sharpness * distance
+            score[chosen] = -np.inf
+            pick = int(np.argmax(score))
+            chosen.append(pick)
+            distance = np.minimum(distance, 1 - signatures @ signatures[pick])
+        return sorted((self.pool[i] for i in chosen), key=lambda f: f.index)
+
+
+def _is_video(upload):
+    content_type = getattr(upload, 'content_type', '') or ''
+    return content_type.startswith('video/') or os.path.splitext(upload.name or '')[1].lower() in VIDEO_EXTENSIONS
+
+
+def _read(upload):
+    upload.seek(0)
+    return upload.read()
+
+
+def iter_frames(uploads, sample_fps=None):
+    """
+    Yield (image, keep) for every frame of the uploads, one at a time
+
+    Still images keep their original bytes; frames of videos and animated
+    images are re-encoded only if they are kept. Videos are sampled at most
+    sample_fps frames per second.
+    """
+    for upload in uploads:
+        if _is_video(upload):
+            if av is None:
+                raise UnreadableClip('Video uploads need PyAV on the server; upload a burst of photos instead')
+            upload.seek(0)
+            try:
+                with av.open(upload) as container:
+                    next_time = 0.0
+                    for frame in container.decode(video=0):
+                        if sample_fps and frame.time is not None:
+                            if frame.time < next_time:
+                                continue
+                            next_time = frame.time + 1 / sample_fps
+                        yield frame.to_image(), None
+            except av.FFmpegError as e:
+                raise UnreadableClip(f'{os.path.basename(upload.name)} is not a readable video') from e
+            continue
+
+        upload.seek(0)
+        try:
+            image = Image.open(upload)
+            if getattr(image, 'n_frames', 1) == 1:
+                image.draft('L', (ANALYSIS_SIZE, ANALYSIS_SIZE))  # JPEGs decode at the smallest scale that's enough
+                yield image, lambda upload=upload: _read(upload)
+            else:
+                for frame in ImageSequence.Iterator(image):
+                    yield frame.copy(), None
+        except (UnidentifiedImageError, OSError) as e:
+            raise UnreadableClip(f'{os.path.basename(upload.name)} is not a readable image') from e
+
+
+def select_keyframes(uploads, k=3):
+    """
+    Pick the k best frames of a video or burst upload
+
+    Returns:
+        list: JPEG bytes of the chosen frames in clip order; when the clip
+            has fewer than k distinct scenes, chosen frames are repeated so
+            there are always k
+    Raises:
+        UnreadableClip: an upload isn't a readable video or image
+    """
+    started = time.perf_counter()
+    selector = KeyframeSelector(k, pool_size=getattr(settings, 'KEYFRAME_POOL_SIZE', None))
+    max_frames = getattr(settings, 'KEYFRAME_MAX_FRAMES', 600)
+    try:
+        for image, keep in iter_frames(uploads, getattr(settings, 'KEYFRAME_SAMPLE_FPS', 10)):
+            selector.add(image, keep)
+            if selector.frames >= max_frames:
+                break
+    except OSError as e:  # Truncated or corrupt image data found while decoding
+        raise UnreadableClip('An uploaded frame is damaged') from e
+    chosen = selector.select()
+    if not chosen:
+        raise UnreadableClip('The upload contains no frames')
+
+    metrics.observe('keyframe_selection_seconds', time.perf_counter() - started)
+    metrics.inc('keyframe_frames_scored_total', selector.frames)
+    frames = [frame.data for frame in chosen]
+    return [frames[n % len(frames)] for n in range(k)]
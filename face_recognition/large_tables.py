@@ -0,0 +1,96 @@
+"""
+Admin changelist helpers for tables too large to count or scan
+
+Counting every row of a table with tens of millions of Attendance records
+takes longer than rendering the page. EstimatedCountPaginator asks the
+database for its own row estimate when the list isn't filtered, and stops
+counting a filtered list at count_limit rows (pages past that aren't
+linked).
+
+The admin date hierarchy asks for MIN and MAX of the date together and for
+the DISTINCT months or days, and SQLite answers both by reading the whole
+date index. SeekingQuerySet answers them with index seeks instead: each
+MIN/MAX on its own, and the distinct dates by jumping from one to the next
+(a loose index scan), so the cost follows the number of dates listed, not
+the number of rows.
+"""
+import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, QuerySet
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using='default'):
+    """Approximate number of rows in a model's table, without counting them, or None"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table]
+            )
+        elif connection.vendor == 'sqlite':
+            # Two seeks into the rowid B-tree (a single MIN/MAX each, so SQLite
+            # doesn't scan): exact for append-only tables, high by the rows deleted
+            quoted = connection.ops.quote_name(table)
+            cursor.execute(f'SELECT (SELECT MAX(rowid) FROM {quoted}) - (SELECT MIN(rowid) FROM {quoted}) + 1')
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count is estimated past estimate_above rows and capped at count_limit when filtered"""
+
+    estimate_above = 100_000
+    count_limit = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_above:
+                return estimate
+        # COUNT(*) over a LIMITed subquery: reads at most count_limit rows
+        return queryset.order_by()[:self.count_limit].count()
+
+
+class SeekingQuerySet(QuerySet):
+    """QuerySet whose MIN/MAX aggregates and dates() run as index seeks"""
+
+    def aggregate(self, *args, **kwargs):
+        if not args and len(kwargs) > 1 and all(
+            type(aggregate) in (Min, Max) and not aggregate.filter for aggregate in kwargs.values()
+        ):
+            # One MIN or MAX per query is a single seek; together they are a scan
+            return {alias: self.aggregate(**{alias: aggregate})[alias] for alias, aggregate in kwargs.items()}
+        return super().aggregate(*args, **kwargs)
+
+    def dates(self, field_name, kind, order='ASC'):
+        """The distinct years, months or days of field_name, as a list"""
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        found = []
+        current = self.aggregate(first=Min(field_name))['first']
+        while current is not None:
+            start = current.replace(month=1, day=1) if kind == 'year' else (
+                current.replace(day=1) if kind == 'month' else current
+            )
+            found.append(start)
+            if kind == 'year':
+                following = start.replace(year=start.year + 1)
+            elif kind == 'month':
+                following = (start + datetime.timedelta(days=32)).replace(day=1)
+            else:
+                following = start + datetime.timedelta(days=1)
+            current = self.filter(**{f'{field_name}__gte': following}).aggregate(first=Min(field_name))['first']
+        return found if order == 'ASC' else found[::-1]
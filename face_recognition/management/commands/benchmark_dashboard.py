@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from face_recognition.dashboard import bump, forget
+from face_recognition.db import record_attendance
+from face_recognition.models import AttendanceSession, Class, Person, Student
+
+from .run_benchmarks import percentile
+
+
+USERNAME = 'dashboard_bench'
+
+
+class Command(BaseCommand):
+    help = 'Time dashboard rendering for a lecturer with many classes, with and without fragment caching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=60)
+        parser.add_argument('--students', type=int, default=40, help='Students per class')
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _create(self, options):
+        rng = random.Random(options['seed'])
+        teacher = User.objects.create_user(USERNAME, f'{USERNAME}@example.com', 'x', first_name='Bench')
+        classes = [
+            Class.objects.create(title=f'Benchmark Class {c}', time='09:00', created_by=teacher)
+            for c in range(options['classes'])
+        ]
+        people = Person.objects.bulk_create([
+            Person(student_id=f'DASHBENCH-{c}-{s}', name=f'Student {c}-{s}', email='')
+            for c in range(len(classes)) for s in range(options['students'])
+        ])
+        students = Student.objects.bulk_create([
+            Student(person=person, name=person.name, student_id=person.student_id, email='',
+                    class_enrolled=classes[i // options['students']])
+            for i, person in enumerate(people)
+        ])
+        # Today's attendance for half the classes, so every tile and the absences list have content
+        for class_obj in classes[::2]:
+            session = AttendanceSession.objects.create(class_session=class_obj, created_by=teacher, method='manual')
+            record_attendance(class_obj, session, {
+                student.id: 'present' if rng.random() < 0.85 else 'absent'
+                for student in students if student.class_enrolled_id == class_obj.id
+            }, 'manual')
+        return teacher
+
+    def _time(self, client, iterations, before=None):
+        latencies, queries = [], []
+        for _ in range(iterations):
+            if before:
+                before()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(reverse('dashboard'))
+                latencies.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.status_code
+            queries.append(len(captured.captured_queries))
+        return {
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'queries': max(queries),
+        }
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=USERNAME).delete()
+        teacher = self._create(options)
+        client = Client()
+        client.force_login(teacher)
+        iterations = options['iterations']
+
+        try:
+            client.get(reverse('dashboard'))  # Warm the template loader cache
+            # Only the benchmark lecturer's stamps are dropped, never the whole
+            # cache: other lecturers' fragments and analytics may share it
+            cold = lambda: forget(teacher.id)
+            with override_settings(DASHBOARD_FRAGMENT_TIMEOUT=0):
+                # Nothing is stored with a zero timeout; drop what the warm-up request cached
+                results = {'fragments off': self._time(client, iterations, before=cold)}
+            results['cold cache'] = self._time(client, iterations, before=cold)
+            client.get(reverse('dashboard'))
+            results['warm cache'] = self._time(client, iterations)
+            results['after attendance change'] = self._time(
+                client, iterations, before=lambda: bump('attendance', [teacher.id]))
+        finally:
+            forget(teacher.id)
+            teacher.delete()
+            Person.objects.filter(student_id__startswith='DASHBENCH-', enrollments__isnull=True).delete()
+
+        self.stdout.write(f"Dashboard with {options['classes']} classes x {options['students']} students:")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<26} p50 {row['p50_ms']:>8} ms  p95 {row['p95_ms']:>8} ms  queries {row['queries']:>4}"
+            )
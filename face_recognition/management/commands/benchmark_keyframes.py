@@ -0,0 +1,198 @@
+import heapq
+import io
+import json
+import math
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw
+
+from face_recognition.keyframes import KeyframeSelector, analyse, iter_frames
+
+
+VIEW_WIDTH, VIEW_HEIGHT = 640, 480
+FACE_RADIUS = 16
+
+
+class Command(BaseCommand):
+    help = 'Benchmark keyframe selection against sending every frame of a classroom burst to the face service'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clips', type=int, default=20, help='Synthetic clips to average over')
+        parser.add_argument('--students', type=int, default=40)
+        parser.add_argument('--dwells', type=int, default=3, help='Places the camera stops at while panning')
+        parser.add_argument('--dwell-frames', type=int, default=12, help='Mean frames per stop')
+        parser.add_argument('--move-frames', type=int, default=5, help='Frames per move between stops')
+        parser.add_argument('--shake-rate', type=float, default=0.35, help='Share of still frames blurred by shake')
+        parser.add_argument('--blur-limit', type=int, default=4,
+                            help='Longest motion blur (px) at which a face is still recognised')
+        parser.add_argument('--face-ms', type=float, default=900,
+                            help='Face service time per mark-attendance call (3 photos)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def _classroom(self, rng, width, students):
+        """Panorama of the room and the x, y of every face"""
+        noise = rng.normal(size=(VIEW_HEIGHT // 16, width // 16))
+        noise = (noise - noise.min()) / np.ptp(noise) * 120 + 60
+        room = Image.fromarray(noise.astype(np.uint8)).resize((width, VIEW_HEIGHT), Image.BICUBIC)
+        draw = ImageDraw.Draw(room)
+        for _ in range(width // 80):
+            x, y = int(rng.integers(0, width)), int(rng.integers(200, VIEW_HEIGHT))
+            draw.rectangle((x, y, x + int(rng.integers(60, 160)), y + 20), fill=int(rng.integers(30, 90)))
+
+        faces = np.column_stack([
+            rng.integers(FACE_RADIUS, width - FACE_RADIUS, students),
+            rng.integers(FACE_RADIUS + 40, VIEW_HEIGHT - FACE_RADIUS - 40, students),
+        ])
+        r = FACE_RADIUS
+        for x, y in faces:
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=int(rng.integers(170, 230)))
+            draw.ellipse((x - 8, y - 6, x - 3, y - 1), fill=20)
+            draw.ellipse((x + 3, y - 6, x + 8, y - 1), fill=20)
+            draw.line((x - 6, y + 7, x + 6, y + 7), fill=40, width=2)
+        return np.asarray(room, dtype=np.float32), faces
+
+    def _camera_path(self, rng, width, options):
+        """(x offset, motion blur px) per frame: stops across the room joined by fast pans"""
+        stops = np.linspace(0, width - VIEW_WIDTH, options['dwells']).astype(int)
+        path = []
+        for n, x in enumerate(stops):
+            if n:
+                previous = path[-1][0]
+                steps = options['move_frames']
+                speed = abs(x - previous) / steps
+                path += [(int(previous + (x - previous) * (s + 1) / (steps + 1)), int(speed * 0.5)) for s in range(steps)]
+            for _ in range(max(2, int(rng.poisson(options['dwell_frames'])))):
+                shaken = rng.random() < options['shake_rate']
+                blur = int(rng.integers(6, 18)) if shaken else int(rng.integers(0, 3))
+                jitter = int(rng.integers(-6, 7))
+                path.append((int(np.clip(x + jitter, 0, width - VIEW_WIDTH)), blur))
+        return path
+
+    @staticmethod
+    def _render(room, x, blur, rng):
+        """One JPEG frame of the view at x with horizontal motion blur"""
+        view = room[:, x:x + VIEW_WIDTH]
+        if blur > 1:
+            padded = np.pad(view, ((0, 0), (blur, 0)), mode='edge')
+            summed = np.cumsum(padded, axis=1)
+            view = (summed[:, blur:] - summed[:, :-blur]) / blur
+        view = np.clip(view + rng.normal(0, 3, view.shape), 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(view).save(buffer, 'JPEG', quality=85)
+        return buffer.getvalue()
+
+    def _clip(self, seed, options):
+        rng = np.random.default_rng(seed)
+        width = VIEW_WIDTH * options['dwells'] - 80 * (options['dwells'] - 1)
+        room, faces = self._classroom(rng, width, options['students'])
+        path = self._camera_path(rng, width, options)
+
+        def seen(frame):
+            """Students recognisable in a frame"""
+            x, blur = path[frame]
+            if blur > options['blur_limit']:
+                return set()
+            inside = (faces[:, 0] - FACE_RADIUS >= x) & (faces[:, 0] + FACE_RADIUS < x + VIEW_WIDTH)
+            return set(np.flatnonzero(inside).tolist())
+
+        # Rendered ahead so selection timings exclude rendering; uploads are handed over one at a time
+        render_rng = np.random.default_rng(seed + 1)
+        jpegs = [self._render(room, x, blur, render_rng) for x, blur in path]
+
+        def uploads():
+            for n, data in enumerate(jpegs):
+                yield SimpleUploadedFile(f'frame{n}.jpg', data, 'image/jpeg')
+
+        return jpegs, seen, uploads
+
+    def _timed(self, pick, uploads):
+        tracemalloc.start()
+        started = time.perf_counter()
+        frames = pick(uploads())
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return frames, elapsed, peak
+
+    @staticmethod
+    def _keyframes(uploads):
+        selector = KeyframeSelector(3)
+        for image, keep in iter_frames(uploads):
+            selector.add(image, keep)
+        return [frame.index for frame in selector.select()]
+
+    @staticmethod
+    def _sharpest(uploads):
+        best = []
+        for index, (image, _) in enumerate(iter_frames(uploads)):
+            heapq.heappush(best, (analyse(image)[0], index))
+            if len(best) > 3:
+                heapq.heappop(best)
+        return sorted(index for _, index in best)
+
+    def handle(self, *args, **options):
+        methods = {
+            'every frame': lambda count, uploads: (list(range(count)), 0.0, None),
+            'first/middle/last': lambda count, uploads: ([0, count // 2, count - 1], 0.0, None),
+            'sharpest 3': lambda count, uploads: self._timed(self._sharpest, uploads),
+            'keyframes (K=3)': lambda count, uploads: self._timed(self._keyframes, uploads),
+        }
+        samples = {name: {'coverage': [], 'frames': [], 'sent_kb': [], 'select_ms': [], 'peak_kb': []}
+                   for name in methods}
+
+        for clip in range(options['clips']):
+            jpegs, seen, uploads = self._clip(options['seed'] + clip * 7919, options)
+            possible = set().union(*(seen(n) for n in range(len(jpegs))))
+            for name, pick in methods.items():
+                frames, elapsed, peak = pick(len(jpegs), uploads)
+                covered = set().union(*(seen(n) for n in frames))
+                result = samples[name]
+                result['coverage'].append(len(covered) / max(len(possible), 1) * 100)
+                result['frames'].append(len(frames))
+                result['sent_kb'].append(sum(len(jpegs[n]) for n in frames) / 1024)
+                result['select_ms'].append(elapsed * 1000)
+                if peak is not None:
+                    result['peak_kb'].append(peak / 1024)
+
+        results = []
+        for name, result in samples.items():
+            calls = statistics.fmean(math.ceil(frames / 3) for frames in result['frames'])
+            select_ms = statistics.fmean(result['select_ms'])
+            results.append({
+                'method': name,
+                'frames_sent': round(statistics.fmean(result['frames']), 1),
+                'face_calls': round(calls, 1),
+                'coverage_pct': round(statistics.fmean(result['coverage']), 1),
+                'worst_coverage_pct': round(min(result['coverage']), 1),
+                'sent_kb': round(statistics.fmean(result['sent_kb']), 1),
+                'select_ms': round(select_ms, 1),
+                'total_ms': round(select_ms + calls * options['face_ms'], 1),
+                # Selection only; the other methods forward the frames as they are
+                'peak_memory_kb': round(max(result['peak_kb']), 1) if result['peak_kb'] else None,
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f"{options['clips']} clips, {options['students']} students, {options['dwells']} camera stops; "
+            f"coverage = recognisable students reached, relative to sending every frame; "
+            f"total = selection + {options['face_ms']:.0f} ms per face service call"
+        )
+        self.stdout.write(
+            f"{'method':<20}{'frames':>8}{'calls':>7}{'coverage %':>12}{'worst %':>9}"
+            f"{'sent KB':>9}{'select ms':>11}{'total ms':>10}{'peak KB':>9}"
+        )
+        for r in results:
+            peak = '-' if r['peak_memory_kb'] is None else r['peak_memory_kb']
+            self.stdout.write(
+                f"{r['method']:<20}{r['frames_sent']:>8}{r['face_calls']:>7}{r['coverage_pct']:>12}"
+                f"{r['worst_coverage_pct']:>9}{r['sent_kb']:>9}{r['select_ms']:>11}{r['total_ms']:>10}{peak:>9}"
+            )
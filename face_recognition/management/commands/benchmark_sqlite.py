@@ -0,0 +1,180 @@
+import copy
+import json
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.utils import timezone
+
+from face_recognition.db import atomic_with_retry, is_busy, record_attendance
+from face_recognition.models import Attendance, AttendanceSession, Class, Person, Student
+
+from .run_benchmarks import percentile
+
+
+# Stock Django SQLite settings: rollback journal, DEFERRED transactions, 5s busy timeout
+DEFAULT_OPTIONS = {}
+
+
+def write_per_student(alias, class_obj, session, statuses, marked_by):
+    """How attendance used to be written: one update_or_create (one transaction) per student"""
+    for student_pk, status in statuses.items():
+        Attendance.objects.using(alias).update_or_create(
+            student_id=student_pk,
+            class_session=class_obj,
+            date=timezone.now().date(),
+            defaults={'status': status, 'marked_by': marked_by, 'attendance_session': session}
+        )
+
+
+def write_batched(alias, class_obj, session, statuses, marked_by):
+    atomic_with_retry(lambda: record_attendance(class_obj, session, statuses, marked_by, using=alias), using=alias)
+
+
+WRITERS = {'per-student': write_per_student, 'batched': write_batched}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare attendance write throughput and "database is locked" errors under concurrent '
+        'submissions, with stock vs tuned SQLite settings and per-student vs batched writes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16, help='Concurrent submitting threads')
+        parser.add_argument('--submissions', type=int, default=10, help='Submissions per worker')
+        parser.add_argument('--classes', type=int, default=8)
+        parser.add_argument('--students', type=int, default=60, help='Students per class')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def _seed(self, alias, options):
+        rng = random.Random(options['seed'])
+        teacher = User.objects.db_manager(alias).create_user('sqlite_bench', 'sqlite_bench@example.com', 'x')
+        classes = Class.objects.using(alias).bulk_create([
+            Class(title=f'Bench {c}', time='09:00', created_by=teacher, enrollment_code=f'{rng.getrandbits(48):012X}')
+            for c in range(options['classes'])
+        ])
+        people = Person.objects.using(alias).bulk_create([
+            Person(student_id=f'B{c:03d}{s:04d}', name=f'Student {s}', email='')
+            for c in range(options['classes']) for s in range(options['students'])
+        ])
+        Student.objects.using(alias).bulk_create([
+            Student(person=person, name=person.name, student_id=person.student_id, email='',
+                    class_enrolled=classes[i // options['students']])
+            for i, person in enumerate(people)
+        ])
+
+    def _add_database(self, alias, path, db_options):
+        config = copy.deepcopy(connections.settings['default'])
+        config.update({'NAME': str(path), 'OPTIONS': db_options, 'CONN_MAX_AGE': 0})
+        connections.settings[alias] = config
+
+    def _remove_database(self, alias):
+        connections[alias].close()
+        del connections.settings[alias]
+
+    def _run(self, alias, writer, options):
+        teacher = User.objects.using(alias).get(username='sqlite_bench')
+        rosters = {
+            class_obj: list(class_obj.students.using(alias).values_list('id', flat=True))
+            for class_obj in Class.objects.using(alias).all()
+        }
+        classes = list(rosters)
+        latencies, errors, lock = [], {'locked': 0, 'other': 0}, threading.Lock()
+        barrier = threading.Barrier(options['workers'])
+
+        def worker(n):
+            rng = random.Random(options['seed'] * 1000 + n)
+            barrier.wait()  # Everyone starts submitting at once
+            try:
+                for _ in range(options['submissions']):
+                    class_obj = rng.choice(classes)
+                    statuses = {pk: 'present' if rng.random() < 0.85 else 'absent' for pk in rosters[class_obj]}
+                    started = time.perf_counter()
+                    try:
+                        session = AttendanceSession.objects.using(alias).create(
+                            class_session=class_obj, created_by=teacher, method='manual',
+                            processed=True, processing_status='completed'
+                        )
+                        writer(alias, class_obj, session, statuses, 'manual')
+                    except OperationalError as e:
+                        with lock:
+                            errors['locked' if is_busy(e) else 'other'] += 1
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['workers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        attempted = options['workers'] * options['submissions']
+        ms = [s * 1000 for s in latencies] or [0.0]
+        return {
+            'submissions': attempted,
+            'succeeded': len(latencies),
+            'lock_errors': errors['locked'],
+            'other_errors': errors['other'],
+            'lock_error_rate': round(errors['locked'] / attempted, 4),
+            'submissions_per_s': round(len(latencies) / wall, 1),
+            'rows_per_s': round(len(latencies) * options['students'] / wall, 1),
+            'p50_ms': round(percentile(ms, 50), 1),
+            'p95_ms': round(percentile(ms, 95), 1),
+            'mean_ms': round(statistics.fmean(ms), 1),
+            'wall_seconds': round(wall, 2),
+        }
+
+    def handle(self, *args, **options):
+        if connections.settings['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('This benchmark only applies to the SQLite backend')
+        tuned_options = connections.settings['default'].get('OPTIONS', {})
+
+        configs = {'stock': DEFAULT_OPTIONS, 'tuned': tuned_options}
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            template = Path(tmp) / 'template.sqlite3'
+            self._add_database('sqlite_bench_template', template, DEFAULT_OPTIONS)
+            try:
+                call_command('migrate', database='sqlite_bench_template', verbosity=0)
+                self._seed('sqlite_bench_template', options)
+            finally:
+                self._remove_database('sqlite_bench_template')
+
+            for config_name, db_options in configs.items():
+                for writer_name, writer in WRITERS.items():
+                    alias = f'sqlite_bench_{config_name}_{writer_name}'.replace('-', '_')
+                    path = Path(tmp) / f'{alias}.sqlite3'
+                    shutil.copy(template, path)
+                    self._add_database(alias, path, db_options)
+                    try:
+                        result = self._run(alias, writer, options)
+                    finally:
+                        self._remove_database(alias)
+                    results[f'{config_name} / {writer_name}'] = result
+                    if not options['json']:
+                        self.stdout.write(
+                            f"{config_name + ' / ' + writer_name:<24}"
+                            f"{result['succeeded']:>5}/{result['submissions']:<5}"
+                            f"locked {result['lock_errors']:>4} ({result['lock_error_rate']:>6.1%})  "
+                            f"{result['submissions_per_s']:>7} subm/s  {result['rows_per_s']:>8} rows/s  "
+                            f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms"
+                        )
+
+        if options['json']:
+            self.stdout.write(json.dumps({'options': {k: options[k] for k in (
+                'workers', 'submissions', 'classes', 'students', 'seed')}, 'results': results}, indent=2))
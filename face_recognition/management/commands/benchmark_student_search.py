@@ -0,0 +1,150 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from face_recognition.models import Class, Person, Student
+from face_recognition.student_search import FTS_TABLE, search_students
+
+from .generate_synthetic_data import FIRST_NAMES, SUBJECTS
+from .run_benchmarks import percentile
+
+
+USERNAME_PREFIX = 'search_bench_'
+SYLLABLES = ['ka', 'mu', 'ti', 'wa', 'nji', 'ro', 'ge', 'chi', 'lo', 'ba', 'ra', 'ny', 'ang', 'ko', 'se', 'mbo']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark indexed student search against icontains filtering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100_000, help='Students in the table')
+        parser.add_argument('--lecturers', type=int, default=50,
+                            help='Lecturers sharing the students, one of them owning half')
+        parser.add_argument('--class-size', type=int, default=250)
+        parser.add_argument('--queries', type=int, default=100, help='Names typed letter by letter')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _surname(self, rng):
+        return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+    def _create(self, rng, options):
+        """Lecturer 0 owns half the students (a department account); the rest share the other half"""
+        lecturers = User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{n}', email=f'{USERNAME_PREFIX}{n}@example.com')
+            for n in range(max(options['lecturers'], 2))
+        ])
+        class_count = max(options['students'] // options['class_size'], 2)
+        others = lecturers[1:]
+        owners = [lecturers[0] if c % 2 == 0 else others[c // 2 % len(others)] for c in range(class_count)]
+        classes = Class.objects.bulk_create([
+            Class(title=f'{rng.choice(SUBJECTS)} {c}', time='09:00', created_by=owner,
+                  enrollment_code=f'{rng.getrandbits(48):012X}')
+            for c, owner in enumerate(owners)
+        ])
+
+        people = []
+        for n in range(options['students']):
+            first, last = rng.choice(FIRST_NAMES), self._surname(rng)
+            people.append(Person(student_id=f'SRCH{n:07d}', name=f'{first} {last}',
+                                 email=f'{first}.{last}{n % 100}@students.example.ac'.lower()))
+        people = Person.objects.bulk_create(people, batch_size=5000)
+        started = time.perf_counter()
+        Student.objects.bulk_create([
+            Student(person=person, name=person.name, student_id=person.student_id, email=person.email,
+                    class_enrolled=classes[n % class_count])
+            for n, person in enumerate(people)
+        ], batch_size=5000)
+        return lecturers, time.perf_counter() - started
+
+    def _typed(self, rng, lecturer, count):
+        """What a lecturer types while looking for one of their students: every prefix of a name, ID or email"""
+        students = list(Student.objects.filter(class_enrolled__created_by=lecturer)
+                        .values_list('name', 'student_id', 'email').order_by('?')[:count])
+        queries = []
+        for name, student_id, email in students:
+            target = rng.choices([name, name.split()[-1], student_id[-5:], email.split('@')[0]], [5, 3, 1, 1])[0]
+            queries += [target[:n] for n in range(2, len(target) + 1)]
+        return queries
+
+    @staticmethod
+    def _icontains(lecturer, query, limit):
+        students = Student.objects.filter(class_enrolled__created_by=lecturer)
+        for word in query.split():
+            students = students.filter(
+                Q(name__icontains=word) | Q(student_id__icontains=word) | Q(email__icontains=word)
+            )
+        return list(students.select_related('class_enrolled').order_by('name', 'id')[:limit])
+
+    def _time(self, search, lecturer, queries, limit):
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            search(lecturer, query, limit)
+            latencies.append((time.perf_counter() - started) * 1000)
+        return {
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'max_ms': round(max(latencies), 2),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+        }
+
+    def _agreement(self, lecturer, queries, total):
+        """Share of queries where the index finds the same students as icontains (ignoring rank)"""
+        same = 0
+        for query in queries:
+            indexed = {s.id for s in search_students(lecturer, query, total, engine='index')[0]}
+            same += indexed == {s.id for s in self._icontains(lecturer, query, total)}
+        return round(same / len(queries) * 100, 1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('The search index is SQLite FTS5; other databases always use icontains')
+            return
+        rng = random.Random(options['seed'])
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        Person.objects.filter(student_id__startswith='SRCH', enrollments__isnull=True).delete()
+
+        try:
+            with transaction.atomic():
+                lecturers, insert_seconds = self._create(rng, options)
+            with connection.cursor() as cursor:
+                started = time.perf_counter()
+                cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+                rebuild_seconds = time.perf_counter() - started
+                cursor.execute(f'SELECT SUM(LENGTH(block)) FROM {FTS_TABLE}_data')
+                index_bytes = cursor.fetchone()[0] or 0
+                cursor.execute('SELECT COUNT(*) FROM face_recognition_student')
+                total = cursor.fetchone()[0]
+
+            self.stdout.write(
+                f"{total} students; index {index_bytes / 1024 / 1024:.1f} MB, full rebuild "
+                f"{rebuild_seconds:.2f} s, {options['students']} inserts through the triggers {insert_seconds:.2f} s"
+            )
+            self.stdout.write(f"{'lecturer':<22}{'search':<12}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'mean ms':>9}")
+            for label, lecturer in [('department', lecturers[0]), ('lecturer', lecturers[-1])]:
+                owned = Student.objects.filter(class_enrolled__created_by=lecturer).count()
+                queries = self._typed(rng, lecturer, options['queries'])
+                search_students(lecturer, queries[0], options['limit'])  # Warm the page cache
+                for name, search in [
+                    ('icontains', self._icontains),
+                    ('index', lambda *args: search_students(*args, engine='index')),
+                    ('auto', lambda *args: search_students(*args)),
+                ]:
+                    row = self._time(search, lecturer, queries, options['limit'])
+                    self.stdout.write(
+                        f"{label + f' ({owned})':<22}{name:<12}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+                        f"{row['max_ms']:>9}{row['mean_ms']:>9}"
+                    )
+                self.stdout.write(
+                    f"{'':<22}{len(queries)} keystrokes; index finds the same students as icontains for "
+                    f"{self._agreement(lecturer, queries[::10], total)}% of sampled queries"
+                )
+        finally:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+            Person.objects.filter(student_id__startswith='SRCH', enrollments__isnull=True).delete()
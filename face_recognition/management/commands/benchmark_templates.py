@@ -0,0 +1,88 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from face_recognition.embeddings import TemplateGallery, k_medoids, normalize
+
+
+class Command(BaseCommand):
+    help = 'Benchmark matching accuracy and latency for different templates-per-person (K) values'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--people', type=int, default=300)
+        parser.add_argument('--frames', type=int, default=24, help='Captured frames per person')
+        parser.add_argument('--poses', type=int, default=4, help='Distinct head poses (front, left, right, down)')
+        parser.add_argument('--probes', type=int, default=10, help='Probe faces per person')
+        parser.add_argument('--dim', type=int, default=128)
+        parser.add_argument('--pose-shift', type=float, default=1.0, help='How far profile views move the embedding')
+        parser.add_argument('--noise', type=float, default=0.9, help='Norm of per-frame noise')
+        parser.add_argument('--k', default='1,2,3,5,8', help='Comma-separated K values')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def _synthesize(self, rng, options):
+        """Identity vectors plus per-person pose offsets, with noisy frames and probes"""
+        n, d, poses = options['people'], options['dim'], options['poses']
+        identity = normalize(rng.standard_normal((n, d)))
+        offsets = normalize(rng.standard_normal((n, poses, d))) * options['pose_shift']
+        offsets[:, 0] = 0  # Pose 0 is the frontal view
+
+        def sample(count):
+            pose = rng.integers(0, poses, size=(n, count))
+            noise = rng.standard_normal((n, count, d)) * options['noise'] / np.sqrt(d)
+            return identity[:, None, :] + np.take_along_axis(offsets, pose[..., None], axis=1) + noise
+
+        return sample(options['frames']), sample(options['probes'])
+
+    def _evaluate(self, owners, templates, probes, truth, repeats=5):
+        gallery = TemplateGallery(owners, templates)
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            scores = gallery.scores(probes)
+            timings.append(time.perf_counter() - started)
+        predicted = gallery.owners[scores.argmax(axis=1)]
+        return {
+            'templates': len(templates),
+            'accuracy': round(float((predicted == truth).mean()) * 100, 2),
+            'ms_per_1000_probes': round(min(timings) / len(probes) * 1000 * 1000, 3),
+        }
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        frames, probe_sets = self._synthesize(rng, options)
+        n = options['people']
+
+        probes = probe_sets.reshape(-1, options['dim'])
+        truth = np.repeat(np.arange(n), options['probes'])
+        results = []
+
+        mean = normalize(frames.mean(axis=1))
+        results.append({'method': 'mean (1 averaged)', 'k': 1, **self._evaluate(np.arange(n), mean, probes, truth)})
+
+        for k in [int(value) for value in options['k'].split(',')]:
+            started = time.perf_counter()
+            chosen = [frames[i][k_medoids(frames[i], k)] for i in range(n)]
+            compaction_ms = (time.perf_counter() - started) / n * 1000
+            owners = np.concatenate([[i] * len(c) for i, c in enumerate(chosen)])
+            result = self._evaluate(owners, np.concatenate(chosen), probes, truth)
+            results.append({'method': f'k-medoids K={k}', 'k': k, 'compaction_ms_per_person': round(compaction_ms, 3), **result})
+
+        owners = np.repeat(np.arange(n), options['frames'])
+        results.append({
+            'method': f"all frames (K={options['frames']})", 'k': options['frames'],
+            **self._evaluate(owners, frames.reshape(-1, options['dim']), probes, truth)
+        })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{n} people, {options['frames']} frames each, {len(probes)} probes, dim {options['dim']}")
+        self.stdout.write(f"{'method':<24}{'templates':>10}{'accuracy %':>12}{'ms/1000 probes':>16}")
+        for result in results:
+            self.stdout.write(
+                f"{result['method']:<24}{result['templates']:>10}{result['accuracy']:>12}{result['ms_per_1000_probes']:>16}"
+            )
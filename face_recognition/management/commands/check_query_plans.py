@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from face_recognition.query_plans import check_hot_queries
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN QUERY PLAN every hot view query and fail if any reads a whole table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Only check these hot queries')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not just failures')
+
+    def handle(self, *args, **options):
+        try:
+            results = check_hot_queries(options['names'] or None)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        if not results:
+            raise CommandError('No data to check. Run "python manage.py generate_synthetic_data" first.')
+
+        failures = [r for r in results if r['scans']]
+        for result in results:
+            if result['scans'] or options['verbose_plans']:
+                style = self.style.ERROR if result['scans'] else self.style.SUCCESS
+                self.stdout.write(style(result['name']) + f"  {result['sql'][:200]}")
+                for step in result['plan']:
+                    self.stdout.write(f'    {step}')
+
+        checked = sorted({r['name'] for r in results})
+        self.stdout.write(f"Checked {len(results)} statements from {len(checked)} hot queries: {', '.join(checked)}")
+        if failures:
+            names = sorted({r['name'] for r in failures})
+            raise CommandError(f"{len(failures)} statements read a whole table: {', '.join(names)}")
+        self.stdout.write(self.style.SUCCESS('No full table scans'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from face_recognition.session_events import expire_stale_sessions
+
+
+class Command(BaseCommand):
+    help = ('Mark attendance sessions failed that have not finished processing within SESSION_PROCESSING_TIMEOUT, '
+            'e.g. after a worker process was restarted mid-recognition (run it from cron or at deploy)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{expire_stale_sessions()} stale session(s) marked failed')
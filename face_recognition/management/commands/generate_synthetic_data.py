@@ -0,0 +1,149 @@
+import random
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from face_recognition.models import Attendance, AttendanceSession, Class, Person, Student
+
+
+USERNAME_PREFIX = 'synthetic_teacher_'
+PASSWORD = 'benchmark-password'
+
+FIRST_NAMES = ['Amina', 'Brian', 'Chebet', 'David', 'Esther', 'Faith', 'George', 'Halima', 'Ian', 'Joy',
+               'Kevin', 'Lilian', 'Moses', 'Njeri', 'Otieno', 'Purity', 'Quincy', 'Rose', 'Samuel', 'Wanjiru']
+LAST_NAMES = ['Achieng', 'Barasa', 'Chege', 'Gathii', 'Kamau', 'Kiprop', 'Mutua', 'Njoroge', 'Odhiambo',
+              'Omondi', 'Onyango', 'Otieno', 'Wafula', 'Wambui', 'Wanjiku']
+SUBJECTS = ['Database Systems', 'Computer Networks', 'Linear Algebra', 'Operating Systems', 'Data Structures',
+            'Software Engineering', 'Statistics', 'Machine Learning', 'Discrete Mathematics', 'Compilers']
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic dataset of teachers, classes, students and attendance history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teachers', type=int, default=5)
+        parser.add_argument('--classes', type=int, default=4, help='Classes per teacher')
+        parser.add_argument('--students', type=int, default=60, help='Students per class')
+        parser.add_argument('--days', type=int, default=60, help='Days of attendance history (weekdays only)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--flush', action='store_true', help='Delete previously generated synthetic data first')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        if options['flush']:
+            deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+            Person.objects.filter(student_id__startswith='SYN', enrollments__isnull=True).delete()
+            self.stdout.write(f'Removed {deleted} synthetic rows')
+
+        start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        today = timezone.now().date()
+        days = []
+        day = today
+        while len(days) < options['days']:
+            if day.weekday() < 5:
+                days.append(day)
+            day -= timedelta(days=1)
+        days.reverse()
+
+        with transaction.atomic():
+            teachers = []
+            for t in range(start, start + options['teachers']):
+                teacher = User(
+                    username=f'{USERNAME_PREFIX}{t}',
+                    email=f'{USERNAME_PREFIX}{t}@example.com',
+                    first_name=rng.choice(FIRST_NAMES),
+                    last_name=rng.choice(LAST_NAMES)
+                )
+                teacher.set_password(PASSWORD)
+                teachers.append(teacher)
+            teachers = User.objects.bulk_create(teachers)
+
+            classes = []
+            for teacher in teachers:
+                for c in range(options['classes']):
+                    classes.append(Class(
+                        title=f'{rng.choice(SUBJECTS)} {100 + c}',
+                        time=time(8 + c % 9, 0),
+                        created_by=teacher,
+                        enrollment_code=f'{rng.getrandbits(48):012X}'  # bulk_create skips Class.save()
+                    ))
+            classes = Class.objects.bulk_create(classes)
+
+            people = Person.objects.bulk_create([
+                Person(
+                    student_id=f'SYN{class_obj.id:05d}{s:05d}',
+                    name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    email=f'syn{class_obj.id}.{s}@students.example.com',
+                    face_encoding='',
+                    template_enrolled_at=timezone.now()
+                )
+                for class_obj in classes for s in range(options['students'])
+            ], batch_size=batch_size)
+            students = Student.objects.bulk_create([
+                Student(
+                    person=person,
+                    name=person.name,
+                    student_id=person.student_id,
+                    email=person.email,
+                    class_enrolled=classes[i // options['students']]
+                )
+                for i, person in enumerate(people)
+            ], batch_size=batch_size)
+
+            # Each student has their own habits; each class a preferred marking method
+            reliability = {student.id: rng.uniform(0.55, 0.98) for student in students}
+            roster = {}
+            for student in students:
+                roster.setdefault(student.class_enrolled_id, []).append(student)
+
+            facial_share = {class_obj.id: rng.uniform(0.5, 0.95) for class_obj in classes}
+            records = 0
+            # date/time are auto_now_add, so inserts are stamped with now whatever we set. Rows are
+            # inserted one day at a time (so the unique (student, class, date) never clashes) and
+            # then given their real date with bulk_update, which doesn't touch auto fields.
+            for day in days:
+                sessions = AttendanceSession.objects.bulk_create([
+                    AttendanceSession(
+                        class_session=class_obj,
+                        created_by=class_obj.created_by,
+                        method='facial' if rng.random() < facial_share[class_obj.id] else 'manual',
+                        processed=True,
+                        processing_status='completed'
+                    )
+                    for class_obj in classes
+                ], batch_size=batch_size)
+                attendance = []
+                for session in sessions:
+                    session.date, session.time = day, session.class_session.time
+                    for student in roster.get(session.class_session_id, []):
+                        roll = rng.random()
+                        if roll < reliability[student.id]:
+                            status = 'present'
+                        elif roll < reliability[student.id] + 0.05:
+                            status = 'late'
+                        else:
+                            status = 'absent'
+                        attendance.append(Attendance(
+                            student=student,
+                            class_session=session.class_session,
+                            attendance_session=session,
+                            status=status,
+                            marked_by=session.method
+                        ))
+                Attendance.objects.bulk_create(attendance, batch_size=batch_size)
+                for row in attendance:
+                    row.date, row.time = day, row.attendance_session.time
+                AttendanceSession.objects.bulk_update(sessions, ['date', 'time'], batch_size=batch_size)
+                Attendance.objects.bulk_update(attendance, ['date', 'time'], batch_size=batch_size)
+                records += len(attendance)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(teachers)} teachers, {len(classes)} classes, {len(students)} students, '
+            f'{records} attendance records over {len(days)} days. Teacher password: {PASSWORD}'
+        ))
@@ -0,0 +1,247 @@
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from face_recognition.face_service_stub import POSES
+from face_recognition.models import Attendance, AttendanceSession, Class, Person, Student
+
+from .generate_synthetic_data import PASSWORD, USERNAME_PREFIX
+from .run_benchmarks import percentile, restore_attendance
+
+
+STUDENT_PREFIX = 'LOAD-'
+
+
+class Recorder:
+    """Thread-safe latency/outcome log per action"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}  # action -> [(seconds, ok)]
+
+    def timed(self, action, call, ok=lambda response: response.status_code < 400, started=None):
+        started = time.perf_counter() if started is None else started
+        try:
+            response = call()
+            success = ok(response)
+        except requests.RequestException:
+            response, success = None, False
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples.setdefault(action, []).append((elapsed, success))
+        return response if success else None
+
+    def summary(self, wall_seconds):
+        rows = {}
+        for action, samples in sorted(self.samples.items()):
+            latencies = [s * 1000 for s, _ in samples]
+            rows[action] = {
+                'requests': len(samples),
+                'errors': sum(1 for _, ok in samples if not ok),
+                'rps': round(len(samples) / wall_seconds, 2),
+                'p50_ms': round(percentile(latencies, 50), 1),
+                'p95_ms': round(percentile(latencies, 95), 1),
+                'p99_ms': round(percentile(latencies, 99), 1),
+                'mean_ms': round(statistics.fmean(latencies), 1),
+                'max_ms': round(max(latencies), 1),
+            }
+        return rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive a running Django server with concurrent simulated lecturers and enrolling students. '
+        'Start the server with FACE_API_URL pointing at face_recognition.face_service_stub first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Running Django server')
+        parser.add_argument('--face-url', default=None, help='Face service (stub) URL; defaults to FACE_API_URL')
+        parser.add_argument('--lecturers', type=int, default=5, help='Concurrent lecturers taking attendance')
+        parser.add_argument('--students', type=int, default=10, help='Concurrent students enrolling')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+        parser.add_argument('--think-time', type=float, default=1.0, help='Mean pause between user actions (s)')
+        parser.add_argument('--photo-kb', type=int, default=200, help='Size of each uploaded classroom photo')
+        parser.add_argument('--request-timeout', type=float, default=120)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the students and attendance sessions created by the run')
+
+    def _seed_stub(self, face_url, classes):
+        """Tell the stub who is in each class so attendance photos recognise someone"""
+        for class_obj in classes:
+            student_ids = list(class_obj.students.values_list('student_id', flat=True))
+            try:
+                requests.post(f'{face_url}/stub/classes/{class_obj.enrollment_code}',
+                              json={'student_ids': student_ids}, timeout=10).raise_for_status()
+            except requests.RequestException as e:
+                raise CommandError(f'Face service stub not reachable at {face_url}: {e}')
+
+    def _login(self, base_url, email, timeout):
+        session = requests.Session()
+        session.get(f'{base_url}/login/', timeout=timeout)
+        response = session.post(f'{base_url}/login/', timeout=timeout, allow_redirects=False, data={
+            'email': email, 'password': PASSWORD, 'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+        }, headers={'Referer': f'{base_url}/login/'})
+        if response.status_code != 302:
+            raise CommandError(f'Could not log in as {email} (HTTP {response.status_code})')
+        return session
+
+    def _lecturer(self, recorder, session, class_ids, rng, stop, options):
+        base, timeout = options['base_url'], options['request_timeout']
+        while not stop.is_set():
+            class_id = rng.choice(class_ids)
+            recorder.timed('dashboard', lambda: session.get(f'{base}/dashboard/', timeout=timeout))
+            page = recorder.timed('mark_attendance', lambda: session.get(
+                f'{base}/mark-attendance/{class_id}/', timeout=timeout))
+            if page is not None:
+                photos = {
+                    f'photo{n}': (f'photo{n}.jpg', rng.randbytes(options['photo_kb'] * 1024), 'image/jpeg')
+                    for n in (1, 2, 3)
+                }
+                submitted = time.perf_counter()
+                response = recorder.timed('mark_attendance_facial', lambda: session.post(
+                    f'{base}/mark-attendance-facial/{class_id}/', files=photos, timeout=timeout,
+                    headers={'X-CSRFToken': session.cookies.get('csrftoken', ''), 'Referer': page.url,
+                             'Accept': 'application/json'}))
+                if response is not None:
+                    # Upload to final status, as the lecturer waiting on the page sees it
+                    recorder.timed('attendance_processing', lambda: self._final_status(
+                        session, f"{base}{response.json()['events_url']}", timeout
+                    ), ok=lambda status: status == 'completed', started=submitted)
+            stop.wait(rng.expovariate(1 / options['think_time']) if options['think_time'] else 0)
+
+    @staticmethod
+    def _final_status(session, events_url, timeout):
+        """Follow a session's status stream until it finishes; returns the last status"""
+        status = None
+        with session.get(events_url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('data: '):
+                    status = json.loads(line[len('data: '):])['status']
+        return status
+
+    def _student(self, recorder, codes, worker, run_id, rng, stop, options):
+        base, timeout = options['base_url'], options['request_timeout']
+        number = 0
+        while not stop.is_set():
+            number += 1
+            code = rng.choice(codes)
+            student_id = f'{STUDENT_PREFIX}{run_id}-{worker}-{number}'
+            session = requests.Session()
+            page = recorder.timed('enroll_page', lambda: session.get(f'{base}/enroll/{code}/', timeout=timeout))
+            if page is None:
+                continue
+            headers = {'Referer': page.url, 'X-CSRFToken': session.cookies.get('csrftoken', '')}
+            capture = f'{base}/enroll/{code}/capture'
+            if recorder.timed('enroll_capture_start', lambda: session.post(
+                    f'{capture}/start/', json={'student_id': student_id, 'email': ''}, headers=headers,
+                    timeout=timeout)) is None:
+                continue
+            for _ in POSES:
+                frame = rng.randbytes(30 * 1024)
+                recorder.timed('enroll_capture_frame', lambda: session.post(
+                    f'{capture}/frame/', files={'file': ('frame.jpg', frame, 'image/jpeg')}, headers=headers,
+                    timeout=timeout))
+            if recorder.timed('enroll_capture_complete', lambda: session.post(
+                    f'{capture}/complete/', headers=headers, timeout=timeout)) is None:
+                continue
+            recorder.timed('enroll_save', lambda: session.post(
+                f'{base}/enroll/{code}/', timeout=timeout,
+                data=json.dumps({'name': f'Load Student {number}', 'student_id': student_id, 'email': ''}),
+                headers={'Content-Type': 'application/json', **headers}),
+                ok=lambda response: response.status_code == 200 and response.json().get('success'))
+            stop.wait(rng.expovariate(1 / options['think_time']) if options['think_time'] else 0)
+
+    def handle(self, *args, **options):
+        options['base_url'] = options['base_url'].rstrip('/')
+        options['face_url'] = (options['face_url'] or getattr(settings, 'FACE_API_URL', 'http://localhost:8001')).rstrip('/')
+
+        classes = list(Class.objects.filter(created_by__username__startswith=USERNAME_PREFIX)
+                       .select_related('created_by').order_by('id'))
+        if not classes:
+            raise CommandError('No synthetic data found. Run "python manage.py generate_synthetic_data" first.')
+        self._seed_stub(options['face_url'], classes)
+
+        by_teacher = {}
+        for class_obj in classes:
+            by_teacher.setdefault(class_obj.created_by, []).append(class_obj.id)
+        teachers = list(by_teacher)
+
+        started_sessions = AttendanceSession.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        today = timezone.now().date()
+        todays_attendance = list(Attendance.objects.filter(class_session__in=classes, date=today))
+        recorder = Recorder()
+        stop = threading.Event()
+        run_id = uuid.uuid4().hex[:6]
+        threads = []
+        for n in range(options['lecturers']):
+            teacher = teachers[n % len(teachers)]
+            session = self._login(options['base_url'], teacher.email, options['request_timeout'])
+            rng = random.Random(options['seed'] * 1000 + n)
+            threads.append(threading.Thread(target=self._lecturer, daemon=True,
+                                            args=(recorder, session, by_teacher[teacher], rng, stop, options)))
+        codes = [class_obj.enrollment_code for class_obj in classes]
+        for n in range(options['students']):
+            rng = random.Random(options['seed'] * 1000 + 500 + n)
+            threads.append(threading.Thread(target=self._student, daemon=True,
+                                            args=(recorder, codes, n, run_id, rng, stop, options)))
+
+        self.stdout.write(f"Running {options['lecturers']} lecturers and {options['students']} students "
+                          f"against {options['base_url']} for {options['duration']:g}s...")
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            time.sleep(options['duration'])
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        wall = time.perf_counter() - started
+
+        rows = recorder.summary(wall)
+        self.stdout.write(f"{'action':<24}{'reqs':>7}{'errs':>6}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+        for action, row in rows.items():
+            self.stdout.write(
+                f"{action:<24}{row['requests']:>7}{row['errors']:>6}{row['rps']:>8}"
+                f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}"
+            )
+        total = sum(row['requests'] for row in rows.values())
+        errors = sum(row['errors'] for row in rows.values())
+        self.stdout.write(f'Django tier: {total} requests, {errors} errors, {total / wall:.1f} req/s over {wall:.1f}s')
+
+        try:
+            stub_stats = requests.get(f"{options['face_url']}/stub/stats", timeout=10).json()
+        except (requests.RequestException, ValueError):
+            stub_stats = None
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'options': {k: options[k] for k in ('base_url', 'face_url', 'lecturers', 'students', 'duration',
+                                                    'think_time', 'photo_kb', 'seed')},
+                'wall_seconds': round(wall, 2),
+                'django': {'requests': total, 'errors': errors, 'rps': round(total / wall, 2)},
+                'actions': rows,
+                'face_service': stub_stats,
+            }, indent=2))
+
+        if not options['keep']:
+            with transaction.atomic():
+                restore_attendance([c.id for c in classes], today, todays_attendance)
+                Student.objects.filter(student_id__startswith=STUDENT_PREFIX).delete()
+                Person.objects.filter(student_id__startswith=STUDENT_PREFIX).delete()
+                AttendanceSession.objects.filter(id__gt=started_sessions,
+                                                 class_session__in=[c.id for c in classes]).delete()
@@ -0,0 +1,227 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from face_recognition import analytics, dashboard
+from face_recognition.attendance_processing import process_facial_attendance
+from face_recognition.models import Attendance, AttendanceSession, Class, Person, Student
+
+from .generate_synthetic_data import USERNAME_PREFIX
+
+
+BENCHMARKS = ['dashboard', 'mark_attendance', 'mark_attendance_facial', 'mark_attendance_manual', 'save_enrollment']
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def restore_attendance(class_ids, today, rows):
+    """
+    Put today's attendance rows of these classes back as they were
+
+    Marking attendance points today's existing rows at the new session, so
+    deleting the sessions a run created would cascade to them. Call this
+    first. bulk_update leaves auto_now_add fields alone, so dates and times
+    come back exactly.
+    """
+    fields = [f.name for f in Attendance._meta.concrete_fields if not f.primary_key]
+    Attendance.objects.bulk_update(rows, fields, batch_size=1000)
+    dashboard.bump_for_classes('attendance', class_ids)
+    analytics.invalidate([(class_id, today) for class_id in class_ids])
+
+
+class FakeFaceAPI:
+    """Stands in for the face service so only the Django tier is timed"""
+
+    def __init__(self, student_ids):
+        self.student_ids = student_ids
+
+    def mark_attendance(self, class_code, image_files):
+        present = self.student_ids[: int(len(self.student_ids) * 0.85)]
+        return {'success': True, 'present_students': present, 'total_detected': len(present), 'confidence_scores': {}}
+
+
+class Command(BaseCommand):
+    help = 'Time the main views through the Django test client and compare against a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', help='Comma-separated subset of: ' + ', '.join(BENCHMARKS))
+        parser.add_argument('--output', help='Write machine-readable results to this JSON file')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown in p50/p95 latency before a regression is reported (0.25 = 25%%)')
+
+    def _pick_class(self):
+        """The biggest class of a synthetic teacher (run generate_synthetic_data first)"""
+        class_obj = (
+            Class.objects.filter(created_by__username__startswith=USERNAME_PREFIX)
+            .annotate(size=Count('students'))
+            .order_by('-size', 'id')
+            .select_related('created_by')
+            .first()
+        )
+        if class_obj is None:
+            raise CommandError('No synthetic data found. Run "python manage.py generate_synthetic_data" first.')
+        return class_obj
+
+    def _requests(self, class_obj):
+        """name -> callable(client, iteration) issuing one request"""
+        student_pks = [str(pk) for pk in class_obj.students.values_list('id', flat=True)]
+        present = student_pks[: int(len(student_pks) * 0.8)]
+
+        def photos():
+            return {f'photo{n}': SimpleUploadedFile(f'photo{n}.jpg', b'\xff\xd8' + b'\0' * 50_000, 'image/jpeg')
+                    for n in (1, 2, 3)}
+
+        return {
+            'dashboard': lambda client, i: client.get(reverse('dashboard')),
+            'mark_attendance': lambda client, i: client.get(reverse('mark_attendance', args=[class_obj.id])),
+            'mark_attendance_facial': lambda client, i: client.post(
+                reverse('mark_attendance_facial', args=[class_obj.id]), photos()),
+            'mark_attendance_manual': lambda client, i: client.post(
+                reverse('mark_attendance_manual', args=[class_obj.id]), {'present_students': present}),
+            'save_enrollment': lambda client, i: client.post(
+                reverse('save_enrollment'),
+                json.dumps({'name': 'Bench Student', 'student_id': f'BENCH-{i}-{time.time_ns()}',
+                            'email': '', 'class_id': class_obj.id}),
+                content_type='application/json'),
+        }
+
+    def _run(self, name, send, client, iterations, warmup):
+        for i in range(warmup):
+            send(client, -1 - i)
+
+        latencies, queries = [], []
+        for i in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = send(client, i)
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f'{name} returned HTTP {response.status_code}')
+            queries.append(len(captured.captured_queries))
+
+        # Peak memory is measured separately; tracemalloc would skew the timings
+        tracemalloc.start()
+        send(client, iterations)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'iterations': iterations,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p90_ms': round(percentile(latencies, 90), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'max_ms': round(max(latencies), 3),
+            'queries_mean': round(statistics.fmean(queries), 1),
+            'queries_max': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def _compare(self, results, baseline, tolerance):
+        """List of human-readable regressions against the baseline"""
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get('results', {}).get(name)
+            if not before:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                if result[key] > before[key] * (1 + tolerance):
+                    regressions.append(f'{name} {key}: {before[key]} -> {result[key]} ms')
+            if result['queries_max'] > before['queries_max']:
+                regressions.append(f"{name} queries: {before['queries_max']} -> {result['queries_max']}")
+        return regressions
+
+    def handle(self, *args, **options):
+        names = options['only'].split(',') if options['only'] else BENCHMARKS
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+        class_obj = self._pick_class()
+        client = Client()
+        client.force_login(class_obj.created_by)
+        requests_by_name = self._requests(class_obj)
+        fake_api = FakeFaceAPI(list(class_obj.students.values_list('student_id', flat=True)))
+
+        started_sessions = AttendanceSession.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        today = timezone.now().date()
+        todays_attendance = list(Attendance.objects.filter(class_session=class_obj, date=today))
+        results = {}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), \
+                mock.patch('face_recognition.face_api_client.FaceAPIClient.mark_attendance',
+                           lambda self, class_code, image_files: fake_api.mark_attendance(class_code, image_files)), \
+                mock.patch('face_recognition.attendance_processing.start_facial_attendance',
+                           process_facial_attendance), \
+                mock.patch('face_recognition.views._completed_capture',
+                           lambda request, class_obj: json.loads(request.body)['student_id']):
+            # Recognition runs inline, so mark_attendance_facial still times upload + processing;
+            # save_enrollment times the save only, as if each student had just finished the pose capture
+            try:
+                for name in names:
+                    results[name] = self._run(name, requests_by_name[name], client,
+                                              options['iterations'], options['warmup'])
+                    self.stdout.write(
+                        f"{name:<24} p50 {results[name]['p50_ms']:>9} ms  p95 {results[name]['p95_ms']:>9} ms  "
+                        f"queries {results[name]['queries_max']:>5}  peak {results[name]['peak_memory_kb']:>9} KB"
+                    )
+            finally:
+                # Leave the dataset as it was; the session delete cascades only to rows the run created
+                with transaction.atomic():
+                    restore_attendance([class_obj.id], today, todays_attendance)
+                    AttendanceSession.objects.filter(id__gt=started_sessions).delete()
+                    Student.objects.filter(student_id__startswith='BENCH-').delete()
+                    Person.objects.filter(student_id__startswith='BENCH-').delete()
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'class_size': class_obj.students.count(),
+                'teacher_classes': class_obj.created_by.classes.count(),
+                'attendance_rows': Attendance.objects.count(),
+            },
+            'results': results,
+        }
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2))
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+
+        if baseline_path.exists():
+            regressions = self._compare(results, json.loads(baseline_path.read_text()), options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from face_recognition.models import RosterImport
+from face_recognition.roster_import import run_roster_import
+
+
+class Command(BaseCommand):
+    help = 'Run or resume face enrollment for a bulk roster import'
+
+    def add_arguments(self, parser):
+        parser.add_argument('import_id', type=int)
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Concurrent FastAPI enrollment calls (default: BULK_ENROLL_WORKERS)')
+        parser.add_argument('--force', action='store_true',
+                            help='Resume an import still marked as running, e.g. after a crash')
+
+    def handle(self, *args, **options):
+        if not RosterImport.objects.filter(pk=options['import_id']).exists():
+            raise CommandError(f"Roster import {options['import_id']} does not exist")
+
+        roster_import = run_roster_import(options['import_id'], workers=options['workers'], force=options['force'])
+        if roster_import is None:
+            raise CommandError('Import is already running; use --force to resume it anyway')
+
+        self.stdout.write(
+            f'{roster_import.enrolled}/{roster_import.total} enrolled, {roster_import.failed} failed, '
+            f'{roster_import.students_per_minute()} students/minute'
+        )
+        for row in roster_import.rows.filter(status='failed').select_related('student'):
+            self.stdout.write(f'  line {row.line_number} ({row.student.student_id}): {row.error}')
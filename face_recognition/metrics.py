@@ -0,0 +1,274 @@
+"""
+In-process performance metrics rendered in Prometheus text format
+
+Counters and histograms are aggregated per process under a lock. With
+several worker processes (gunicorn/uwsgi), set METRICS_MULTIPROC_DIR: each
+process then periodically dumps its totals to <dir>/<pid>.json and the
+/metrics view sums every file, so any worker can answer a scrape.
+
+The totals of a worker that exits are folded into <dir>/archive.json (as
+prometheus_client's multiprocess mode does), so counters and histograms
+never go down when workers are recycled; Prometheus would read a drop as a
+counter reset. A worker archives its own file at exit, and files left by
+workers that died without exiting cleanly are archived at the next scrape.
+Archiving and scraping hold a lock on <dir>/archive.lock, so a scrape never
+counts a worker twice or not at all.
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+HELP = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by URL name'),
+    'http_request_db_queries': ('histogram', 'Database queries per request by URL name'),
+    'http_request_db_seconds_total': ('counter', 'Time spent in database queries by URL name'),
+    'http_request_face_service_seconds_total': ('counter', 'Time spent calling the face service by URL name'),
+    'http_request_query_budget_exceeded_total': ('counter', 'Requests over their query-count budget'),
+    'face_service_request_duration_seconds': ('histogram', 'Face service call latency by client method'),
+    'face_service_sent_bytes_total': ('counter', 'Bytes sent to the face service'),
+    'face_service_received_bytes_total': ('counter', 'Bytes received from the face service'),
+    'face_service_errors_total': ('counter', 'Failed face service calls'),
+    'template_render_duration_seconds': ('histogram', 'Page render time (queries included) by template'),
+    'db_busy_retries_total': ('counter', 'Write transactions retried because SQLite was locked'),
+    'db_busy_errors_total': ('counter', 'Write transactions that failed because SQLite stayed locked'),
+    'face_admission_wait_seconds': ('histogram', 'Time face service calls waited for an admission slot by pool'),
+    'face_admission_rejected_total': ('counter', 'Face service calls rejected by admission control by pool and reason'),
+    'face_read_requests_total': ('counter', 'Idempotent face service reads by outcome (hit, stale, coalesced, miss)'),
+    'keyframe_selection_seconds': ('histogram', 'Time to pick keyframes from a video or burst upload'),
+    'keyframe_frames_scored_total': ('counter', 'Video/burst frames scored for keyframe selection'),
+}
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_last_dump = 0.0
+
+# Per-request accumulator for face-service time, set by the middleware
+current_request = contextvars.ContextVar('metrics_current_request', default=None)
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(**labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = (name, _labels(**labels))
+    with _lock:
+        state = _histograms.get(key)
+        if state is None:
+            state = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                state[i] += 1
+        state[-2] += 1
+        state[-1] += value
+    _maybe_dump()
+
+
+def record_face_call(call, seconds, sent_bytes, received_bytes, error=False):
+    """Record one FaceAPIClient HTTP call, globally and against the current request"""
+    observe('face_service_request_duration_seconds', seconds, call=call)
+    inc('face_service_sent_bytes_total', sent_bytes, call=call)
+    inc('face_service_received_bytes_total', received_bytes, call=call)
+    if error:
+        inc('face_service_errors_total', call=call)
+    stats = current_request.get()
+    if stats is not None:
+        stats['face_seconds'] += seconds
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [[name, list(map(list, labels)), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, list(map(list, labels)), list(state)] for (name, labels), state in _histograms.items()],
+        }
+
+
+def _multiproc_dir():
+    directory = getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+    return Path(directory) if directory else None
+
+
+def dump(force=False):
+    """Write this process's totals for the /metrics view of other workers"""
+    global _last_dump
+    directory = _multiproc_dir()
+    if directory is None:
+        return
+    now = time.monotonic()
+    if not force and now - _last_dump < getattr(settings, 'METRICS_DUMP_INTERVAL', 1.0):
+        return
+    _last_dump = now
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / f'{os.getpid()}.json'
+    tmp = target.with_suffix('.tmp')
+    tmp.write_text(json.dumps(_snapshot()))
+    os.replace(tmp, target)
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None  # Gone, or being replaced by its worker right now
+
+
+def _add(counters, histograms, snapshot):
+    for name, labels, value in snapshot['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, state in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], state)]
+        else:
+            histograms[key] = list(state)
+
+
+@contextmanager
+def _archive_lock(directory):
+    """Held while the archive changes or the dumps are read (no locking without fcntl)"""
+    if fcntl is None:
+        yield
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / 'archive.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _archive(directory, paths):
+    """Add the dumps of exited workers to archive.json and delete them; call with the lock held"""
+    counters, histograms = {}, {}
+    for path in [directory / 'archive.json', *paths]:
+        snapshot = _read(path)
+        if snapshot is not None:
+            _add(counters, histograms, snapshot)
+    tmp = directory / 'archive.tmp'
+    tmp.write_text(json.dumps({
+        'counters': [[name, list(map(list, labels)), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(map(list, labels)), state] for (name, labels), state in histograms.items()],
+    }))
+    os.replace(tmp, directory / 'archive.json')
+    for path in paths:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+@atexit.register
+def _archive_own_dump():
+    """Archive this worker's totals when it exits (looked up at exit, so forked workers archive their own)"""
+    try:
+        directory = _multiproc_dir()
+    except ImproperlyConfigured:
+        return
+    if directory is not None:
+        with _archive_lock(directory):
+            dump(force=True)
+            _archive(directory, [directory / f'{os.getpid()}.json'])
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OverflowError):
+        pass
+    return True
+
+
+def _maybe_dump():
+    if _multiproc_dir() is not None:
+        dump()
+
+
+def _merged():
+    """Sum of every process's totals, past and present (or just this process's)"""
+    counters, histograms = {}, {}
+    directory = _multiproc_dir()
+    if directory is None:
+        _add(counters, histograms, _snapshot())
+        return counters, histograms
+
+    dump(force=True)
+    with _archive_lock(directory):
+        dumps = [path for path in directory.glob('*.json') if path.stem.isdigit()]
+        dead = [path for path in dumps if not _alive(int(path.stem))]
+        if dead:
+            _archive(directory, dead)  # Their workers died without exiting cleanly
+        for path in [directory / 'archive.json', *(path for path in dumps if path not in dead)]:
+            snapshot = _read(path)
+            if snapshot is not None:
+                _add(counters, histograms, snapshot)
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render():
+    """All metrics in Prometheus text exposition format (version 0.0.4)"""
+    counters, histograms = _merged()
+    lines = []
+    seen = set()
+
+    def header(name):
+        if name not in seen:
+            seen.add(name)
+            kind, text = HELP.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name)
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+
+    for (name, labels), state in sorted(histograms.items()):
+        header(name)
+        buckets = QUERY_COUNT_BUCKETS if name == 'http_request_db_queries' else LATENCY_BUCKETS
+        for bound, count in zip(buckets, state):
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {count}')
+        lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {state[-2]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {state[-2]}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {state[-1]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clear this process's metrics (used by tests and benchmarks)"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
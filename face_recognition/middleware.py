@@ -0,0 +1,281 @@
+"""
+Request performance instrumentation and static file serving
+
+Every middleware here is both sync and async capable, so under ASGI a
+request to an async view (the attendance status stream) never has to
+switch to a worker thread on the way in or out.
+"""
+import logging
+import mimetypes
+import os
+import time
+from urllib.parse import urlparse
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Execute wrapper on every database connection (see install_query_counter)
+    that adds each query to the current request's stats, if there is one
+
+    The stats travel in a context variable, so the queries of a sync view
+    served under ASGI, which runs in a worker thread on that thread's own
+    connection, are counted as well.
+    """
+    stats = metrics.current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['db_queries'] += 1
+        stats['db_seconds'] += time.perf_counter() - started
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver: wrap the new connection with count_query once"""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def _loaded_user(request):
+    """
+    request.user if the request already loaded it, else None
+
+    Loading it after the view would run session and user queries that the
+    request's query count doesn't include.
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+class PerformanceMiddleware:
+    """
+    Record latency, DB queries and face-service time per URL name
+
+    Results are aggregated in face_recognition.metrics and exposed at
+    /metrics. Requests that run more queries than their budget
+    (PERF_QUERY_BUDGETS / PERF_DEFAULT_QUERY_BUDGET) are logged and counted.
+    Staff users (and everyone when DEBUG is on) also get a Server-Timing
+    header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = {'face_seconds': 0.0, 'db_queries': 0, 'db_seconds': 0.0}
+        token = metrics.current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        return self._record(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = {'face_seconds': 0.0, 'db_queries': 0, 'db_seconds': 0.0}
+        token = metrics.current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        return self._record(request, response, stats, time.perf_counter() - started)
+
+    def _record(self, request, response, stats, elapsed):
+        """
+        Record one finished request; a streaming response is measured up to
+        its first byte and passed through untouched
+        """
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        queries = stats['db_queries']
+
+        metrics.observe('http_request_duration_seconds', elapsed, view=view, status=str(response.status_code)[0] + 'xx')
+        metrics.observe('http_request_db_queries', queries, buckets=metrics.QUERY_COUNT_BUCKETS, view=view)
+        metrics.inc('http_request_db_seconds_total', stats['db_seconds'], view=view)
+        if stats['face_seconds']:
+            metrics.inc('http_request_face_service_seconds_total', stats['face_seconds'], view=view)
+
+        budgets = getattr(settings, 'PERF_QUERY_BUDGETS', {})
+        budget = budgets.get(view, getattr(settings, 'PERF_DEFAULT_QUERY_BUDGET', None))
+        if budget is not None and queries > budget:
+            metrics.inc('http_request_query_budget_exceeded_total', view=view)
+            logger.warning(
+                'Query budget exceeded for %s: %d queries (budget %d, %.1f ms in DB) on %s',
+                view, queries, budget, stats['db_seconds'] * 1000, request.path
+            )
+
+        # Timings reveal how much work a page did, so only staff (or DEBUG) get them
+        user = _loaded_user(request)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = (
+                f'total;dur={elapsed * 1000:.1f}, '
+                f'db;dur={stats["db_seconds"] * 1000:.1f};desc="{queries} queries", '
+                f'face;dur={stats["face_seconds"] * 1000:.1f}'
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of requests (PROFILER_SAMPLE_RATE), or one request on
+    demand when a staff user sends the PROFILER_HEADER header.
+
+    Removed from the middleware chain entirely unless PROFILER_ENABLED is
+    set, so it costs nothing when switched off. Must come after
+    AuthenticationMiddleware so the staff check can see request.user.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from django.core.exceptions import MiddlewareNotUsed
+
+        if not getattr(settings, 'PROFILER_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0)
+        self.header = 'HTTP_' + getattr(settings, 'PROFILER_HEADER', 'X-Profile').upper().replace('-', '_')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        import random
+
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        user = getattr(request, 'user', None)
+        if not (request.META.get(self.header) and user and user.is_staff) and not self._sampled():
+            return self.get_response(request)
+        return self._profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        asked = request.META.get(self.header) and hasattr(request, 'auser') and (await request.auser()).is_staff
+        if not asked and not self._sampled():
+            return await self.get_response(request)
+        # cProfile and the sampler follow one thread, so the whole request runs
+        # in a worker thread; a sync view called from it comes back to it
+        return await sync_to_async(self._profile)(request, async_to_sync(self.get_response))
+
+    def _profile(self, request, get_response):
+        from .profiling import RequestProfile
+
+        with RequestProfile() as profile:
+            response = get_response(request)
+        if not profile.active:
+            return response
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        try:
+            response['X-Profile-Id'] = f'{view}/{profile.save(view)}'
+        except OSError:
+            logger.exception('Could not save request profile for %s', view)
+        return response
+
+
+class StaticFilesMiddleware:
+    """
+    Serve collectstatic output (STATIC_ROOT) in production
+
+    Picks the precompressed .br or .gz copy written by
+    CompressedManifestStaticFilesStorage when the client accepts it.
+    Content-hashed names from the manifest never change, so they are cached
+    for STATIC_MAX_AGE seconds and marked immutable. Any other name must be
+    revalidated (Last-Modified). Removed from the chain when DEBUG is on
+    (runserver serves static files itself) or when SERVE_STATIC is off
+    because a front-end server handles STATIC_URL.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        from django.core.exceptions import MiddlewareNotUsed
+
+        if settings.DEBUG or not getattr(settings, 'SERVE_STATIC', True) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = urlparse(settings.STATIC_URL).path
+        self.root = str(settings.STATIC_ROOT)
+        self.max_age = getattr(settings, 'STATIC_MAX_AGE', 365 * 24 * 60 * 60)
+        self.hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _variant(self, path, accept_encoding):
+        """(file to send, Content-Encoding or None)"""
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.split(',')}
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in accepted and os.path.isfile(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self._serve(request)
+        return self.get_response(request) if response is None else response
+
+    async def __acall__(self, request):
+        response = self._serve(request)
+        return await self.get_response(request) if response is None else response
+
+    def _serve(self, request):
+        """Response for a file under STATIC_ROOT, or None to pass the request on"""
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return None
+        name = request.path_info[len(self.prefix):]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        served, encoding = self._variant(path, request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        mtime = os.stat(served).st_mtime
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), mtime):
+            response = HttpResponseNotModified()
+        else:
+            content_type, _ = mimetypes.guess_type(path)
+            response = FileResponse(open(served, 'rb'), content_type=content_type or 'application/octet-stream')
+            response['Last-Modified'] = http_date(mtime)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['Vary'] = 'Accept-Encoding'
+        if name in self.hashed_names:
+            response['Cache-Control'] = f'public, max-age={self.max_age}, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        return response
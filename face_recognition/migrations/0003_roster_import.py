@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('face_recognition', '0002_attendance_marked_by_class_enrollment_code_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RosterImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('photos', models.FileField(upload_to='roster_imports/')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Completed with errors')], default='pending', max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('enrolled', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('elapsed_seconds', models.FloatField(default=0)),
+                ('class_enrolled', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='roster_imports', to='face_recognition.class')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RosterImportRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_number', models.PositiveIntegerField()),
+                ('photo_names', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('enrolled', 'Enrolled'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('roster_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='face_recognition.rosterimport')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_rows', to='face_recognition.student')),
+            ],
+            options={
+                'ordering': ['line_number'],
+            },
+        ),
+    ]
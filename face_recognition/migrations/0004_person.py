@@ -0,0 +1,82 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_people(apps, schema_editor):
+    """Give every existing student a Person that owns their face template"""
+    Person = apps.get_model('face_recognition', 'Person')
+    Student = apps.get_model('face_recognition', 'Student')
+    RosterImportRow = apps.get_model('face_recognition', 'RosterImportRow')
+    db_alias = schema_editor.connection.alias
+
+    not_captured = set(
+        RosterImportRow.objects.using(db_alias).exclude(status='enrolled').values_list('student_id', flat=True)
+    )
+    for student in Student.objects.using(db_alias).order_by('registered_at'):
+        person, _ = Person.objects.using(db_alias).get_or_create(
+            student_id=student.student_id,
+            defaults={
+                'name': student.name,
+                'email': student.email,
+                'face_encoding': student.face_encoding,
+                'template_enrolled_at': None if student.id in not_captured else student.registered_at,
+            }
+        )
+        student.person = person
+        student.save(update_fields=['person'])
+
+
+def copy_templates_back(apps, schema_editor):
+    Student = apps.get_model('face_recognition', 'Student')
+    for student in Student.objects.using(schema_editor.connection.alias).select_related('person'):
+        student.face_encoding = student.person.face_encoding
+        student.save(update_fields=['face_encoding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('face_recognition', '0003_roster_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Person',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('student_id', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('face_encoding', models.TextField(blank=True, null=True)),
+                ('template_enrolled_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'People',
+            },
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='person',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='face_recognition.person'),
+        ),
+        migrations.RunPython(create_people, copy_templates_back),
+        migrations.AlterField(
+            model_name='student',
+            name='person',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='face_recognition.person'),
+        ),
+        migrations.RemoveField(
+            model_name='student',
+            name='face_encoding',
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='student_id',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='student',
+            unique_together={('student_id', 'class_enrolled')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('face_recognition', '0005_face_template'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['class_session', 'date', 'status', 'marked_by', 'student'], name='attendance_class_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(fields=['created_by', '-created_at'], name='class_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['class_enrolled', 'name'], name='student_class_name_idx'),
+        ),
+        # login_view looks lecturers up by User.email, which auth doesn't index.
+        # This deliberately indexes a table owned by django.contrib.auth: the
+        # index lives only in the database (auth.User's model state can't be
+        # changed from this app), so it's plain SQL with no state operations,
+        # dropped again when this migration is reversed. It's named outside
+        # Django's generated scheme so auth's own migrations never collide with it.
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX IF EXISTS user_email_idx',
+            state_operations=[],
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# Frozen copy of the DDL in face_recognition.student_search, so this migration
+# doesn't change if that module does. ensure_index() recreates the same
+# objects after migrate when a table rebuild has dropped the triggers.
+FTS_TABLE = 'face_recognition_student_fts'
+
+CREATE_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, student_id, email,
+        content='face_recognition_student', content_rowid='id', tokenize='trigram'
+    )
+"""
+
+TRIGGERS = {
+    'face_recognition_student_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS face_recognition_student_fts_insert
+        AFTER INSERT ON face_recognition_student BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, name, student_id, email)
+            VALUES (new.id, new.name, new.student_id, new.email);
+        END
+    """,
+    'face_recognition_student_fts_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS face_recognition_student_fts_delete
+        AFTER DELETE ON face_recognition_student BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, student_id, email)
+            VALUES ('delete', old.id, old.name, old.student_id, old.email);
+        END
+    """,
+    'face_recognition_student_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS face_recognition_student_fts_update
+        AFTER UPDATE OF id, name, student_id, email ON face_recognition_student BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, student_id, email)
+            VALUES ('delete', old.id, old.name, old.student_id, old.email);
+            INSERT INTO {FTS_TABLE} (rowid, name, student_id, email)
+            VALUES (new.id, new.name, new.student_id, new.email);
+        END
+    """,
+}
+
+
+def create_index(apps, schema_editor):
+    """Trigram FTS5 index of students, kept in step by triggers (SQLite only)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    for sql in TRIGGERS.values():
+        schema_editor.execute(sql)
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in TRIGGERS:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('face_recognition', '0008_admin_changelist_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
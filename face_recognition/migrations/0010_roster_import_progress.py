@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('face_recognition', '0009_student_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rosterimport',
+            name='progress_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:18
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('face_recognition', '0011_attendance_session_clip'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='FaceTemplate',
+        ),
+    ]
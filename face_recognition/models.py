@@ -13,6 +13,10 @@ class Class(models.Model):
     
     class Meta:
         verbose_name_plural = "Classes"
+        indexes = [
+            # Dashboard: a lecturer's classes, newest first
+            models.Index(fields=['created_by', '-created_at'], name='class_owner_created_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -34,14 +38,63 @@ class Class(models.Model):
         )
 
 
+class Person(models.Model):
+    """A student's identity and face template, shared by all of their class enrollments"""
+    student_id = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=200)
+    email = models.EmailField(blank=True, null=True)
+    face_encoding = models.TextField(blank=True, null=True)  # Store face encoding data
+    template_enrolled_at = models.DateTimeField(blank=True, null=True)  # Last completed face capture
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name_plural = "People"
+    
+    def __str__(self):
+        return f"{self.name} ({self.student_id})"
+    
+    def has_valid_template(self):
+        """True if the face template can be reused to join another class without capturing again"""
+        from django.conf import settings
+        from django.utils import timezone
+        from datetime import timedelta
+        
+        if not self.template_enrolled_at:
+            return False
+        max_age = getattr(settings, 'FACE_TEMPLATE_MAX_AGE_DAYS', None)
+        if max_age is None:
+            return True
+        return timezone.now() - self.template_enrolled_at <= timedelta(days=max_age)
+
+    def email_matches(self, email):
+        """
+        True if email is the one the person gave at first enrollment
+
+        A student ID alone must not be enough to act as an existing person
+        (enroll them elsewhere or renew their face template); people
+        enrolled without an email can't be matched at all.
+        """
+        return bool(self.email) and self.email.lower() == (email or '').strip().lower()
+
+
 class Student(models.Model):
+    """One person's enrollment in one class"""
+    person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name='enrollments')
     name = models.CharField(max_length=200)
-    student_id = models.CharField(max_length=50, unique=True)
+    student_id = models.CharField(max_length=50)
     email = models.EmailField(blank=True, null=True)
     class_enrolled = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='students')
-    face_encoding = models.TextField(blank=True, null=True)  # Store face encoding data
     registered_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        unique_together = ['student_id', 'class_enrolled']
+        indexes = [
+            # Class rosters listed by name
+            models.Index(fields=['class_enrolled', 'name'], name='student_class_name_idx'),
+            # Admin date hierarchy
+            models.Index(fields=['registered_at'], name='student_registered_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.name} ({self.student_id})"
 
@@ -59,8 +112,17 @@ class AttendanceSession(models.Model):
     photo1 = models.ImageField(upload_to='attendance_photos/', blank=True, null=True)
     photo2 = models.ImageField(upload_to='attendance_photos/', blank=True, null=True)
     photo3 = models.ImageField(upload_to='attendance_photos/', blank=True, null=True)
+    # Storage names of an uploaded video or burst, until its keyframes become the photos
+    clip = models.JSONField(default=list, blank=True)
     processed = models.BooleanField(default=False)  # Has FastAPI processed the photos?
-    processing_status = models.CharField(max_length=50, default='pending')  # pending, processing, completed, failed
+    processing_status = models.CharField(max_length=50, default='pending')  # pending, selecting, processing, saving, completed, failed
+    processing_error = models.CharField(max_length=255, blank=True, default='')
+    # Recognition results, filled in once the face service answers
+    faces_detected = models.PositiveIntegerField(null=True, blank=True)
+    present_count = models.PositiveIntegerField(null=True, blank=True)
+    total_students = models.PositiveIntegerField(null=True, blank=True)
+    # Bumped on every status change; the live status streams follow it (see session_events.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"{self.class_session.title} - {self.date} - {self.method}"
@@ -84,6 +146,74 @@ class Attendance(models.Model):
     
     class Meta:
         unique_together = ['student', 'class_session', 'date']
+        indexes = [
+            # Covers the per-class, per-day filters: dashboard counts by status,
+            # "attendance taken today", batched marking and analytics buckets
+            models.Index(fields=['class_session', 'date', 'status', 'marked_by', 'student'], name='attendance_class_day_idx'),
+            # Admin changelist: newest first, the date hierarchy and the status and marked_by filters
+            models.Index(fields=['date'], name='attendance_date_idx'),
+            models.Index(fields=['status', 'date'], name='attendance_status_date_idx'),
+            models.Index(fields=['marked_by', 'date'], name='attendance_marked_by_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.name} - {self.class_session.title} - {self.date}"
+
+
+class RosterImport(models.Model):
+    """A bulk CSV + photo ZIP import of students into one class"""
+    class_enrolled = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='roster_imports')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    photos = models.FileField(upload_to='roster_imports/')
+    status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Completed with errors')
+    ], default='pending')
+    total = models.PositiveIntegerField(default=0)
+    enrolled = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    elapsed_seconds = models.FloatField(default=0)  # Face enrollment time summed across runs
+    progress_at = models.DateTimeField(blank=True, null=True)  # Last progress written by the running worker
+    
+    def __str__(self):
+        return f"{self.class_enrolled.title} - import {self.id} ({self.status})"
+    
+    def is_stale(self):
+        """True if a running import has made no progress for BULK_ENROLL_STALE_AFTER seconds (its worker died)"""
+        from django.conf import settings
+        from django.utils import timezone
+        from datetime import timedelta
+
+        last = self.progress_at or self.started_at
+        stale_after = timedelta(seconds=getattr(settings, 'BULK_ENROLL_STALE_AFTER', 600))
+        return self.status == 'running' and (last is None or timezone.now() - last > stale_after)
+    
+    def students_per_minute(self):
+        if not self.elapsed_seconds:
+            return 0
+        return round(self.enrolled / self.elapsed_seconds * 60, 1)
+
+
+class RosterImportRow(models.Model):
+    """One roster line and the outcome of its face enrollment"""
+    roster_import = models.ForeignKey(RosterImport, on_delete=models.CASCADE, related_name='rows')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='import_rows')
+    line_number = models.PositiveIntegerField()
+    photo_names = models.JSONField(default=list)  # Member names inside the photos ZIP
+    status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pending'),
+        ('enrolled', 'Enrolled'),
+        ('failed', 'Failed')
+    ], default='pending')
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['line_number']
+    
+    def __str__(self):
+        return f"Line {self.line_number}: {self.student.student_id} ({self.status})"
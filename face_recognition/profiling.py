@@ -0,0 +1,151 @@
+"""
+On-demand request profiling: call-tree (cProfile) and collapsed-stack files
+
+A profiled request produces two files under PROFILER_DIR/<url name>/:
+    <stamp>.prof       cProfile stats, open with pstats or snakeviz
+    <stamp>.collapsed  sampled stacks in "frame;frame;frame count" format,
+                       ready for flamegraph.pl or speedscope
+The directory is kept under PROFILER_MAX_BYTES by deleting the oldest files.
+"""
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILER_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+class StackSampler:
+    """Background thread that samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{Path(code.co_filename).stem}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+# Only one cProfile session can be active in a process (Python 3.12+ raises
+# for a second one), so concurrent requests aren't profiled while one is
+_active = threading.Lock()
+
+
+class RequestProfile:
+    """
+    Profile one request with both cProfile and the stack sampler
+
+    `active` is False, and nothing is recorded, when another request in the
+    process is being profiled or another profiler is already running.
+    """
+
+    def __init__(self):
+        interval = getattr(settings, 'PROFILER_SAMPLE_INTERVAL', 0.005)
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self.active = False
+
+    def __enter__(self):
+        if not _active.acquire(blocking=False):
+            return self
+        try:
+            self.profiler.enable()
+        except ValueError:  # Another profiling tool holds the interpreter's profiler
+            _active.release()
+            return self
+        self.active = True
+        self.sampler.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.active:
+            self.profiler.disable()
+            self.sampler.__exit__(*exc)
+            _active.release()
+
+    def save(self, view_name):
+        """Write both files for this request and rotate old ones; returns the file stem"""
+        directory = profile_dir() / re.sub(r'[^\w.-]', '_', view_name)
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = time.strftime('%Y%m%d-%H%M%S') + f'-{time.time_ns() % 1_000_000:06d}'
+        self.profiler.dump_stats(str(directory / f'{stem}.prof'))
+        (directory / f'{stem}.collapsed').write_text(self.sampler.collapsed())
+        rotate()
+        return stem
+
+
+def _entries():
+    """(mtime, size, path) for every stored profile file, oldest first"""
+    entries = []
+    for path in profile_dir().glob('*/*'):
+        if path.suffix not in ('.prof', '.collapsed'):
+            continue
+        try:
+            stat = path.stat()
+        except OSError:
+            continue  # Removed by another worker's rotation
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    return entries
+
+
+def list_profiles():
+    """Profile files newest first, as dicts for the admin page"""
+    return [
+        {'view': path.parent.name, 'name': path.name, 'size': size, 'modified': mtime}
+        for mtime, size, path in reversed(_entries())
+    ]
+
+
+def resolve_profile(view_name, file_name):
+    """Path of a stored profile, or None if it does not exist or escapes PROFILER_DIR"""
+    root = profile_dir().resolve()
+    path = (root / view_name / file_name).resolve()
+    if path.parent.parent != root or path.suffix not in ('.prof', '.collapsed') or not path.is_file():
+        return None
+    return path
+
+
+def rotate():
+    """Delete the oldest profiles until PROFILER_DIR is under PROFILER_MAX_BYTES"""
+    max_bytes = getattr(settings, 'PROFILER_MAX_BYTES', 100 * 1024 * 1024)
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        total -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
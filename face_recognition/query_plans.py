@@ -0,0 +1,185 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot queries behind the lecturer views
+
+Each hot path is run for real (views through RequestFactory, helpers
+directly) while its SQL is captured; every captured SELECT/UPDATE/DELETE is
+then explained. A plan step that reads a whole table or index ("SCAN
+<table>", an index SCAN that a LIMIT doesn't cut short, or a skip-scan) is a regression. Writes
+are rolled back. Used by the check_query_plans command and
+face_recognition.tests.
+"""
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import Attendance, AttendanceSession, Class, Student
+
+
+# The admin filter sidebars list every row of these small lookup tables
+ADMIN_LOOKUP_TABLES = {Class._meta.db_table}
+
+# An FTS5 table answering a MATCH: its plan step is a SCAN, but of the index
+FTS_MATCH = re.compile(r' VIRTUAL TABLE INDEX \d+:\S*M')
+
+LIMIT = re.compile(r'\bLIMIT\s+(\d+)', re.IGNORECASE)
+
+WHERE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+
+# Largest LIMIT that cuts a filtered index walk short: a page of rows. A
+# filter that skips most rows makes the walk read far more than the LIMIT,
+# so the admin's 100,000-row count cap only counts when nothing is filtered
+MAX_WALK_LIMIT = 1000
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _context():
+    """The busiest lecturer, their largest class and its attendance date range"""
+    teacher = User.objects.annotate(n=Count('classes')).filter(n__gt=0).order_by('-n', 'id').first()
+    if teacher is None:
+        return None
+    class_obj = (
+        teacher.classes.annotate(size=Count('students')).order_by('-size', 'id').first()
+    )
+    last_day = class_obj.attendances.aggregate(last=Max('date'))['last'] or timezone.now().date()
+    return {'teacher': teacher, 'class': class_obj, 'end': last_day, 'start': last_day.replace(day=1)}
+
+
+def _view(view, path, user, **kwargs):
+    def run():
+        request = RequestFactory().get(path)
+        request.user = user
+        return view(request, **kwargs)
+    return run
+
+
+def _admin_changelist(model, query=''):
+    def run():
+        from django.contrib import admin
+
+        request = RequestFactory().get(f'/admin/?{query}')
+        request.user = User(is_active=True, is_staff=True, is_superuser=True)
+        admin.site._registry[model].changelist_view(request).render()
+    return run
+
+
+def _record_attendance(ctx):
+    from .db import record_attendance
+
+    def run():
+        class_obj = ctx['class']
+        statuses = {pk: 'present' for pk in class_obj.students.values_list('id', flat=True)}
+        try:
+            with transaction.atomic():
+                session = AttendanceSession.objects.create(
+                    class_session=class_obj, created_by=ctx['teacher'], method='manual'
+                )
+                record_attendance(class_obj, session, statuses, 'manual')
+                raise _Rollback
+        except _Rollback:
+            pass
+    return run
+
+
+def hot_queries(ctx):
+    """name -> callable that runs one hot path"""
+    from . import views
+    from .analytics import _query_days
+    from .student_search import search_students
+
+    teacher, class_obj, day = ctx['teacher'], ctx['class'], ctx['end']
+    student = class_obj.students.order_by('id').first() or Student(student_id='')
+    return {
+        'login_email_lookup': lambda: User.objects.get(email=teacher.email),
+        'dashboard': _view(views.dashboard, '/dashboard/', teacher),
+        'mark_attendance_page': _view(views.mark_attendance, f'/mark-attendance/{class_obj.id}/', teacher,
+                                      class_id=class_obj.id),
+        'record_attendance': _record_attendance(ctx),
+        'analytics_buckets': lambda: _query_days(class_obj.id, ctx['start'], ctx['end']),
+        'class_roster': lambda: list(class_obj.students.order_by('name')),
+        'today_absences': lambda: list(
+            Attendance.objects.filter(class_session__created_by=teacher, date=ctx['end'], status='absent')
+            .select_related('student', 'class_session')[:10]
+        ),
+        'student_search_index': lambda: search_students(teacher, student.name[:4] or 'student', engine='index'),
+        'student_search_roster': lambda: search_students(teacher, student.name[:4] or 'student', engine='like'),
+        'admin_attendance_changelist': _admin_changelist(Attendance),
+        'admin_attendance_status_filter': _admin_changelist(Attendance, 'status__exact=late'),
+        'admin_attendance_marked_by_filter': _admin_changelist(Attendance, 'marked_by__exact=manual'),
+        'admin_attendance_day': _admin_changelist(
+            Attendance, f"date__year={day.year}&date__month={day.month}&date__day={day.day}"
+        ),
+        'admin_attendance_search': _admin_changelist(Attendance, f'q={student.student_id}'),
+        'admin_student_changelist': _admin_changelist(Student),
+    }
+
+
+def explain(sql):
+    """EXPLAIN QUERY PLAN detail lines for one statement"""
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan, tables, limited=False):
+    """
+    Plan steps that read a whole table or index: a SCAN (other than a
+    full-text MATCH), or a skip-scan (ANY(...) on the leading index column),
+    which walks nearly the whole index when the leading column isn't
+    constrained
+
+    A "SCAN ... USING [COVERING] INDEX" walks the index in order and so is
+    allowed only in a `limited` statement (a LIMIT of at most MAX_WALK_LIMIT
+    rows, or any LIMIT without a WHERE), where it stops after the first rows.
+    """
+    scans = []
+    for detail in plan:
+        words = detail.split()
+        if len(words) < 2 or words[1] not in tables:
+            continue
+        if words[0] == 'SCAN' and not FTS_MATCH.search(detail):
+            if not (limited and ' USING ' in detail):
+                scans.append(detail)
+        elif words[0] == 'SEARCH' and '(ANY(' in detail:
+            scans.append(detail)
+    return scans
+
+
+def check_hot_queries(names=None):
+    """
+    Run and explain every hot query
+
+    Returns:
+        list: one dict per captured statement with name, sql, plan and
+            scans (empty when every table is reached through an index)
+    """
+    if connection.vendor != 'sqlite':
+        raise RuntimeError('Query plan checks use SQLite EXPLAIN QUERY PLAN')
+    ctx = _context()
+    if ctx is None:
+        return []
+
+    tables = set(connection.introspection.table_names())
+    results = []
+    for name, run in hot_queries(ctx).items():
+        if names and name not in names:
+            continue
+        checked = tables - ADMIN_LOOKUP_TABLES if name.startswith('admin_') else tables
+        with CaptureQueriesContext(connection) as captured:
+            run()
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            plan = explain(sql)
+            limit = LIMIT.search(sql)
+            limited = limit is not None and (int(limit.group(1)) <= MAX_WALK_LIMIT or not WHERE.search(sql))
+            results.append({'name': name, 'sql': sql, 'plan': plan, 'scans': full_scans(plan, checked, limited)})
+    return results
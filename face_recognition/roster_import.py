@@ -0,0 +1,351 @@
+"""
+Bulk roster import: CSV roster + ZIP of photos -> Student rows + face enrollment
+
+The roster is validated in a single pass and every problem is reported at
+once, so nothing is created until the whole file is clean. Students are then
+created with bulk_create, and face enrollment is pushed to FastAPI on a
+bounded thread pool. Students who already have a valid face template from
+another class need no photos; they are just linked to the new class. A
+student ID that already belongs to a person is only accepted with the email
+they enrolled with, as on the enrollment pages. Each roster line keeps its own status, so a failed or
+interrupted import can be resumed and only re-sends the lines not yet enrolled.
+A running import records progress_at as it goes; one whose worker died
+(no progress for BULK_ENROLL_STALE_AFTER seconds) can be resumed too.
+"""
+import csv
+import io
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .dashboard import bump
+from .face_api_client import FaceAPIClient
+from .models import Person, RosterImport, RosterImportRow, Student
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+PHOTOS_PER_STUDENT = 3
+
+
+class RosterConflict(ValueError):
+    """Some roster students were enrolled in the class (or created) by another request after validation"""
+
+
+def _photo_owner(member_name):
+    """
+    Work out which student_id a ZIP member belongs to
+
+    Accepts either a folder per student (``STU123/front.jpg``) or flat
+    files prefixed with the student ID (``STU123_1.jpg``).
+    """
+    path = PurePosixPath(member_name)
+    if path.suffix.lower() not in IMAGE_EXTENSIONS or path.name.startswith('.'):
+        return None
+    if len(path.parts) > 1:
+        return path.parts[-2]
+    return path.stem.rsplit('_', 1)[0]
+
+
+def group_photos(photos_file):
+    """
+    Map student_id -> sorted list of image member names in the photos ZIP
+
+    Raises:
+        zipfile.BadZipFile: If the upload is not a ZIP archive
+    """
+    photos = {}
+    with zipfile.ZipFile(photos_file) as archive:
+        for name in archive.namelist():
+            owner = _photo_owner(name)
+            if owner:
+                photos.setdefault(owner, []).append(name)
+    photos_file.seek(0)
+    return {owner: sorted(names) for owner, names in photos.items()}
+
+
+def parse_roster(roster_file, photos_file, class_obj):
+    """
+    Validate a roster CSV against the photos ZIP in one pass
+
+    Args:
+        roster_file: Uploaded CSV with name, student_id and optional email columns
+        photos_file: Uploaded ZIP with 3 photos per student (optional for
+            students whose face template can be reused)
+        class_obj: Class the students are being imported into
+
+    Returns:
+        tuple: (rows, errors) where rows are dicts ready for create_roster_import
+            and errors are {'line': n, 'error': message} dicts
+    """
+    try:
+        photos = group_photos(photos_file)
+    except zipfile.BadZipFile:
+        return [], [{'line': 0, 'error': 'Photos file is not a valid ZIP archive'}]
+
+    try:
+        reader = csv.DictReader(roster_file.read().decode('utf-8-sig').splitlines())
+        records = list(reader)
+    except UnicodeDecodeError:
+        return [], [{'line': 0, 'error': 'Roster must be a UTF-8 encoded CSV file'}]
+
+    headers = {h.strip().lower() for h in (reader.fieldnames or [])}
+    missing = {'name', 'student_id'} - headers
+    if missing:
+        return [], [{'line': 1, 'error': f"Missing column(s): {', '.join(sorted(missing))}"}]
+
+    # One query for everyone who already exists from another class
+    roster_ids = {(record.get('student_id') or '').strip() for record in records}
+    existing = Person.objects.in_bulk(roster_ids, field_name='student_id')
+
+    rows = []
+    errors = []
+    seen = set()
+    for line_number, record in enumerate(records, start=2):
+        if None in record:  # DictReader puts fields beyond the header under None
+            errors.append({'line': line_number, 'error': f'Row has {len(record[None])} more field(s) than the header'})
+            continue
+        record = {(k or '').strip().lower(): (v or '').strip() for k, v in record.items()}
+        name = record.get('name', '')
+        student_id = record.get('student_id', '')
+        email = record.get('email', '')
+
+        if not name or not student_id:
+            errors.append({'line': line_number, 'error': 'Name and student_id are required'})
+            continue
+        if student_id in seen:
+            errors.append({'line': line_number, 'error': f'Duplicate student_id {student_id} in roster'})
+            continue
+        seen.add(student_id)
+
+        if email:
+            try:
+                validate_email(email)
+            except ValidationError:
+                errors.append({'line': line_number, 'error': f'Invalid email {email}'})
+                continue
+
+        person = existing.get(student_id)
+        if person is not None and not person.email_matches(email):
+            errors.append({'line': line_number, 'error': f'{student_id} is already registered with a different email'})
+            continue
+
+        photo_names = photos.get(student_id, [])[:PHOTOS_PER_STUDENT]
+        if person is not None and person.has_valid_template() and not photo_names:
+            pass  # Linked to this class using their existing template
+        elif len(photo_names) < PHOTOS_PER_STUDENT:
+            errors.append({
+                'line': line_number,
+                'error': f'{student_id} has {len(photo_names)} photo(s) in the ZIP, {PHOTOS_PER_STUDENT} required'
+            })
+            continue
+
+        rows.append({
+            'line_number': line_number,
+            'name': name,
+            'student_id': student_id,
+            'email': email,
+            'photo_names': photo_names,
+        })
+
+    if not records:
+        errors.append({'line': 1, 'error': 'Roster has no students'})
+
+    # One query for every student already in this class
+    taken = set(
+        Student.objects.filter(student_id__in=seen, class_enrolled=class_obj).values_list('student_id', flat=True)
+    )
+    if taken:
+        for row in rows:
+            if row['student_id'] in taken:
+                errors.append({'line': row['line_number'], 'error': f"{row['student_id']} is already enrolled in this class"})
+        rows = [row for row in rows if row['student_id'] not in taken]
+
+    errors.sort(key=lambda e: e['line'])
+    return rows, errors
+
+
+def create_roster_import(class_obj, user, rows, photos_file):
+    """
+    Create the import, its Person/Student rows and per-line tracking rows in bulk
+
+    Raises:
+        RosterConflict: a concurrent import or enrollment created some of the
+            same students after parse_roster validated the roster
+    """
+    roster_import = RosterImport(class_enrolled=class_obj, created_by=user, photos=photos_file, total=len(rows))
+    try:
+        with transaction.atomic():
+            _create_rows(roster_import, class_obj, rows)
+    except (IntegrityError, RosterConflict) as e:
+        if roster_import.photos._committed:  # Saved to storage before the rows failed
+            roster_import.photos.delete(save=False)
+        if isinstance(e, RosterConflict):
+            raise
+        raise RosterConflict('Some of these students were just enrolled in this class by another import; '
+                             'check the class roster and upload again') from e
+    bump('classes', [class_obj.created_by_id])  # bulk_create sends no signals
+    return roster_import
+
+
+def _create_rows(roster_import, class_obj, rows):
+    roster_import.save()
+    people = Person.objects.in_bulk([row['student_id'] for row in rows], field_name='student_id')
+    taken = [row['student_id'] for row in rows
+             if row['student_id'] in people and not people[row['student_id']].email_matches(row['email'])]
+    if taken:
+        raise RosterConflict(f"{', '.join(taken)} just registered with a different email; "
+                             'check the roster and upload again')
+    people.update({
+        person.student_id: person
+        for person in Person.objects.bulk_create([
+            Person(
+                student_id=row['student_id'],
+                name=row['name'],
+                email=row['email'],
+                face_encoding=''  # Stored in FastAPI database
+            )
+            for row in rows if row['student_id'] not in people
+        ])
+    })
+    students = Student.objects.bulk_create([
+        Student(
+            person=people[row['student_id']],
+            name=row['name'],
+            student_id=row['student_id'],
+            email=row['email'],
+            class_enrolled=class_obj
+        )
+        for row in rows
+    ])
+    RosterImportRow.objects.bulk_create([
+        RosterImportRow(
+            roster_import=roster_import,
+            student=student,
+            line_number=row['line_number'],
+            photo_names=row['photo_names']
+        )
+        for row, student in zip(rows, students)
+    ])
+
+
+def _enroll_row(client, photos_path, class_code, row):
+    """Worker: send one student's photos to FastAPI, or link their existing template"""
+    if not row.photo_names:
+        return client.link_student_to_class(row.student.student_id, class_code)
+    try:
+        with zipfile.ZipFile(photos_path) as archive:
+            images = [io.BytesIO(archive.read(name)) for name in row.photo_names]
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        return {'success': False, 'error': f'Could not read photos: {e}'}
+    return client.enroll_student(row.student.student_id, row.student.name, class_code, images)
+
+
+def run_roster_import(roster_import_id, workers=None, force=False):
+    """
+    Enroll every not-yet-enrolled line of an import with a bounded worker pool
+
+    Worker threads only talk to FastAPI; all database writes happen here,
+    batched every BULK_ENROLL_PROGRESS_EVERY results so progress is visible
+    while the import runs.
+
+    Args:
+        roster_import_id: RosterImport primary key
+        workers: Max concurrent FastAPI calls (defaults to BULK_ENROLL_WORKERS)
+        force: Run even if the import is marked as running (e.g. after a
+            crash; bulk_import_resume does this for stale imports itself)
+
+    Returns:
+        RosterImport or None if another run already holds the import
+    """
+    workers = workers or getattr(settings, 'BULK_ENROLL_WORKERS', 4)
+    flush_every = getattr(settings, 'BULK_ENROLL_PROGRESS_EVERY', 10)
+
+    claim = RosterImport.objects.filter(pk=roster_import_id)
+    if not force:
+        claim = claim.exclude(status='running')
+    now = timezone.now()
+    if not claim.update(status='running', started_at=now, progress_at=now, finished_at=None):
+        return None
+
+    roster_import = RosterImport.objects.select_related('class_enrolled').get(pk=roster_import_id)
+    rows = list(roster_import.rows.exclude(status='enrolled').select_related('student__person'))
+    class_code = roster_import.class_enrolled.enrollment_code
+    photos_path = roster_import.photos.path
+    client = FaceAPIClient(owner=roster_import.class_enrolled.created_by_id)
+
+    enrolled = roster_import.rows.filter(status='enrolled').count()
+    failed = 0
+    base_elapsed = roster_import.elapsed_seconds
+    started = time.monotonic()
+    done = []
+    captured = []
+
+    def flush():
+        RosterImportRow.objects.bulk_update(done, ['status', 'error'])
+        Person.objects.bulk_update(captured, ['template_enrolled_at'])
+        done.clear()
+        captured.clear()
+        RosterImport.objects.filter(pk=roster_import.pk).update(
+            enrolled=enrolled,
+            failed=failed,
+            elapsed_seconds=base_elapsed + time.monotonic() - started,
+            progress_at=timezone.now()
+        )
+
+    interrupted = True
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_enroll_row, client, photos_path, class_code, row): row
+                for row in rows
+            }
+            for future in as_completed(futures):
+                row = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+
+                if result['success']:
+                    row.status, row.error = 'enrolled', ''
+                    enrolled += 1
+                    if row.photo_names:
+                        row.student.person.template_enrolled_at = timezone.now()
+                        captured.append(row.student.person)
+                else:
+                    row.status, row.error = 'failed', result.get('error', 'Unknown error')
+                    failed += 1
+                done.append(row)
+                if len(done) >= flush_every:
+                    flush()
+        interrupted = False
+    finally:
+        # Whatever happened, keep finished lines so a resume skips them
+        flush()
+        RosterImport.objects.filter(pk=roster_import.pk).update(
+            status='failed' if failed or interrupted else 'completed',
+            finished_at=timezone.now()
+        )
+    roster_import.refresh_from_db()
+    return roster_import
+
+
+def start_roster_import(roster_import_id):
+    """Run an import in a background thread so the upload request returns at once"""
+    def target():
+        try:
+            run_roster_import(roster_import_id)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=target, name=f'roster-import-{roster_import_id}', daemon=True)
+    thread.start()
+    return thread
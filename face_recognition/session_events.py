@@ -0,0 +1,209 @@
+"""
+Live processing status of attendance sessions, streamed as Server-Sent Events
+
+update_status() saves a status change and, once it commits, hands the new
+snapshot to this process's SessionHub. Changes saved by other worker
+processes reach the hub through one change-feed query per process
+(subscribed sessions whose updated_at moved), run by a thread every
+SESSION_EVENTS_POLL_INTERVAL seconds and only while someone is listening.
+No stream queries the database on its own: an idle stream is a coroutine waiting on its
+asyncio.Queue, so one ASGI process can hold thousands of them.
+
+A session that stays unfinished for SESSION_PROCESSING_TIMEOUT seconds
+(its worker died with the process that ran it) is marked failed by
+expire_stale_sessions(), which open streams call once their session
+passes that age, and the expire_attendance_sessions command sweeps.
+
+Streams need an ASGI server (e.g. uvicorn identiface.asgi:application).
+Under WSGI the whole response is only sent once the session finishes.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .models import AttendanceSession
+
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('completed', 'failed')
+SNAPSHOT_FIELDS = ('processing_status', 'processing_error', 'faces_detected', 'present_count', 'total_students',
+                   'updated_at')
+STALE_ERROR = 'Processing stopped before it finished. Please take attendance again.'
+
+# Rows are read again for this long after their updated_at, so a change
+# committed a little after its timestamp was taken isn't missed
+FEED_OVERLAP = timedelta(seconds=2)
+
+
+def snapshot(session):
+    """What a stream sends about a session"""
+    return {
+        'session_id': session.pk,
+        'status': session.processing_status,
+        'error': session.processing_error,
+        'faces_detected': session.faces_detected,
+        'present_count': session.present_count,
+        'total_students': session.total_students,
+        'version': int(session.updated_at.timestamp() * 1_000_000),
+    }
+
+
+def update_status(session, status, **fields):
+    """Save a processing status change and notify the live streams once it commits"""
+    fields['processing_status'] = status
+    fields['updated_at'] = timezone.now()
+    AttendanceSession.objects.filter(pk=session.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(session, name, value)
+    data = snapshot(session)
+    transaction.on_commit(lambda: hub.publish(data))
+
+
+def _age(data):
+    """Seconds since a snapshot's session last changed"""
+    return time.time() - data['version'] / 1_000_000
+
+
+def expire_stale_sessions(session_ids=None):
+    """
+    Mark unfinished sessions failed once SESSION_PROCESSING_TIMEOUT has
+    passed since their last status change (all of them, or just session_ids)
+
+    Returns:
+        int: Number of sessions marked failed
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'SESSION_PROCESSING_TIMEOUT', 300))
+    stale = AttendanceSession.objects.exclude(processing_status__in=TERMINAL_STATUSES).filter(updated_at__lt=cutoff)
+    if session_ids is not None:
+        stale = stale.filter(pk__in=session_ids)
+    expired = 0
+    for session in stale.only(*SNAPSHOT_FIELDS):
+        # Only if it hasn't moved on since it was read
+        fields = {'processing_status': 'failed', 'processing_error': STALE_ERROR, 'updated_at': timezone.now()}
+        if AttendanceSession.objects.filter(pk=session.pk, updated_at=session.updated_at).update(**fields):
+            for name, value in fields.items():
+                setattr(session, name, value)
+            data = snapshot(session)
+            transaction.on_commit(lambda data=data: hub.publish(data))
+            expired += 1
+    return expired
+
+
+class SessionHub:
+    """
+    Fans session changes out to the streams of this process
+
+    Streams may run on different event loops (under WSGI each streaming
+    response gets its own), so subscribers are kept with their loop and
+    everything here is safe to call from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # session id -> set of (loop, asyncio.Queue)
+        self._versions = {}  # session id -> last version delivered
+        self._feed = None
+
+    def subscribe(self, session_id):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(session_id, set()).add(subscriber)
+            if self._feed is None:
+                self._feed = threading.Thread(target=self._follow_changes, name='session-events-feed', daemon=True)
+                self._feed.start()
+        return subscriber
+
+    def unsubscribe(self, session_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(session_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[session_id]
+                    self._versions.pop(session_id, None)
+
+    def publish(self, data):
+        """Deliver a snapshot to this process's streams of its session"""
+        session_id = data['session_id']
+        with self._lock:
+            if session_id not in self._subscribers or data['version'] <= self._versions.get(session_id, -1):
+                return
+            self._versions[session_id] = data['version']
+            subscribers = list(self._subscribers[session_id])
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, data)
+            except RuntimeError:  # The stream's loop has closed
+                pass
+
+    def _follow_changes(self):
+        """Pick up changes saved by other processes while anyone is subscribed"""
+        interval = getattr(settings, 'SESSION_EVENTS_POLL_INTERVAL', 1.0)
+        since = timezone.now() - FEED_OVERLAP
+        try:
+            while True:
+                time.sleep(interval)
+                with self._lock:
+                    if not self._subscribers:
+                        self._feed = None
+                        return
+                    session_ids = list(self._subscribers)
+                started = timezone.now()
+                try:
+                    changed = list(
+                        AttendanceSession.objects.filter(pk__in=session_ids, updated_at__gt=since).only(*SNAPSHOT_FIELDS)
+                    )
+                except DatabaseError:
+                    logger.exception('Session change feed query failed')
+                    continue
+                for session in changed:
+                    self.publish(snapshot(session))
+                since = started - FEED_OVERLAP
+        finally:
+            connection.close()
+
+
+hub = SessionHub()
+
+
+def _event(data):
+    return f"id: {data['version']}\nevent: status\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream(session_id):
+    """SSE body for one session: its current status, then every change until it finishes"""
+    keepalive = getattr(settings, 'SESSION_EVENTS_KEEPALIVE', 15)
+    timeout = getattr(settings, 'SESSION_PROCESSING_TIMEOUT', 300)
+    subscriber = hub.subscribe(session_id)  # Before reading, so no change can slip between
+    queue = subscriber[1]
+    try:
+        session = await AttendanceSession.objects.aget(pk=session_id)
+        data = snapshot(session)
+        version = data['version']
+        yield 'retry: 3000\n\n' + _event(data)
+        while data['status'] not in TERMINAL_STATUSES:
+            try:
+                data = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                if _age(data) > timeout and await sync_to_async(expire_stale_sessions)([session_id]):
+                    session = await AttendanceSession.objects.only(*SNAPSHOT_FIELDS).aget(pk=session_id)
+                    data = snapshot(session)
+                    version = data['version']
+                    yield _event(data)
+                else:
+                    yield ': keepalive\n\n'
+                continue
+            if data['version'] > version:
+                version = data['version']
+                yield _event(data)
+    finally:
+        hub.unsubscribe(session_id, subscriber)
@@ -0,0 +1,89 @@
+"""
+Invalidate cached dashboard fragments and analytics when the data behind
+them changes
+
+Bulk writes (bulk_create/bulk_update/update) send no signals; code using
+them calls dashboard.bump_for_classes() and analytics.invalidate() itself.
+
+Deletes are handled once per parent (Class, Student, AttendanceSession)
+in pre_delete, before the cascade removes the attendance rows. Attendance
+itself has no delete receiver: any receiver would stop Django from
+fast-deleting it with one DELETE, and load every row of the cascade into
+memory instead. Code deleting Attendance rows directly (the admin) bumps
+for them itself.
+
+A deleted class invalidates every month between its first and last
+attendance with one query. The students and sessions deleted along with
+it (deleting classes, or their lecturer) are covered by that, so their
+receivers skip their own queries.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Max, Min, QuerySet
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from . import analytics
+from .dashboard import bump, bump_for_classes
+from .models import Attendance, AttendanceSession, Class, Student
+
+
+def _deleting_classes(origin):
+    """Whether a delete started from whole classes or their lecturer"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, (Class, User))
+
+
+@receiver(post_save, sender=Class)
+def class_saved(sender, instance, using, **kwargs):
+    bump('classes', [instance.created_by_id], using=using)
+
+
+@receiver(pre_delete, sender=Class)
+def class_deleted(sender, instance, using, **kwargs):
+    bump('classes', [instance.created_by_id], using=using)
+    bump('attendance', [instance.created_by_id], using=using)
+    records = Attendance.objects.using(using).filter(class_session=instance)
+    span = records.aggregate(first=Min('date'), last=Max('date'))
+    if span['first'] is None:
+        return
+    months, month = [], span['first'].replace(day=1)
+    while month <= span['last']:
+        months.append((instance.pk, month))
+        month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    analytics.invalidate(months, using=using)
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, using, **kwargs):
+    bump_for_classes('classes', [instance.class_enrolled_id], using=using)
+
+
+@receiver(pre_delete, sender=Student)
+def student_deleted(sender, instance, using, origin=None, **kwargs):
+    if _deleting_classes(origin):
+        return
+    bump_for_classes('classes', [instance.class_enrolled_id], using=using)
+    attendance_deleted(instance.attendances.using(using), using)
+
+
+@receiver(pre_delete, sender=AttendanceSession)
+def attendance_session_deleted(sender, instance, using, origin=None, **kwargs):
+    if _deleting_classes(origin):
+        return
+    attendance_deleted(instance.records.using(using), using)
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, using, **kwargs):
+    bump_for_classes('attendance', [instance.class_session_id], using=using)
+    analytics.invalidate([(instance.class_session_id, instance.date)], using=using)
+
+
+def attendance_deleted(records, using=None):
+    """Invalidate for the Attendance rows in a queryset that is about to be deleted"""
+    months = analytics.class_months(records)
+    if months:
+        bump_for_classes('attendance', [class_id for class_id, _ in months], using=using)
+        analytics.invalidate(months, using=using)
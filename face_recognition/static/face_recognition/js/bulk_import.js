@@ -0,0 +1,66 @@
+const importUrl = document.currentScript.dataset.importUrl;
+const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+const form = document.getElementById('importForm');
+const submitBtn = document.getElementById('submitBtn');
+const resumeBtn = document.getElementById('resumeBtn');
+const errorList = document.getElementById('errorList');
+let importId = null;
+
+function showErrors(errors) {
+    errorList.innerHTML = '';
+    errors.forEach(e => {
+        const div = document.createElement('div');
+        div.textContent = `Line ${e.line}${e.student_id ? ' (' + e.student_id + ')' : ''}: ${e.error}`;
+        errorList.appendChild(div);
+    });
+}
+
+async function poll() {
+    const response = await fetch(`/bulk-import/status/${importId}/`);
+    const data = await response.json();
+    const done = data.enrolled + data.failed;
+    document.getElementById('progressFill').style.width = `${data.total ? done / data.total * 100 : 0}%`;
+    document.getElementById('progressText').textContent =
+        `${data.enrolled} of ${data.total} enrolled, ${data.failed} failed · ${data.students_per_minute} students/min`;
+    showErrors(data.errors);
+
+    if (data.status === 'running' || data.status === 'pending') {
+        setTimeout(poll, 2000);
+    } else {
+        resumeBtn.style.display = data.status === 'failed' ? 'block' : 'none';
+    }
+}
+
+form.addEventListener('submit', async (event) => {
+    event.preventDefault();
+    submitBtn.disabled = true;
+    submitBtn.textContent = 'Validating roster...';
+
+    const response = await fetch(importUrl, {
+        method: 'POST',
+        headers: {'X-CSRFToken': csrfToken},
+        body: new FormData(form)
+    });
+    const data = await response.json();
+
+    if (!data.success) {
+        submitBtn.disabled = false;
+        submitBtn.textContent = 'Import Students';
+        showErrors(data.errors || [{line: 0, error: data.error}]);
+        return;
+    }
+
+    importId = data.import_id;
+    form.style.display = 'none';
+    document.getElementById('progress').style.display = 'block';
+    poll();
+});
+
+resumeBtn.addEventListener('click', async () => {
+    resumeBtn.style.display = 'none';
+    await fetch(`/bulk-import/resume/${importId}/`, {
+        method: 'POST',
+        headers: {'X-CSRFToken': csrfToken}
+    });
+    setTimeout(poll, 1000);
+});
@@ -0,0 +1,112 @@
+// Auto-hide messages after 5 seconds
+setTimeout(function() {
+    const messages = document.querySelector('.messages');
+    if (messages) {
+        messages.style.transition = 'opacity 0.5s';
+        messages.style.opacity = '0';
+        setTimeout(() => messages.remove(), 500);
+    }
+}, 5000);
+
+// Copy enrollment link to clipboard
+function copyEnrollmentLink(classId) {
+    const input = document.getElementById('enrollment-link-' + classId);
+    input.select();
+    input.setSelectionRange(0, 99999); // For mobile devices
+
+    navigator.clipboard.writeText(input.value).then(function() {
+        // Show success feedback
+        const button = event.target;
+        const originalText = button.textContent;
+        button.textContent = 'Copied!';
+        button.style.background = '#10b981';
+
+        setTimeout(function() {
+            button.textContent = originalText;
+            button.style.background = '#148324';
+        }, 2000);
+    }).catch(function(err) {
+        alert('Failed to copy link. Please copy manually.');
+    });
+}
+
+// Student search across all classes, as you type
+(function() {
+    const searchUrl = document.currentScript.dataset.searchUrl;
+    const input = document.getElementById('studentSearch');
+    const results = document.getElementById('studentSearchResults');
+    if (!input || !searchUrl) return;
+
+    let timer = null;
+    let controller = null;
+
+    function show(items) {
+        results.replaceChildren();
+        if (!items.length) {
+            const empty = document.createElement('li');
+            empty.className = 'search-empty';
+            empty.textContent = 'No students found';
+            results.appendChild(empty);
+        }
+        items.forEach(function(student) {
+            const item = document.createElement('li');
+            item.className = 'search-result';
+            item.tabIndex = 0;
+            const name = document.createElement('strong');
+            name.textContent = student.name;
+            const details = document.createElement('span');
+            details.textContent = student.student_id + ' · ' + student.class_title;
+            const rate = document.createElement('span');
+            rate.className = 'search-rate';
+            item.append(name, details, rate);
+            item.addEventListener('click', function() { showRate(student, rate); });
+            item.addEventListener('keydown', function(e) {
+                if (e.key === 'Enter') showRate(student, rate);
+            });
+            results.appendChild(item);
+        });
+        results.hidden = false;
+    }
+
+    function showRate(student, target) {
+        target.textContent = 'Loading…';
+        fetch(student.analytics_url, {headers: {'Accept': 'application/json'}})
+            .then(response => response.json())
+            .then(function(data) {
+                target.textContent = data.success
+                    ? data.overall.attendance_rate + '% attendance over the last 30 days (' + data.overall.total_marked + ' marked)'
+                    : data.error;
+            })
+            .catch(() => { target.textContent = 'Could not load attendance'; });
+    }
+
+    function search() {
+        const query = input.value.trim();
+        if (controller) controller.abort();
+        if (!query) {
+            results.hidden = true;
+            return;
+        }
+        controller = new AbortController();
+        fetch(searchUrl + '?' + new URLSearchParams({q: query}), {
+            headers: {'Accept': 'application/json'},
+            signal: controller.signal
+        })
+            .then(response => response.json())
+            .then(data => { if (data.success) show(data.results); })
+            .catch(function(err) {
+                if (err.name !== 'AbortError') results.hidden = true;
+            });
+    }
+
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(search, 150);
+    });
+    input.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape') results.hidden = true;
+    });
+    document.addEventListener('click', function(e) {
+        if (!e.target.closest('.student-search')) results.hidden = true;
+    });
+})();
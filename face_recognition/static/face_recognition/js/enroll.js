@@ -0,0 +1,36 @@
+// Shared by the self-enrollment and manual enrollment pages
+
+// Update status message
+function updateStatus(message, type) {
+    const statusEl = document.getElementById('status-message');
+    statusEl.textContent = message;
+    statusEl.className = 'status-message ' + type;
+    statusEl.style.display = 'block';
+}
+
+// Get CSRF token
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+// POST one face capture step to Django, which relays it to the face service.
+// Frames are sent as FormData, everything else as JSON.
+function postCaptureStep(url, body) {
+    const headers = { 'X-CSRFToken': getCookie('csrftoken') };
+    if (!(body instanceof FormData)) {
+        headers['Content-Type'] = 'application/json';
+        body = JSON.stringify(body || {});
+    }
+    return fetch(url, { method: 'POST', headers: headers, body: body });
+}
@@ -0,0 +1,257 @@
+// Page values come from the data- attributes of this script's tag
+const config = document.currentScript.dataset;
+const classId = Number(config.classId);
+const enrollmentCode = config.enrollmentCode;
+
+let webcamStream = null;
+let enrollmentActive = false;
+let captureInterval = null;
+let captureStarted = false;
+let capturedPoses = new Set();
+
+// Initialize webcam
+async function initWebcam() {
+    try {
+        console.log('Requesting webcam access...');
+        webcamStream = await navigator.mediaDevices.getUserMedia({ 
+            video: { width: 640, height: 480 } 
+        });
+        console.log('Webcam access granted');
+        document.getElementById('webcam').srcObject = webcamStream;
+        updateStatus('Camera ready. Fill in student details and click "Start Capture"', 'info');
+        document.getElementById('pose-overlay').textContent = 'Camera ready';
+    } catch (error) {
+        console.error('Webcam error:', error);
+        updateStatus('Failed to access camera: ' + error.message, 'error');
+        document.getElementById('pose-overlay').textContent = 'Camera access denied';
+    }
+}
+
+// Start enrollment process
+async function startEnrollment() {
+    const name = document.getElementById('student-name').value.trim();
+    const studentId = document.getElementById('student-id').value.trim();
+
+    if (!name || !studentId) {
+        updateStatus('Please fill in student name and ID', 'error');
+        return;
+    }
+
+    const email = document.getElementById('student-email').value.trim();
+
+    // Start the capture; Django checks the student ID and drops any earlier capture
+    try {
+        console.log('Starting enrollment for student:', studentId);
+        const response = await postCaptureStep(config.captureStartUrl, { student_id: studentId, email: email });
+
+        console.log('Response status:', response.status);
+        const data = await response.json();
+        console.log('Response data:', data);
+
+        if (data.success) {
+            captureStarted = true;
+            enrollmentActive = true;
+            document.getElementById('start-btn').disabled = true;
+            updateStatus('Enrollment started! Follow the pose instructions', 'success');
+
+            // Start sending frames
+            captureInterval = setInterval(sendFrame, 500); // Send frame every 500ms
+        } else {
+            updateStatus('Failed to start enrollment: ' + data.message, 'error');
+        }
+    } catch (error) {
+        console.error('Enrollment start error:', error);
+        updateStatus('Error connecting to face service: ' + error.message, 'error');
+    }
+}
+
+// Capture and send frame to FastAPI
+async function sendFrame() {
+    if (!enrollmentActive) {
+        console.log('Enrollment not active, skipping frame');
+        return;
+    }
+
+    const video = document.getElementById('webcam');
+    const canvas = document.getElementById('canvas');
+    const ctx = canvas.getContext('2d');
+
+    if (video.videoWidth === 0 || video.videoHeight === 0) {
+        console.log('Video not ready yet');
+        return;
+    }
+
+    canvas.width = video.videoWidth;
+    canvas.height = video.videoHeight;
+    ctx.drawImage(video, 0, 0);
+
+    console.log('Sending frame...');
+
+    // Convert canvas to blob
+    canvas.toBlob(async (blob) => {
+        if (!blob) {
+            console.error('Failed to create blob from canvas');
+            return;
+        }
+
+        const formData = new FormData();
+        formData.append('file', blob, 'frame.jpg');
+
+        try {
+            const response = await postCaptureStep(config.captureFrameUrl, formData);
+
+            if (!response.ok) {
+                console.error('Frame processing failed:', response.status, response.statusText);
+                return;
+            }
+
+            const data = await response.json();
+            console.log('Frame response:', data);
+            handleFrameResponse(data);
+        } catch (error) {
+            console.error('Frame processing error:', error);
+            updateStatus('Error processing frame. Check console for details.', 'error');
+        }
+    }, 'image/jpeg');
+}
+
+// Handle response from frame processing
+function handleFrameResponse(data) {
+    console.log('handleFrameResponse called:', data);
+    const overlay = document.getElementById('pose-overlay');
+
+    if (!overlay) {
+        console.error('pose-overlay element not found!');
+        return;
+    }
+
+    if (data.status === 'ready') {
+        overlay.textContent = '✓ Hold still...';
+        overlay.classList.add('ready');
+    } else if (data.status === 'waiting') {
+        overlay.textContent = data.message || 'Position your face';
+        overlay.classList.remove('ready');
+    } else if (data.status === 'no_face') {
+        overlay.textContent = '❌ No face detected';
+        overlay.classList.remove('ready');
+    } else if (data.status === 'multiple_faces') {
+        overlay.textContent = '⚠️ Multiple faces detected';
+        overlay.classList.remove('ready');
+    } else if (data.status === 'poor_quality') {
+        overlay.textContent = '⚠️ Poor image quality';
+        overlay.classList.remove('ready');
+    } else if (data.status === 'no_keypoints') {
+        overlay.textContent = '⚠️ Facial landmarks missing - improve lighting';
+        overlay.classList.remove('ready');
+    } else if (data.status === 'complete') {
+        overlay.textContent = '✅ Enrollment complete!';
+        overlay.classList.add('ready');
+        completeCapture();
+    } else if (data.feedback) {
+        overlay.textContent = data.feedback;
+        overlay.classList.remove('ready');
+    }
+
+    // Always update progress if available
+    if (data.progress) {
+        console.log('Updating progress:', data.progress);
+        const progress = data.progress;
+
+        // Update captured poses
+        Object.keys(progress.poses_captured).forEach(pose => {
+            if (progress.poses_captured[pose]) {
+                capturedPoses.add(pose);
+                const poseElement = document.getElementById(`pose-${pose.toLowerCase()}`);
+                if (poseElement) {
+                    console.log(`Marking pose ${pose} as captured`);
+                    poseElement.classList.add('captured');
+                } else {
+                    console.warn(`Pose element not found: pose-${pose.toLowerCase()}`);
+                }
+            }
+        });
+
+        // Update progress bar
+        const progressPercent = (progress.poses_captured_count / progress.total_poses_required) * 100;
+        document.getElementById('progress-fill').style.width = progressPercent + '%';
+
+        // Check if complete
+        if (progress.complete) {
+            console.log('✅ All poses captured!');
+            completeCapture();
+        } else {
+            console.log(`Progress: ${progress.poses_captured_count}/${progress.total_poses_required} poses captured`);
+        }
+    }
+
+    // Log if pose was captured
+    if (data.captured) {
+        console.log('✓ Pose captured!', data.progress);
+    }
+}
+
+// Complete capture process
+function completeCapture() {
+    clearInterval(captureInterval);
+    enrollmentActive = false;
+    document.getElementById('submit-btn').disabled = false;
+    updateStatus('All poses captured! Click "Complete Enrollment" to finish', 'success');
+}
+
+// Submit enrollment
+async function submitEnrollment() {
+    const name = document.getElementById('student-name').value.trim();
+    const studentId = document.getElementById('student-id').value.trim();
+    const email = document.getElementById('student-email').value.trim();
+
+    try {
+        // Complete the capture; the face service saves the template
+        const response = await postCaptureStep(config.captureCompleteUrl);
+
+        const data = await response.json();
+
+        if (data.success) {
+            // Save to Django database
+            const saveResponse = await fetch(`/face_recognition/save-enrollment/`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken')
+                },
+                body: JSON.stringify({
+                    name: name,
+                    student_id: studentId,
+                    email: email,
+                    class_id: classId,
+                    enrollment_code: enrollmentCode
+                })
+            });
+
+            if (saveResponse.ok) {
+                updateStatus('Student enrolled successfully!', 'success');
+                setTimeout(() => {
+                    window.location.href = config.dashboardUrl;
+                }, 2000);
+            } else {
+                updateStatus('Enrollment saved to face service but failed to save to database', 'error');
+            }
+        } else {
+            updateStatus('Failed to complete enrollment: ' + data.message, 'error');
+        }
+    } catch (error) {
+        updateStatus('Error completing enrollment: ' + error.message, 'error');
+    }
+}
+
+// Initialize on page load
+window.onload = initWebcam;
+
+// Cleanup on page unload
+window.onbeforeunload = function() {
+    if (webcamStream) {
+        webcamStream.getTracks().forEach(track => track.stop());
+    }
+    if (enrollmentActive && captureStarted) {
+        postCaptureStep(config.captureCancelUrl);
+    }
+};
@@ -0,0 +1,371 @@
+// Page values come from the data- attributes of this script's tag
+const config = document.currentScript.dataset;
+const enrollmentCode = config.enrollmentCode;
+const className = config.className;
+
+let webcamStream = null;
+let enrollmentActive = false;
+let captureInterval = null;
+let captureStarted = false;
+let capturedPoses = new Set();
+
+// Initialize webcam
+async function initWebcam() {
+    try {
+        webcamStream = await navigator.mediaDevices.getUserMedia({ 
+            video: { width: 640, height: 480 } 
+        });
+        document.getElementById('webcam').srcObject = webcamStream;
+        updateStatus('Camera ready! Fill in your details and click "Start Enrollment"', 'info');
+    } catch (error) {
+        updateStatus('Failed to access camera: ' + error.message, 'error');
+    }
+}
+
+// Start enrollment process
+async function startEnrollment() {
+    const name = document.getElementById('student-name').value.trim();
+    const studentId = document.getElementById('student-id').value.trim();
+
+    if (!name || !studentId) {
+        updateStatus('Please fill in your name and student ID', 'error');
+        return;
+    }
+
+    const email = document.getElementById('student-email').value.trim();
+
+    // Start the capture; Django checks the student ID and drops any earlier capture
+    try {
+        console.log('Starting enrollment for student:', studentId);
+        const response = await postCaptureStep(config.captureStartUrl, { student_id: studentId, email: email });
+
+        console.log('Response status:', response.status);
+        const data = await response.json();
+        console.log('Response data:', data);
+
+        if (data.success) {
+            captureStarted = true;
+            enrollmentActive = true;
+            document.getElementById('start-btn').disabled = true;
+            updateStatus('Enrollment started! Follow the pose instructions on screen', 'success');
+
+            // Start sending frames
+            captureInterval = setInterval(sendFrame, 500);
+        } else {
+            updateStatus('Failed to start enrollment: ' + data.message, 'error');
+        }
+    } catch (error) {
+        console.error('Enrollment start error:', error);
+        updateStatus('Error connecting to face service. Please ensure the service is running.', 'error');
+    }
+}
+
+// Capture and send frame to FastAPI
+async function sendFrame() {
+    if (!enrollmentActive) {
+        console.log('Enrollment not active, skipping frame');
+        return;
+    }
+
+    console.log('Capturing and sending frame...');
+
+    const video = document.getElementById('webcam');
+    const canvas = document.getElementById('canvas');
+    const ctx = canvas.getContext('2d');
+
+    canvas.width = video.videoWidth;
+    canvas.height = video.videoHeight;
+    ctx.drawImage(video, 0, 0);
+
+    // Convert canvas to blob
+    canvas.toBlob(async (blob) => {
+        const formData = new FormData();
+        formData.append('file', blob, 'frame.jpg');
+
+        try {
+            const response = await postCaptureStep(config.captureFrameUrl, formData);
+
+            if (!response.ok) {
+                console.error('Frame processing failed:', response.status, response.statusText);
+                return;
+            }
+
+            const data = await response.json();
+            console.log('Frame processed:', data);
+            handleFrameResponse(data);
+        } catch (error) {
+            console.error('Frame processing error:', error);
+            updateStatus('Error processing frame. Check console for details.', 'error');
+        }
+    }, 'image/jpeg');
+}
+
+// Handle response from frame processing
+function handleFrameResponse(data) {
+    console.log('handleFrameResponse called:', data);
+    const overlay = document.getElementById('pose-overlay');
+
+    if (!overlay) {
+        console.error('pose-overlay element not found!');
+        return;
+    }
+
+    // Handle different status codes with detailed feedback
+    if (data.status === 'ready') {
+        overlay.textContent = `✓ ${data.feedback || 'Capturing...'}`;
+        overlay.classList.add('ready');
+        updateStatus('Face detected and captured!', 'success');
+    } else if (data.status === 'waiting') {
+        const message = data.feedback || data.message || 'Adjust your position';
+        overlay.textContent = message;
+        overlay.classList.remove('ready');
+        updateStatus(message, 'info');
+    } else if (data.status === 'no_face') {
+        overlay.textContent = '❌ No face detected';
+        overlay.classList.remove('ready');
+        updateStatus('No face detected. Please position your face in the frame.', 'error');
+    } else if (data.status === 'multiple_faces') {
+        overlay.textContent = '⚠️ Only one person allowed';
+        overlay.classList.remove('ready');
+        updateStatus('Multiple faces detected. Please ensure only one person is visible.', 'error');
+    } else if (data.status === 'poor_quality') {
+        const issues = data.quality?.issues?.join(', ') || 'image quality';
+        overlay.textContent = `⚠️ ${data.feedback || 'Adjust ' + issues}`;
+        overlay.classList.remove('ready');
+        updateStatus(data.message || data.feedback || 'Improve lighting and try again', 'error');
+    } else if (data.status === 'no_keypoints') {
+        overlay.textContent = '⚠️ Improve lighting/angle';
+        overlay.classList.remove('ready');
+        updateStatus('Face detected but details unclear. Try better lighting.', 'error');
+    } else if (data.status === 'complete') {
+        overlay.textContent = '✅ Enrollment complete!';
+        overlay.classList.add('ready');
+        completeCapture();
+    } else if (data.feedback) {
+        overlay.textContent = data.feedback;
+        overlay.classList.add(data.status === 'ready' ? 'ready' : '');
+    } else {
+        overlay.textContent = 'Processing...';
+        overlay.classList.remove('ready');
+    }
+
+    // Always update progress if available
+    if (data.progress) {
+        console.log('Updating progress:', data.progress);
+        const progress = data.progress;
+
+        // Update captured poses
+        Object.keys(progress.poses_captured).forEach(pose => {
+            if (progress.poses_captured[pose]) {
+                capturedPoses.add(pose);
+                const poseElement = document.getElementById(`pose-${pose.toLowerCase()}`);
+                if (poseElement) {
+                    console.log(`Marking pose ${pose} as captured`);
+                    poseElement.classList.add('captured');
+                } else {
+                    console.warn(`Pose element not found: pose-${pose.toLowerCase()}`);
+                }
+            }
+        });
+
+        // Update progress bar
+        const progressPercent = (progress.poses_captured_count / progress.total_poses_required) * 100;
+        document.getElementById('progress-fill').style.width = progressPercent + '%';
+
+        // Show progress message
+        const currentRequired = progress.current_pose ? progress.current_pose.toUpperCase() : 'UNKNOWN';
+        console.log(`Progress: ${progress.poses_captured_count}/${progress.total_poses_required} poses captured. Next: ${currentRequired}`);
+
+        // Check if complete
+        if (progress.complete) {
+            console.log('✅ All poses captured!');
+            completeCapture();
+        }
+    }
+
+    // Log if pose was captured
+    if (data.captured) {
+        console.log('✓ Pose captured successfully!');
+    }
+}
+
+// Complete capture process
+function completeCapture() {
+    clearInterval(captureInterval);
+    enrollmentActive = false;
+    document.getElementById('submit-btn').disabled = false;
+    updateStatus('🎉 All poses captured! Click "Complete Enrollment" to finish', 'success');
+}
+
+// Submit enrollment
+async function submitEnrollment() {
+    const name = document.getElementById('student-name').value.trim();
+    const studentId = document.getElementById('student-id').value.trim();
+    const email = document.getElementById('student-email').value.trim();
+
+    updateStatus('Processing enrollment...', 'info');
+
+    try {
+        // Complete the capture; the face service saves the template
+        const response = await postCaptureStep(config.captureCompleteUrl);
+
+        const data = await response.json();
+
+        if (data.success) {
+            // Save to Django database
+            const saveResponse = await fetch(window.location.href, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken')
+                },
+                body: JSON.stringify({
+                    name: name,
+                    student_id: studentId,
+                    email: email
+                })
+            });
+
+            const saveData = await saveResponse.json();
+
+            if (saveData.success) {
+                updateStatus('✅ Enrollment successful! Welcome to ' + className, 'success');
+                document.getElementById('submit-btn').disabled = true;
+
+                // Stop webcam
+                if (webcamStream) {
+                    webcamStream.getTracks().forEach(track => track.stop());
+                }
+
+                setTimeout(() => {
+                    window.location.reload();
+                }, 3000);
+            } else {
+                updateStatus('Error: ' + saveData.error, 'error');
+            }
+        } else {
+            updateStatus('Failed to complete enrollment: ' + data.message, 'error');
+        }
+    } catch (error) {
+        updateStatus('Error completing enrollment: ' + error.message, 'error');
+    }
+}
+
+// Offer to skip face capture if this student already enrolled in another class (with the same email)
+async function checkSavedTemplate() {
+    const studentId = document.getElementById('student-id').value.trim();
+    const email = document.getElementById('student-email').value.trim();
+    const reuseBtn = document.getElementById('reuse-btn');
+    reuseBtn.style.display = 'none';
+    if (!studentId || !email) {
+        return;
+    }
+
+    try {
+        const params = new URLSearchParams({student_id: studentId, email: email});
+        const response = await fetch(`${config.templateStatusUrl}?${params}`);
+        const data = await response.json();
+        if (data.already_enrolled) {
+            updateStatus('You are already enrolled in this class', 'info');
+        } else if (data.has_template) {
+            reuseBtn.style.display = 'inline-block';
+            updateStatus('We already have your face from another class. Use it to join without capturing again.', 'info');
+        }
+    } catch (error) {
+        console.log('Template check failed:', error);
+    }
+}
+
+// Join this class with the face template saved from a previous enrollment
+async function reuseSavedFace() {
+    const name = document.getElementById('student-name').value.trim();
+    const studentId = document.getElementById('student-id').value.trim();
+    const email = document.getElementById('student-email').value.trim();
+
+    if (!name || !studentId || !email) {
+        updateStatus('Please fill in your name, student ID and the email you first enrolled with', 'error');
+        return;
+    }
+
+    updateStatus('Processing enrollment...', 'info');
+
+    try {
+        const saveResponse = await fetch(window.location.href, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify({
+                name: name,
+                student_id: studentId,
+                email: email,
+                reuse_template: true
+            })
+        });
+
+        const saveData = await saveResponse.json();
+
+        if (saveData.success) {
+            updateStatus('✅ Enrollment successful! Welcome to ' + className, 'success');
+            document.getElementById('reuse-btn').disabled = true;
+            cancelEnrollmentSafely();
+            setTimeout(() => {
+                window.location.reload();
+            }, 3000);
+        } else {
+            updateStatus('Error: ' + saveData.error, 'error');
+        }
+    } catch (error) {
+        updateStatus('Error completing enrollment: ' + error.message, 'error');
+    }
+}
+
+document.getElementById('student-id').addEventListener('change', checkSavedTemplate);
+document.getElementById('student-email').addEventListener('change', checkSavedTemplate);
+
+// Cleanup video stream
+function cleanupWebcam() {
+    try {
+        if (webcamStream) {
+            webcamStream.getTracks().forEach(track => {
+                track.stop();
+            });
+            webcamStream = null;
+            console.log('Webcam cleaned up successfully');
+        }
+    } catch (error) {
+        console.error('Error cleaning up webcam:', error);
+    }
+}
+
+// Cancel enrollment safely
+function cancelEnrollmentSafely() {
+    try {
+        clearInterval(captureInterval);
+        enrollmentActive = false;
+        if (captureStarted) {
+            // Send cancel request (don't wait for response)
+            postCaptureStep(config.captureCancelUrl)
+                .catch(e => console.log('Cancel request failed (expected)', e));
+        }
+        cleanupWebcam();
+    } catch (error) {
+        console.error('Error during cancellation:', error);
+    }
+}
+
+// Initialize on page load
+window.addEventListener('load', initWebcam);
+
+// Cleanup on page unload/visibility change
+window.addEventListener('beforeunload', cancelEnrollmentSafely);
+
+// Also cleanup when page becomes hidden
+document.addEventListener('visibilitychange', function() {
+    if (document.hidden && enrollmentActive) {
+        console.log('Page hidden, pausing enrollment');
+        clearInterval(captureInterval);
+        enrollmentActive = false;
+    }
+});
@@ -0,0 +1,111 @@
+const { submitUrl, dashboardUrl, csrfToken } = document.currentScript.dataset;
+// A burst over ~3 seconds while the lecturer pans; the server keeps the best 3 frames
+const FRAME_COUNT = 12;
+const FRAME_GAP_MS = 250;
+const STATUS_TEXT = {
+    pending: 'Photos uploaded, waiting for face recognition...',
+    selecting: 'Picking the clearest frames...',
+    processing: 'Recognizing faces...',
+    saving: 'Saving attendance...',
+    completed: 'Attendance marked!',
+    failed: 'Face recognition failed'
+};
+
+let stream = null;
+
+async function startCamera() {
+    try {
+        stream = await navigator.mediaDevices.getUserMedia({ 
+            video: { 
+                width: 640, 
+                height: 480 
+            } 
+        });
+
+        const video = document.getElementById('video');
+        video.srcObject = stream;
+
+        document.querySelector('.camera-section h2').textContent = 'Camera Active';
+        document.querySelector('.camera-section p').textContent = 'Press capture, then slowly pan across the room';
+        document.querySelector('.start-camera-btn').style.display = 'none';
+        document.getElementById('videoContainer').style.display = 'block';
+    } catch (err) {
+        alert('Error accessing camera: ' + err.message);
+    }
+}
+
+function grabFrame(video) {
+    const canvas = document.createElement('canvas');
+    canvas.width = video.videoWidth;
+    canvas.height = video.videoHeight;
+    canvas.getContext('2d').drawImage(video, 0, 0);
+    return new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.9));
+}
+
+function showStatus(text, state) {
+    const status = document.getElementById('recognitionStatus');
+    status.textContent = text;
+    status.className = 'recognition-status ' + state;
+}
+
+function followSession(eventsUrl) {
+    const events = new EventSource(eventsUrl);
+    events.addEventListener('status', event => {
+        const data = JSON.parse(event.data);
+        let text = STATUS_TEXT[data.status] || data.status;
+        if (data.status === 'saving' || data.status === 'completed') {
+            text += ` ${data.present_count} of ${data.total_students} students present.`;
+        } else if (data.status === 'failed') {
+            text = data.error || text;
+        }
+        showStatus(text, data.status);
+
+        if (data.status === 'completed' || data.status === 'failed') {
+            events.close();
+            if (data.status === 'completed') {
+                setTimeout(() => { window.location.href = dashboardUrl; }, 1500);
+            } else {
+                document.querySelector('.capture-btn').disabled = false;
+            }
+        }
+    });
+}
+
+async function captureImage() {
+    const video = document.getElementById('video');
+    const button = document.querySelector('.capture-btn');
+    button.disabled = true;
+    showStatus('Capturing... slowly pan across the room', 'pending');
+
+    try {
+        const formData = new FormData();
+        for (let n = 1; n <= FRAME_COUNT; n++) {
+            formData.append('frames', await grabFrame(video), `frame${n}.jpg`);
+            if (n < FRAME_COUNT) {
+                await new Promise(resolve => setTimeout(resolve, FRAME_GAP_MS));
+            }
+        }
+
+        const response = await fetch(submitUrl, {
+            method: 'POST',
+            body: formData,
+            headers: { 'X-CSRFToken': csrfToken, 'Accept': 'application/json' }
+        });
+        const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.error || 'Upload failed');
+        }
+        showStatus(STATUS_TEXT[data.status], data.status);
+        followSession(data.events_url);
+    } catch (err) {
+        showStatus('Error: ' + err.message, 'failed');
+        button.disabled = false;
+    }
+}
+
+// Stop camera when leaving page
+window.addEventListener('beforeunload', () => {
+    if (stream) {
+        stream.getTracks().forEach(track => track.stop());
+    }
+});
@@ -0,0 +1,64 @@
+"""
+Static file storage that fingerprints and precompresses at collectstatic time
+
+Every collected file gets a content-hashed name (ManifestStaticFilesStorage),
+and text assets are also written as .gz and, when the optional brotli
+package is installed, .br next to the original. StaticFilesMiddleware (or a
+front-end server with gzip_static/brotli_static) serves those variants
+without compressing on each request.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml')
+
+# A compressed copy that saves less than this isn't worth a separate file
+MIN_SAVING = 0.05
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+def encoders():
+    """(suffix, compress) for every available precompression format"""
+    found = [('.gz', _gzip)]
+    if brotli is not None:
+        found.insert(0, ('.br', _brotli))
+    return found
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz/.br copies of text assets"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+                continue
+            with self.open(name) as f:
+                data = f.read()
+            for suffix, compress in encoders():
+                compressed = compress(data)
+                if len(compressed) > len(data) * (1 - MIN_SAVING):
+                    continue
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+                yield name, name + suffix, True
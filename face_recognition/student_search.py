@@ -0,0 +1,194 @@
+"""
+Search-as-you-type over a lecturer's students, across all their classes
+
+On SQLite, face_recognition_student_fts is an FTS5 index of every
+student's name, student ID and email. It is an external-content table: it
+holds only the index and reads the values from face_recognition_student.
+Triggers on the student table keep it up to date on every write. That
+includes bulk_create, queryset update()/delete() and cascades, which send
+no model signals.
+
+The trigram tokenizer matches any substring of three characters or more,
+so a partly typed word is found without waiting for the whole of it.
+Results rank student ID and name-word prefixes first, then bm25 with name
+weighted above student ID above email. Words of one or two characters
+can't use trigrams; they narrow the indexed matches.
+
+The index is searched across every class in the table and the matches are
+then narrowed to the lecturer's. For a lecturer with a few hundred students
+it is quicker to check their roster with LIKE, so the index is used only
+above STUDENT_SEARCH_SCAN_LIMIT students (roster sizes are cached until
+the lecturer's classes change). LIKE is also used when no word is long
+enough for trigrams and on databases other than SQLite.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .dashboard import get_versions
+from .models import Student
+
+
+FTS_TABLE = 'face_recognition_student_fts'
+MIN_INDEXED_LENGTH = 3  # Trigram tokenizer
+BM25_WEIGHTS = (10.0, 5.0, 1.0)  # name, student_id, email
+
+TRIGGERS = {
+    'face_recognition_student_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS face_recognition_student_fts_insert
+        AFTER INSERT ON face_recognition_student BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, name, student_id, email)
+            VALUES (new.id, new.name, new.student_id, new.email);
+        END
+    """,
+    # An external-content index must be given the old values to remove them
+    'face_recognition_student_fts_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS face_recognition_student_fts_delete
+        AFTER DELETE ON face_recognition_student BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, student_id, email)
+            VALUES ('delete', old.id, old.name, old.student_id, old.email);
+        END
+    """,
+    'face_recognition_student_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS face_recognition_student_fts_update
+        AFTER UPDATE OF id, name, student_id, email ON face_recognition_student BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, student_id, email)
+            VALUES ('delete', old.id, old.name, old.student_id, old.email);
+            INSERT INTO {FTS_TABLE} (rowid, name, student_id, email)
+            VALUES (new.id, new.name, new.student_id, new.email);
+        END
+    """,
+}
+
+
+def ensure_index(using='default'):
+    """
+    Create the index and its triggers if any are missing, rebuilding the
+    index from the student table when something had to be created
+
+    Django rebuilds a SQLite table (dropping its triggers) for some schema
+    changes, so this runs after every migrate. Returns True if anything
+    was created.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND name IN (%s, %s, %s))",
+            [FTS_TABLE, *TRIGGERS],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if existing >= {FTS_TABLE, *TRIGGERS}:
+            return False
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, student_id, email, content='face_recognition_student', content_rowid='id', "
+            "tokenize='trigram')"
+        )
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def _like(value, prefix=False):
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%' if prefix else '%' + escaped + '%'
+
+
+def _phrase(word):
+    return '"' + word.replace('"', '""') + '"'
+
+
+def _search_index(connection, user, words, limit):
+    """Student ids in rank order from the FTS index"""
+    indexed = [word for word in words if len(word) >= MIN_INDEXED_LENGTH]
+    first = words[0]
+    params = [' '.join(_phrase(word) for word in indexed), user.pk]
+    narrow = ''
+    for word in words:
+        if len(word) < MIN_INDEXED_LENGTH:
+            narrow += (r" AND (s.name LIKE %s ESCAPE '\' OR s.student_id LIKE %s ESCAPE '\'"
+                       r" OR s.email LIKE %s ESCAPE '\')")
+            params += [_like(word)] * 3
+    params += [_like(first, prefix=True), _like(first, prefix=True), _like(' ' + first), limit]
+
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    sql = f"""
+        SELECT s.id
+        FROM {FTS_TABLE}
+        JOIN face_recognition_student s ON s.id = {FTS_TABLE}.rowid
+        JOIN face_recognition_class c ON c.id = s.class_enrolled_id
+        WHERE {FTS_TABLE} MATCH %s AND c.created_by_id = %s{narrow}
+        ORDER BY
+            CASE
+                WHEN s.student_id LIKE %s ESCAPE '\\' THEN 0
+                WHEN s.name LIKE %s ESCAPE '\\' OR s.name LIKE %s ESCAPE '\\' THEN 1
+                ELSE 2
+            END,
+            bm25({FTS_TABLE}, {weights}),
+            s.name, s.id
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_like(students, words, limit):
+    for word in words:
+        students = students.filter(
+            Q(name__icontains=word) | Q(student_id__icontains=word) | Q(email__icontains=word)
+        )
+    first = words[0]
+    return list(
+        students.select_related('class_enrolled')
+        .annotate(rank=Case(
+            When(student_id__istartswith=first, then=Value(0)),
+            When(Q(name__istartswith=first) | Q(name__icontains=' ' + first), then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ))
+        .order_by('rank', 'name', 'id')[:limit]
+    )
+
+
+def roster_size(user, using='default'):
+    """Number of students in all of a lecturer's classes, cached until their classes change"""
+    key = f"student_search:roster:{user.pk}:{get_versions(user.pk)['classes']}"
+    size = cache.get(key)
+    if size is None:
+        size = Student.objects.using(using).filter(class_enrolled__created_by=user).count()
+        cache.set(key, size, 24 * 60 * 60)
+    return size
+
+
+def search_students(user, query, limit=20, engine=None, using='default'):
+    """
+    A lecturer's students matching every word of query, best first
+
+    Args:
+        engine: 'index' or 'like' to override the choice made from the
+            query and the lecturer's roster size
+    Returns:
+        tuple: (list of Student with class_enrolled loaded, engine used)
+    """
+    words = query.lower().split()
+    if not words or limit < 1:
+        return [], 'like'
+    connection = connections[using]
+    students = Student.objects.using(using).filter(class_enrolled__created_by=user)
+
+    if connection.vendor != 'sqlite' or all(len(word) < MIN_INDEXED_LENGTH for word in words):
+        engine = 'like'
+    elif engine is None:
+        large = roster_size(user, using) > getattr(settings, 'STUDENT_SEARCH_SCAN_LIMIT', 5000)
+        engine = 'index' if large else 'like'
+    if engine == 'like':
+        return _search_like(students, words, limit), 'like'
+
+    ids = _search_index(connection, user, words, limit)
+    found = students.select_related('class_enrolled').in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found], 'index'
@@ -1,3 +1,1327 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import os
+import pstats
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import requests
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Max, Min
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageFilter
+
+from . import metrics
+from .admission import FaceServiceBusy, admit, fair_order, next_round
+from .analytics import get_buckets, summarize_buckets
+from .attendance_processing import process_facial_attendance
+from .coalescing import read_through
+from .dashboard import forget, get_versions
+from .db import atomic_with_retry, record_attendance, update_in_batches
+from .embeddings import TemplateGallery, k_medoids
+from .face_api_client import FaceAPIClient, MultipartStream
+from .face_service_stub import POSES, Faults, make_server, parse_multipart
+from .keyframes import KeyframeSelector
+from .middleware import ProfilingMiddleware
+from .profiling import RequestProfile
+from .large_tables import EstimatedCountPaginator, SeekingQuerySet
+from .models import Attendance, AttendanceSession, Class, Person, RosterImport, Student
+from .query_plans import check_hot_queries, explain, full_scans
+from .roster_import import RosterConflict, create_roster_import, parse_roster, run_roster_import, start_roster_import
+from .session_events import stream, update_status
+from .student_search import FTS_TABLE, ensure_index, search_students
+
+
+def setUpModule():
+    """A cache of its own, so entries (and version stamps) from a previous run aren't served"""
+    location = tempfile.mkdtemp()
+    unittest.addModuleCleanup(shutil.rmtree, location)
+    unittest.enterModuleContext(override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+    }}))
+
+
+class QueryPlanTests(TestCase):
+    """The hot view queries must reach every table through an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_synthetic_data', teachers=4, classes=4, students=50, days=40, stdout=StringIO())
+
+    def test_hot_queries_use_indexes(self):
+        results = check_hot_queries()
+        self.assertTrue(results)
+        failures = [f"{r['name']}: {r['scans']}\n  {r['sql']}" for r in results if r['scans']]
+        self.assertEqual(failures, [], '\n'.join(failures))
+
+    def test_every_hot_query_ran(self):
+        names = {r['name'] for r in check_hot_queries()}
+        self.assertEqual(names, {
+            'login_email_lookup', 'dashboard', 'mark_attendance_page', 'record_attendance',
+            'analytics_buckets', 'class_roster', 'today_absences', 'admin_attendance_changelist',
+            'admin_attendance_status_filter', 'admin_attendance_marked_by_filter', 'admin_attendance_day',
+            'admin_attendance_search', 'admin_student_changelist', 'student_search_index', 'student_search_roster',
+        })
+
+    def test_detects_full_scan(self):
+        sql = str(Attendance.objects.filter(time__isnull=True).query)
+        tables = set(connection.introspection.table_names())
+        self.assertEqual(full_scans(explain(sql), tables), ['SCAN face_recognition_attendance'])
+
+    def test_index_scan_is_a_full_scan_without_limit(self):
+        plan = explain(str(Attendance.objects.order_by('date').values('date').query))
+        tables = set(connection.introspection.table_names())
+        self.assertEqual(full_scans(plan, tables),
+                         ['SCAN face_recognition_attendance USING COVERING INDEX attendance_date_idx'])
+        self.assertEqual(full_scans(plan, tables, limited=True), [])
+
+
+class AnalyticsCacheTests(TestCase):
+    """Past days are cached per class and month and dropped when their attendance changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_synthetic_data', teachers=1, classes=1, students=6, days=25, stdout=StringIO())
+        cls.class_obj = Class.objects.get()
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def setUp(self):
+        cache.clear()
+        self.end = datetime.date.today()
+        self.start = self.end - datetime.timedelta(days=29)
+
+    def _overall(self, start=None, end=None):
+        return summarize_buckets(get_buckets(self.class_obj.id, start or self.start, end or self.end))['overall']
+
+    def test_rolling_window_reuses_cached_days(self):
+        first = self._overall()
+        with self.assertNumQueries(0):
+            get_buckets(self.class_obj.id, self.start, self.end - datetime.timedelta(days=1))
+        # A window one day earlier only queries the day not cached yet, plus today
+        with self.assertNumQueries(2):
+            get_buckets(self.class_obj.id, self.start - datetime.timedelta(days=1), self.end)
+        self.assertEqual(self._overall(), first)
+
+    def test_date_range_is_limited(self):
+        self.client.force_login(self.class_obj.created_by)
+        url = reverse('attendance_analytics')
+        end = datetime.date(2025, 12, 31)
+        with override_settings(ANALYTICS_MAX_DAYS=366):
+            response = self.client.get(url, {'start': '1900-01-01', 'end': end.isoformat()})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'], 'The date range can be at most 366 days')
+            response = self.client.get(url, {'start': (end - datetime.timedelta(days=365)).isoformat(),
+                                             'end': end.isoformat()})
+            self.assertEqual(response.status_code, 200)
+
+    def test_editing_past_attendance_invalidates_its_days(self):
+        before = self._overall()
+        past = Attendance.objects.filter(date__range=(self.start, self.end - datetime.timedelta(days=1)),
+                                         status='present').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            past.status = 'absent'
+            past.save()
+        self.assertEqual(self._overall()['present'], before['present'] - 1)
+
+        self.client.force_login(self.admin_user)
+        selected = Attendance.objects.filter(status='absent')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:face_recognition_attendance_changelist'), {
+                'action': 'mark_late', 'select_across': '1', 'index': '0', 'status__exact': 'absent',
+                '_selected_action': list(selected.values_list('pk', flat=True)[:1]),
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self._overall()['absent'], Attendance.objects.filter(
+            date__range=(self.start, self.end), status='absent').count())
+        self.assertEqual(self._overall()['absent'], 0)
+
+    def test_forget_drops_only_that_lecturers_fragments(self):
+        other = User.objects.create_user('other_lecturer', 'other@example.com', 'pass')
+        mine, theirs = get_versions(self.class_obj.created_by_id), get_versions(other.id)
+        forget(self.class_obj.created_by_id)
+        self.assertNotEqual(get_versions(self.class_obj.created_by_id), mine)
+        self.assertEqual(get_versions(other.id), theirs)
+
+    def test_deletes_invalidate_once_and_keep_fast_delete(self):
+        total = self._overall()['total_marked']
+        student = self.class_obj.students.first()
+        removed = student.attendances.filter(date__range=(self.start, self.end)).count()
+        versions = get_versions(self.class_obj.created_by_id)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as captured:
+            student.delete()
+        # The student's attendance goes in one DELETE by student, never loaded row by row
+        deletes = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('DELETE FROM "face_recognition_attendance"')]
+        self.assertEqual(len(deletes), 1)
+        self.assertIn('"face_recognition_attendance"."student_id" IN', deletes[0])
+        self.assertNotEqual(get_versions(self.class_obj.created_by_id), versions)
+        self.assertEqual(self._overall()['total_marked'], total - removed)
+
+        self.client.force_login(self.admin_user)
+        selected = list(Attendance.objects.filter(date__range=(self.start, self.end)).values_list('pk', flat=True)[:3])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:face_recognition_attendance_changelist'), {
+                'action': 'delete_selected', 'post': 'yes', '_selected_action': selected,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self._overall()['total_marked'], total - removed - 3)
+
+
+    def test_deleting_a_class_invalidates_it_with_one_query(self):
+        self.assertGreater(self._overall()['total_marked'], 0)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as captured:
+            self.class_obj.delete()
+        # The span of the class's attendance; the students and sessions in the cascade add nothing
+        reads = [q['sql'] for q in captured.captured_queries
+                 if q['sql'].startswith('SELECT') and 'FROM "face_recognition_attendance"' in q['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(self._overall()['total_marked'], 0)
+
+class StaticAssetTests(TestCase):
+    """collectstatic output is fingerprinted, precompressed and served with long cache lifetimes"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.enterClassContext(override_settings(
+            STATIC_ROOT=cls.static_root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'face_recognition.storage.CompressedManifestStaticFilesStorage'},
+            },
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_pages_link_hashed_bundles(self):
+        html = self.client.get(reverse('login')).content.decode()
+        self.assertIn(staticfiles_storage.url('face_recognition/css/auth.css'), html)
+        self.assertIn(staticfiles_storage.url('face_recognition/js/auth.js'), html)
+        self.assertNotIn('<style>', html)
+
+    def test_serves_precompressed_hashed_file(self):
+        name = staticfiles_storage.stored_name('face_recognition/js/enroll.js')
+        response = self.client.get('/static/' + name, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        with staticfiles_storage.open(name) as f:
+            self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), f.read())
+
+    def test_unhashed_name_is_revalidated(self):
+        response = self.client.get('/static/face_recognition/js/enroll.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=0, must-revalidate')
+        not_modified = self.client.get('/static/face_recognition/js/enroll.js',
+                                       HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+
+class AdmissionTests(SimpleTestCase):
+    """Face service calls are limited per pool, queued fairly and rejected fast when the queue is full"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(FACE_API_ADMISSION_DIR=directory, FACE_API_ADMISSION={
+            'heavy': {'max_in_flight': 1, 'max_queue': 0, 'max_wait': 1},
+            'light': {'max_in_flight': 2, 'max_queue': 4, 'max_wait': 0.2},
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def hold(self, pool):
+        """Occupy one slot of `pool` from another thread until cleanup"""
+        entered, release = threading.Event(), threading.Event()
+
+        def run():
+            with admit(pool, owner='holder'):
+                entered.set()
+                release.wait()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        self.assertTrue(entered.wait(5))
+
+    def test_full_queue_rejects_with_retry_after(self):
+        self.hold('heavy')
+        with self.assertRaises(FaceServiceBusy) as caught:
+            with admit('heavy', owner='lecturer'):
+                pass
+        self.assertEqual(caught.exception.reason, 'queue_full')
+        self.assertGreaterEqual(caught.exception.retry_after, 1)
+
+    def test_queued_call_times_out(self):
+        self.hold('light')
+        self.hold('light')
+        with self.assertRaises(FaceServiceBusy) as caught:
+            with admit('light', owner='student'):
+                pass
+        self.assertEqual(caught.exception.reason, 'timeout')
+
+    def test_heavy_calls_do_not_block_light_calls(self):
+        self.hold('heavy')
+        with admit('light', owner='student'):
+            pass
+
+    def test_queue_is_served_round_robin_by_owner(self):
+        state = {'waiting': []}
+        for owner in ['a', 'a', 'a', 'b', 'c', 'b']:
+            state['waiting'].append({'id': f'{owner}{len(state["waiting"])}', 'owner': owner,
+                                     'round': next_round(state, owner), 'since': len(state['waiting'])})
+        self.assertEqual(fair_order(state['waiting']), ['a0', 'b3', 'c4', 'a1', 'b5', 'a2'])
+
+
+@override_settings(FACE_API_READ_CACHE_TTL=60, FACE_API_READ_STALE_TTL=60)
+class ReadCoalescingTests(SimpleTestCase):
+    """Identical concurrent face service reads share one call and results are briefly cached"""
+
+    def test_concurrent_reads_share_one_call(self):
+        calls, release = [], threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return {'success': True, 'data': {'students': []}}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(read_through('test_read', 'shared', fetch)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertEqual(read_through('test_read', 'shared', fetch), results[0])
+        self.assertEqual(len(calls), 1)
+
+    def test_failures_are_not_cached(self):
+        outcomes = iter([{'success': False, 'error': 'down'}, {'success': True, 'data': {}}])
+        self.assertFalse(read_through('test_read', 'failing', lambda: next(outcomes))['success'])
+        self.assertTrue(read_through('test_read', 'failing', lambda: next(outcomes))['success'])
+
+    @override_settings(FACE_API_READ_CACHE_TTL=0.05)
+    def test_stale_result_is_served_while_refreshing(self):
+        refreshed = threading.Event()
+        read_through('test_read', 'stale', lambda: {'success': True, 'data': 'old'})
+        time.sleep(0.1)
+
+        def fetch():
+            refreshed.set()
+            return {'success': True, 'data': 'new'}
+
+        self.assertEqual(read_through('test_read', 'stale', fetch)['data'], 'old')
+        self.assertTrue(refreshed.wait(5))
+        for _ in range(100):
+            result = read_through('test_read', 'stale', fetch)
+            if result['data'] == 'new':
+                break
+            time.sleep(0.01)
+        self.assertEqual(result['data'], 'new')
+
+
+class FailOnce(Faults):
+    """Answer the first batch request with a retryable 503 and every later one normally"""
+
+    def __init__(self):
+        super().__init__()
+        self.failed = False
+
+    def decide(self, endpoint):
+        if endpoint == 'enroll-batch' and not self.failed:
+            self.failed = True
+            return 0.0, 'error'
+        return 0.0, 'ok'
+
+
+class FaceAPIClientTests(SimpleTestCase):
+    """FaceAPIClient against the face service stub: batches are chunked, streamed and retried selectively"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.server = make_server(port=0, faults=FailOnce())
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.enterContext(override_settings(
+            FACE_API_URL=f'http://127.0.0.1:{self.server.server_port}',
+            FACE_API_ADMISSION_DIR=directory,
+        ))
+
+    @staticmethod
+    def student(student_id, size=10):
+        return {'student_id': student_id, 'student_name': f'Student {student_id}',
+                'image_files': [BytesIO(bytes([n + 1]) * size) for n in range(3)]}
+
+    @override_settings(FACE_API_BATCH_MAX_BYTES=100, FACE_API_BATCH_MAX_STUDENTS=2)
+    def test_chunks_respect_byte_and_student_limits(self):
+        students = [self.student('A'), self.student('B'), self.student('C'),
+                    self.student('BIG', size=50), self.student('D', size=20), self.student('E', size=20)]
+        chunks = [[s['student_id'] for s in chunk] for chunk in FaceAPIClient()._chunk_students(students)]
+        self.assertEqual(chunks, [['A', 'B'], ['C'], ['BIG'], ['D'], ['E']])
+
+    def test_multipart_stream_length_matches_body(self):
+        files = {'photo': ('photo.jpg', BytesIO(b'x' * (MultipartStream.block_size * 2 + 7)), 'image/jpeg')}
+        body = MultipartStream({'class_code': 'ABC123', 'manifest': '[]'}, files)
+        sent = b''.join(body)
+        self.assertEqual(len(body), len(sent))
+        fields, parsed = parse_multipart(body.content_type, sent)
+        self.assertEqual(fields, {'class_code': 'ABC123', 'manifest': '[]'})
+        self.assertEqual(parsed['photo'], b'x' * (MultipartStream.block_size * 2 + 7))
+
+    def test_only_retryable_students_are_sent_again(self):
+        students = [self.student('S1'), self.student('S2'), self.student('NOFACE', size=0)]
+        result = FaceAPIClient().enroll_students_batch('ABC123', students)
+        self.assertEqual(result['failed'], ['NOFACE'])
+        self.assertEqual(result['results']['NOFACE']['error'], 'No face detected')
+        self.assertTrue(result['results']['S1']['success'])
+        self.assertEqual(self.server.RequestHandlerClass.state.stats['enroll-batch']['requests'], 2)
+
+    def test_every_endpoint_answers_like_the_face_service(self):
+        client = FaceAPIClient()
+        photos = [BytesIO(b'photo%d' % n) for n in range(3)]
+        self.assertTrue(client.enroll_student('S1', 'Amina Kamau', 'ABC123', photos)['success'])
+        self.assertFalse(client.enroll_student('S2', 'Brian Otieno', 'ABC123', [BytesIO(b'')] * 3)['success'])
+        self.assertTrue(client.link_student_to_class('S1', 'DEF456')['success'])
+        self.assertFalse(client.link_student_to_class('S2', 'DEF456')['success'])
+        encodings = client.get_student_encodings('ABC123')['data']['students']
+        self.assertEqual([s['student_id'] for s in encodings], ['S1'])
+        marked = client.mark_attendance('ABC123', photos)
+        self.assertEqual(set(marked['present_students']) - {'S1'}, set())
+
+        self.assertEqual(client.start_enrollment_session('S3')['data']['required_poses'], POSES)
+        for pose in POSES:
+            frame = client.process_enrollment_frame('S3', ('frame.jpg', BytesIO(pose.encode()), 'image/jpeg'))
+        self.assertTrue(frame['data']['progress']['complete'])
+        self.assertEqual(client.complete_enrollment('S3')['data']['poses_captured'], len(POSES))
+        self.assertFalse(client.complete_enrollment('S3')['success'])
+        client.start_enrollment_session('S/4')  # IDs with slashes are path-quoted
+        self.assertTrue(client.cancel_enrollment('S/4')['data']['cancelled'])
+
+        stats = requests.get(f'{settings.FACE_API_URL}/stub/stats', timeout=5).json()
+        self.assertEqual(stats['templates'], 2)
+        self.assertEqual(stats['open_sessions'], 0)
+
+    def test_duplicate_student_ids_are_rejected(self):
+        result = FaceAPIClient().enroll_students_batch('ABC123', [self.student('S1'), self.student('S1')])
+        self.assertFalse(result['success'])
+        self.assertEqual(result['failed'], ['S1'])
+        self.assertNotIn('enroll-batch', self.server.RequestHandlerClass.state.stats)
+
+
+class EnrollmentIdentityTests(TestCase):
+    """The public enrollment link can't take over or probe another person's student ID"""
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        cls.class_obj = Class.objects.create(title='Biology', time=datetime.time(9), created_by=teacher)
+        cls.person = Person.objects.create(student_id='S1', name='Amina Kamau', email='amina@example.com',
+                                           template_enrolled_at=timezone.now())
+        Person.objects.create(student_id='S2', name='Brian Otieno', template_enrolled_at=timezone.now())
+
+    def setUp(self):
+        self.link = self.enterContext(mock.patch(
+            'face_recognition.face_api_client.FaceAPIClient.link_student_to_class',
+            return_value={'success': True, 'data': {}},
+        ))
+        self.face = {
+            name: self.enterContext(mock.patch(f'face_recognition.face_api_client.FaceAPIClient.{name}',
+                                               return_value={'success': True, 'data': {'success': True}}))
+            for name in ('start_enrollment_session', 'process_enrollment_frame', 'complete_enrollment',
+                         'cancel_enrollment')
+        }
+
+    def enroll(self, **data):
+        url = reverse('enroll_student', args=[self.class_obj.enrollment_code])
+        return self.client.post(url, json.dumps({'name': 'Someone', **data}), content_type='application/json')
+
+    def capture(self, step, **data):
+        url = reverse('enroll_capture', args=[self.class_obj.enrollment_code, step])
+        if step == 'frame':
+            return self.client.post(url, {'file': SimpleUploadedFile('frame.jpg', b'\xff\xd8', 'image/jpeg')})
+        return self.client.post(url, json.dumps(data), content_type='application/json')
+
+    def status(self, **params):
+        url = reverse('enroll_template_status', args=[self.class_obj.enrollment_code])
+        return self.client.get(url, params).json()
+
+    def test_fresh_capture_does_not_overwrite_an_existing_person(self):
+        response = self.enroll(student_id='S1', email='someone@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.person.refresh_from_db()
+        self.assertEqual((self.person.name, self.person.email), ('Amina Kamau', 'amina@example.com'))
+        self.assertFalse(self.class_obj.students.exists())
+
+        enrolled_at = self.person.template_enrolled_at
+        self.assertEqual(self.enroll(student_id='S1', email='AMINA@example.com').status_code, 400)  # No capture
+        self.assertEqual(self.capture('start', student_id='S1', email='AMINA@example.com').status_code, 200)
+        self.assertEqual(self.capture('complete').status_code, 200)
+        self.assertEqual(self.enroll(student_id='S1', email='AMINA@example.com').status_code, 200)
+        self.person.refresh_from_db()
+        self.assertEqual(self.person.name, 'Amina Kamau')
+        self.assertGreater(self.person.template_enrolled_at, enrolled_at)
+
+    def test_capture_is_checked_before_the_face_service(self):
+        self.assertEqual(self.capture('start', student_id='S1', email='someone@example.com').status_code, 400)
+        self.assertEqual(self.capture('start', student_id='S2', email='').status_code, 400)
+        self.assertEqual(self.capture('frame').status_code, 400)
+        self.assertEqual(self.capture('complete').status_code, 400)
+        for call in self.face.values():
+            call.assert_not_called()
+
+        self.assertEqual(self.capture('start', student_id='S3', email='chebet@example.com').status_code, 200)
+        self.face['start_enrollment_session'].assert_called_once_with('S3')
+        self.assertEqual(self.capture('frame').status_code, 200)
+        self.assertEqual(self.face['process_enrollment_frame'].call_args.args[0], 'S3')
+        self.assertEqual(self.enroll(student_id='S3', email='chebet@example.com').status_code, 400)
+        self.assertEqual(self.capture('complete').status_code, 200)
+        self.face['complete_enrollment'].assert_called_once_with('S3')
+
+        self.assertEqual(self.enroll(student_id='S4', email='chebet@example.com').status_code, 400)
+        self.assertEqual(self.enroll(student_id='S3', email='chebet@example.com').status_code, 200)
+        self.assertEqual(Person.objects.get(student_id='S3').email, 'chebet@example.com')
+
+    def test_reusing_a_template_needs_the_matching_email(self):
+        self.assertEqual(self.enroll(student_id='S1', email='', reuse_template=True).status_code, 400)
+        self.assertEqual(self.enroll(student_id='S2', email='', reuse_template=True).status_code, 400)
+        self.link.assert_not_called()
+        self.assertEqual(self.enroll(student_id='S1', email='amina@example.com', reuse_template=True).status_code, 200)
+        self.link.assert_called_once_with('S1', self.class_obj.enrollment_code)
+
+    def test_template_status_needs_the_matching_email(self):
+        self.assertFalse(self.status(student_id='S1')['has_template'])
+        self.assertFalse(self.status(student_id='S1', email='someone@example.com')['has_template'])
+        self.assertFalse(self.status(student_id='S2', email='')['has_template'])
+        self.assertTrue(self.status(student_id='S1', email='amina@example.com')['has_template'])
+
+
+class EnrollmentCaptureAdmissionTests(TestCase):
+    """The pose capture relayed for the enrollment pages waits in the light admission pool"""
+
+    def test_full_light_pool_answers_503(self):
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        class_obj = Class.objects.create(title='Biology', time=datetime.time(9), created_by=teacher)
+        url = reverse('enroll_capture', args=[class_obj.enrollment_code, 'start'])
+        with mock.patch('face_recognition.face_api_client.admit',
+                        side_effect=FaceServiceBusy('light', 3, 'queue_full')) as admit:
+            response = self.client.post(url, json.dumps({'student_id': 'S1', 'email': ''}),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        admit.assert_called_with('light', owner=teacher.id)
+        self.assertNotIn('enrollment_capture', self.client.session)
+
+
+class EmbeddingTests(SimpleTestCase):
+    """Captured embeddings are compacted to distinct medoids and matched by best template"""
+
+    @staticmethod
+    def clusters(centres, per_cluster=5, seed=0):
+        rng = np.random.default_rng(seed)
+        return np.concatenate([centre + rng.normal(0, 0.01, (per_cluster, len(centre))) for centre in centres])
+
+    def test_one_medoid_per_cluster(self):
+        matrix = self.clusters(np.eye(4)[:3])
+        chosen = k_medoids(matrix, 3)
+        self.assertEqual(sorted(i // 5 for i in chosen), [0, 1, 2])
+
+    def test_duplicate_rows_are_not_picked_twice(self):
+        matrix = np.array([[1.0, 0.0]] * 5 + [[0.0, 1.0]])
+        self.assertEqual(len(set(k_medoids(matrix, 4))), 2)
+
+    def test_best_template_decides_the_match(self):
+        captures = self.clusters(np.eye(8)[:6], per_cluster=3)
+        templates = captures[k_medoids(captures, 4)]
+        other = np.eye(8)[6:]
+        gallery = TemplateGallery(['S1'] * len(templates) + ['S2'] * len(other), np.concatenate([templates, other]))
+        self.assertEqual(gallery.scores(captures).shape, (len(captures), 2))
+        self.assertEqual(gallery.match([templates[-1], np.eye(8)[7]]), [('S1', mock.ANY), ('S2', mock.ANY)])
+        self.assertEqual(gallery.match([-np.eye(8)[0]])[0][0], None)
+
+
+class PerformanceMiddlewareTests(TestCase):
+    """Requests are measured per URL name, over-budget requests are flagged and /metrics is restricted"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pass', is_staff=True)
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_requests_are_recorded_by_url_name(self):
+        self.client.get(reverse('login'))
+        rendered = metrics.render()
+        self.assertIn('http_request_duration_seconds_count{status="2xx",view="login"} 1', rendered)
+        self.assertIn('http_request_db_queries_count{view="login"} 1', rendered)
+
+    def test_server_timing_is_only_sent_to_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('login')))
+        self.client.force_login(self.staff)
+        self.assertIn('db;dur=', self.client.get(reverse('dashboard'))['Server-Timing'])
+        self.assertNotIn('Server-Timing', self.client.get(reverse('login')))  # Never loads the user
+
+    async def test_asgi_requests_count_the_queries_of_sync_views(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+        self.assertIn('http_request_db_queries_count{view="dashboard"} 1', metrics.render())
+
+    @override_settings(PERF_QUERY_BUDGETS={'dashboard': 0})
+    def test_query_budget_is_logged_and_counted(self):
+        self.client.force_login(self.staff)
+        with self.assertLogs('face_recognition.middleware', 'WARNING') as logs:
+            self.client.get(reverse('dashboard'))
+        self.assertIn('Query budget exceeded for dashboard', logs.output[0])
+        self.assertIn('http_request_query_budget_exceeded_total{view="dashboard"} 1', metrics.render())
+
+    def test_metrics_need_an_allowed_ip_or_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)  # Loopback isn't trusted
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.1']):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 200)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_from_allowed_ip_skip_the_user(self):
+        self.client.force_login(self.staff)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_totals_of_exited_workers_are_kept(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker = subprocess.Popen(['true'])
+        worker.wait()
+        with open(f'{directory}/{worker.pid}.json', 'w') as f:  # A worker that died without cleaning up
+            json.dump({'counters': [['db_busy_errors_total', [], 7]], 'histograms': []}, f)
+        with override_settings(METRICS_MULTIPROC_DIR=directory):
+            metrics.inc('db_busy_retries_total')
+            self.assertIn('db_busy_errors_total 7', metrics.render())
+            self.assertEqual(sorted(os.listdir(directory)), [f'{os.getpid()}.json', 'archive.json', 'archive.lock'])
+
+            metrics._archive_own_dump()  # This worker exits
+            metrics.reset()
+            rendered = metrics.render()
+        self.assertIn('db_busy_errors_total 7', rendered)
+        self.assertIn('db_busy_retries_total 1', rendered)
+
+
+class ProfilingTests(TestCase):
+    """Profiling is off unless enabled, triggered on demand only by staff, and downloads stay in PROFILER_DIR"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pass', is_staff=True)
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.root = os.path.join(directory, 'profiles')
+        self.enterContext(override_settings(PROFILER_ENABLED=True, PROFILER_DIR=self.root))
+
+    def test_middleware_removes_itself_when_disabled(self):
+        with override_settings(PROFILER_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
+
+    def test_header_profiles_only_staff_requests(self):
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('login'), HTTP_X_PROFILE='1'))
+        self.client.force_login(self.teacher)
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('dashboard'), HTTP_X_PROFILE='1'))
+
+        self.client.force_login(self.staff)
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('dashboard')))
+        view, stem = self.client.get(reverse('dashboard'), HTTP_X_PROFILE='1')['X-Profile-Id'].split('/')
+        self.assertEqual(view, 'dashboard')
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, view))), [f'{stem}.collapsed', f'{stem}.prof'])
+
+        response = self.client.get(reverse('profile_download', args=[view, f'{stem}.prof']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content))
+
+    async def test_asgi_request_profiles_its_sync_view(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('dashboard'), headers={'X-Profile': '1'})
+        view, stem = response['X-Profile-Id'].split('/')
+        profiled = pstats.Stats(os.path.join(self.root, view, f'{stem}.prof')).stats
+        self.assertIn('dashboard', {function for _, _, function in profiled})
+
+    def test_one_request_is_profiled_at_a_time(self):
+        self.client.force_login(self.staff)
+        with RequestProfile() as other:
+            self.assertTrue(other.active)
+            response = self.client.get(reverse('dashboard'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertIn('X-Profile-Id', self.client.get(reverse('dashboard'), HTTP_X_PROFILE='1'))
+
+    def test_download_cannot_leave_the_profile_directory(self):
+        os.makedirs(os.path.join(self.root, 'dashboard'))
+        for name in ['secret.prof', 'profiles/dashboard/notes.txt']:
+            with open(os.path.join(os.path.dirname(self.root), name), 'w') as f:
+                f.write('private')
+        self.client.force_login(self.staff)
+        for view, name in [('..', 'secret.prof'), ('dashboard', '..'), ('dashboard', 'notes.txt')]:
+            response = self.client.get(reverse('profile_download', args=[view, name]))
+            self.assertEqual(response.status_code, 404, (view, name))
+
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('profile_download', args=['dashboard', 'notes.txt']))
+        self.assertEqual(response.status_code, 302)
+
+
+class BenchmarkCommandTests(TestCase):
+    """Synthetic data keeps its historical dates and benchmarking leaves the dataset as it was"""
+
+    def setUp(self):
+        call_command('generate_synthetic_data', teachers=1, classes=2, students=3, days=3, stdout=StringIO())
+
+    def test_synthetic_history_has_its_own_dates(self):
+        days = sorted(set(AttendanceSession.objects.values_list('date', flat=True)))
+        self.assertEqual(len(days), 3)
+        self.assertLessEqual(days[-1], timezone.now().date())
+        self.assertTrue(all(day.weekday() < 5 for day in days))
+        self.assertEqual(Attendance.objects.count(), 2 * 3 * 3)
+        self.assertFalse(Attendance.objects.exclude(date=F('attendance_session__date')).exists())
+        self.assertTrue(Attendance._meta.get_field('date').auto_now_add)
+
+    def test_benchmark_restores_todays_attendance(self):
+        def snapshot():
+            return sorted(Attendance.objects.values_list('id', 'status', 'marked_by', 'attendance_session', 'date', 'time'))
+
+        before, sessions = snapshot(), AttendanceSession.objects.count()
+        baseline = f'{tempfile.mkdtemp()}/baseline.json'
+        self.addCleanup(shutil.rmtree, baseline.rsplit('/', 1)[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('run_benchmarks', iterations=1, warmup=0, baseline=baseline, stdout=StringIO())
+        self.assertEqual(snapshot(), before)
+        self.assertEqual(AttendanceSession.objects.count(), sessions)
+        self.assertFalse(Person.objects.filter(student_id__startswith='BENCH-').exists())
+
+
+class LoadTestSmokeTests(LiveServerTestCase):
+    """load_test drives a live server and the face service stub end to end and cleans up after itself"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.stub = make_server(port=0)
+        thread = threading.Thread(target=self.stub.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.stub.server_close)
+        self.addCleanup(self.stub.shutdown)
+        self.enterContext(override_settings(
+            FACE_API_URL=f'http://127.0.0.1:{self.stub.server_port}',
+            FACE_API_ADMISSION_DIR=directory,
+            MEDIA_ROOT=directory,
+        ))
+        call_command('generate_synthetic_data', teachers=1, classes=1, students=5, days=1, stdout=StringIO())
+        # The status stream is an async iterator, which the WSGI live server consumes synchronously
+        self.enterContext(warnings.catch_warnings())
+        warnings.filterwarnings('ignore', 'StreamingHttpResponse must consume asynchronous iterators')
+
+    def test_run_without_errors(self):
+        attendance = sorted(Attendance.objects.values_list('id', 'status', 'attendance_session', 'time'))
+        output = StringIO()
+        call_command('load_test', base_url=self.live_server_url, lecturers=1, students=1, duration=1,
+                     think_time=0, photo_kb=1, request_timeout=30, stdout=output)
+        report = output.getvalue()
+        for action in ['dashboard', 'mark_attendance_facial', 'attendance_processing', 'enroll_capture_complete',
+                       'enroll_save']:
+            self.assertIn(action, report)
+        self.assertRegex(report, r'Django tier: [1-9]\d* requests, 0 errors')
+        self.assertFalse(Student.objects.filter(student_id__startswith='LOAD-').exists())
+        self.assertEqual(sorted(Attendance.objects.values_list('id', 'status', 'attendance_session', 'time')),
+                         attendance)
+
+
+@override_settings(DB_BUSY_RETRIES=2, DB_BUSY_BACKOFF=0)
+class AtomicWithRetryTests(TransactionTestCase):
+    """Write transactions are re-run while SQLite is locked, but not forever and not inside another transaction"""
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    @staticmethod
+    def failing(times, message='database is locked'):
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) <= times:
+                raise OperationalError(message)
+            return 'written'
+        return write, calls
+
+    def test_retries_while_locked(self):
+        write, calls = self.failing(2)
+        self.assertEqual(atomic_with_retry(write), 'written')
+        self.assertEqual(len(calls), 3)
+        self.assertIn('db_busy_retries_total{database="default"} 2', metrics.render())
+
+    def test_gives_up_after_the_configured_retries(self):
+        write, calls = self.failing(3)
+        with self.assertRaises(OperationalError):
+            atomic_with_retry(write)
+        self.assertEqual(len(calls), 3)
+        self.assertIn('db_busy_errors_total{database="default"} 1', metrics.render())
+
+    def test_other_errors_and_outer_transactions_are_not_retried(self):
+        write, calls = self.failing(1, message='no such table: missing')
+        with self.assertRaises(OperationalError):
+            atomic_with_retry(write)
+        self.assertEqual(len(calls), 1)
+
+        write, calls = self.failing(1)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            atomic_with_retry(write)
+        self.assertEqual(len(calls), 1)
+
+
+class RecordAttendanceTests(TestCase):
+    """A class is marked with one update for today's existing rows and one insert for the rest"""
+
+    def test_updates_existing_rows_and_creates_missing_ones(self):
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        class_obj = Class.objects.create(title='Biology', time=datetime.time(9), created_by=teacher)
+        students = [
+            Student.objects.create(person=Person.objects.create(student_id=f'S{n}', name=f'Student {n}'),
+                                   name=f'Student {n}', student_id=f'S{n}', class_enrolled=class_obj)
+            for n in range(3)
+        ]
+        first = AttendanceSession.objects.create(class_session=class_obj, created_by=teacher, method='manual')
+        existing = Attendance.objects.create(student=students[0], class_session=class_obj,
+                                             attendance_session=first, status='present', marked_by='manual')
+        second = AttendanceSession.objects.create(class_session=class_obj, created_by=teacher, method='facial')
+
+        statuses = {students[0].pk: 'absent', students[1].pk: 'present', students[2].pk: 'late'}
+        with self.assertNumQueries(3):
+            counts = record_attendance(class_obj, second, statuses, 'facial')
+        self.assertEqual(counts, (1, 2))
+        existing.refresh_from_db()
+        self.assertEqual((existing.status, existing.attendance_session), ('absent', second))
+        self.assertEqual(
+            dict(Attendance.objects.filter(attendance_session=second).values_list('student_id', 'status')), statuses)
+
+
+class SessionEventsTests(TestCase):
+    """Facial attendance is processed in the background and its status streamed over SSE"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        cls.class_obj = Class.objects.create(title='Biology', time=datetime.time(9), created_by=cls.teacher)
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def _session(self, status):
+        return AttendanceSession.objects.create(
+            class_session=self.class_obj, created_by=self.teacher, method='facial', processing_status=status
+        )
+
+    def test_upload_returns_session_and_stream(self):
+        photos = {f'photo{n}': SimpleUploadedFile(f'photo{n}.jpg', b'\xff\xd8', 'image/jpeg') for n in (1, 2, 3)}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), \
+                mock.patch('face_recognition.attendance_processing.start_facial_attendance') as start:
+            response = self.client.post(reverse('mark_attendance_facial', args=[self.class_obj.id]), photos,
+                                        HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        start.assert_called_once_with(data['session_id'])
+        self.assertEqual(data['status'], 'pending')
+        self.assertEqual(data['events_url'], reverse('attendance_session_events', args=[data['session_id']]))
+
+    def test_stream_follows_status_until_finished(self):
+        session = self._session('processing')
+
+        def finish():
+            with self.captureOnCommitCallbacks(execute=True):
+                update_status(session, 'completed', present_count=3, total_students=4)
+
+        async def read():
+            events = stream(session.id)
+            received = [await events.__anext__()]
+            await sync_to_async(finish)()
+            received += [event async for event in events]
+            return received
+
+        first, last = async_to_sync(read)()
+        self.assertIn('"status": "processing"', first)
+        self.assertTrue(last.startswith('id: '))
+        data = json.loads(last.split('data: ', 1)[1])
+        self.assertEqual((data['status'], data['present_count'], data['total_students']), ('completed', 3, 4))
+
+    async def test_stream_is_private_to_the_lecturer(self):
+        session = await sync_to_async(self._session)('completed')
+        url = reverse('attendance_session_events', args=[session.id])
+        await self.async_client.aforce_login(self.teacher)
+        response = await self.async_client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(b'"status": "completed"', b''.join([chunk async for chunk in response.streaming_content]))
+
+        other = await User.objects.acreate_user('other', 'other@example.com', 'pass')
+        await self.async_client.aforce_login(other)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+
+    @override_settings(SESSION_EVENTS_KEEPALIVE=0.01, SESSION_PROCESSING_TIMEOUT=60)
+    def test_stale_sessions_are_failed(self):
+        stale, finished, fresh = self._session('processing'), self._session('completed'), self._session('pending')
+        long_ago = timezone.now() - datetime.timedelta(minutes=5)
+        AttendanceSession.objects.filter(pk__in=[stale.pk, finished.pk]).update(updated_at=long_ago)
+
+        async def read():
+            return [event async for event in stream(stale.id)]
+
+        last = async_to_sync(read)()[-1]
+        self.assertEqual(json.loads(last.split('data: ', 1)[1])['status'], 'failed')
+        self.assertEqual(
+            dict(AttendanceSession.objects.values_list('pk', 'processing_status')),
+            {stale.pk: 'failed', finished.pk: 'completed', fresh.pk: 'pending'},
+        )
+
+        AttendanceSession.objects.filter(pk=fresh.pk).update(updated_at=long_ago)
+        output = StringIO()
+        call_command('expire_attendance_sessions', stdout=output)
+        self.assertIn('1 stale session(s)', output.getvalue())
+        self.assertEqual(AttendanceSession.objects.get(pk=fresh.pk).processing_status, 'failed')
+
+
+class FacialAttendanceProcessingTests(TestCase):
+    """process_facial_attendance records the recognised students or fails the session with a reason"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        cls.class_obj = Class.objects.create(title='Biology', time=datetime.time(9), created_by=cls.teacher)
+        for n in (1, 2):
+            person = Person.objects.create(student_id=f'S{n}', name=f'Student {n}')
+            Student.objects.create(person=person, name=person.name, student_id=person.student_id,
+                                   class_enrolled=cls.class_obj)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.session = AttendanceSession.objects.create(
+            class_session=self.class_obj, created_by=self.teacher, method='facial', processing_status='pending',
+            **{f'photo{n}': SimpleUploadedFile(f'photo{n}.jpg', b'\xff\xd8', 'image/jpeg') for n in (1, 2, 3)}
+        )
+
+    def process(self, **mark_attendance):
+        with mock.patch('face_recognition.face_api_client.FaceAPIClient.mark_attendance', **mark_attendance) as call:
+            process_facial_attendance(self.session.id)
+        self.session.refresh_from_db()
+        return call
+
+    def test_recognised_students_are_marked(self):
+        call = self.process(return_value={'success': True, 'present_students': ['S1'], 'total_detected': 1})
+        self.assertEqual(call.call_args.kwargs['class_code'], self.class_obj.enrollment_code)
+        self.assertEqual((self.session.processing_status, self.session.processed), ('completed', True))
+        self.assertEqual((self.session.present_count, self.session.total_students), (1, 2))
+        self.assertEqual(dict(self.session.records.values_list('student__student_id', 'status')),
+                         {'S1': 'present', 'S2': 'absent'})
+
+    def test_face_service_failure_fails_the_session(self):
+        self.process(return_value={'success': False, 'error': 'HTTP 500'})
+        self.assertEqual(self.session.processing_status, 'failed')
+        self.assertIn('Face recognition failed: HTTP 500', self.session.processing_error)
+        self.assertFalse(self.session.records.exists())
+
+    def test_busy_face_service_asks_to_retry_later(self):
+        self.process(return_value={'success': False, 'error': 'queue_full', 'retry_after': 7})
+        self.assertEqual(self.session.processing_status, 'failed')
+        self.assertIn('try again in 7 seconds', self.session.processing_error)
+
+    def test_unexpected_errors_fail_the_session(self):
+        with self.assertLogs('face_recognition.attendance_processing', 'ERROR'):
+            self.process(side_effect=RuntimeError('boom'))
+        self.assertEqual(self.session.processing_status, 'failed')
+        self.assertEqual(self.session.processing_error, 'Unexpected error while processing the photos.')
+
+
+class KeyframeTests(TestCase):
+    """Video/burst uploads are reduced to the sharpest frame of each distinct view"""
+
+    @staticmethod
+    def _burst():
+        """Three views of the room, each as a run of blurred frames around one sharp frame"""
+        rng = np.random.default_rng(0)
+        frames, sharp = [], []
+        for view in range(3):
+            scene = Image.fromarray((rng.random((120, 160)) * 255).astype(np.uint8)).resize((320, 240))
+            for n in range(5):
+                if n == 2:
+                    sharp.append(len(frames))
+                frames.append(scene if n == 2 else scene.filter(ImageFilter.BoxBlur(3)))
+        return frames, sharp
+
+    def test_picks_sharpest_frame_of_each_view(self):
+        frames, sharp = self._burst()
+        selector = KeyframeSelector(3)
+        for frame in frames:
+            selector.add(frame)
+        self.assertEqual([f.index for f in selector.select()], sharp)
+
+    def test_burst_upload_becomes_three_photos(self):
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        class_obj = Class.objects.create(title='Biology', time=datetime.time(9), created_by=teacher)
+        self.client.force_login(teacher)
+
+        frames, sharp = self._burst()
+        jpegs = []
+        for frame in frames:
+            data = BytesIO()
+            frame.save(data, 'JPEG')
+            jpegs.append(data.getvalue())
+        uploads = [SimpleUploadedFile(f'frame{n}.jpg', data, 'image/jpeg') for n, data in enumerate(jpegs)]
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), \
+                mock.patch('face_recognition.attendance_processing.start_facial_attendance') as start:
+            with mock.patch('face_recognition.attendance_processing.select_keyframes') as select:
+                response = self.client.post(reverse('mark_attendance_facial', args=[class_obj.id]),
+                                            {'frames': uploads}, HTTP_ACCEPT='application/json')
+            self.assertEqual(response.status_code, 202)
+            select.assert_not_called()  # Left to the background processing
+            session_id = response.json()['session_id']
+            start.assert_called_once_with(session_id)
+            self.assertEqual(len(AttendanceSession.objects.get(pk=session_id).clip), len(jpegs))
+
+            with mock.patch('face_recognition.face_api_client.FaceAPIClient.mark_attendance',
+                            return_value={'success': True, 'present_students': []}), \
+                    self.captureOnCommitCallbacks(execute=True):
+                process_facial_attendance(session_id)
+            session = AttendanceSession.objects.get(pk=session_id)
+            photos = [photo.read() for photo in (session.photo1, session.photo2, session.photo3)]
+            self.assertEqual((session.processing_status, session.clip), ('completed', []))
+            self.assertEqual(os.listdir(os.path.join(media_root, 'attendance_clips')), [])
+        self.assertEqual(photos, [jpegs[n] for n in sharp])
+
+    def test_unreadable_clip_fails_the_session(self):
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        class_obj = Class.objects.create(title='Biology', time=datetime.time(9), created_by=teacher)
+        self.client.force_login(teacher)
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), \
+                mock.patch('face_recognition.attendance_processing.start_facial_attendance'):
+            response = self.client.post(reverse('mark_attendance_facial', args=[class_obj.id]),
+                                        {'frames': [SimpleUploadedFile('frame.jpg', b'not a jpeg')]},
+                                        HTTP_ACCEPT='application/json')
+            session_id = response.json()['session_id']
+            with mock.patch('face_recognition.face_api_client.FaceAPIClient.mark_attendance') as mark:
+                process_facial_attendance(session_id)
+            mark.assert_not_called()
+        session = AttendanceSession.objects.get(pk=session_id)
+        self.assertEqual(session.processing_status, 'failed')
+        self.assertEqual(session.processing_error, 'frame.jpg is not a readable image')
+        self.assertEqual(session.clip, [])
+
+
+class AdminChangelistTests(TestCase):
+    """Attendance admin stays set-based: estimated counts, seeking date hierarchy, batched bulk actions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_synthetic_data', teachers=2, classes=2, students=10, days=45, stdout=StringIO())
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def test_seeking_dates_match_distinct_dates(self):
+        queryset = SeekingQuerySet(Attendance)
+        for kind in ('year', 'month', 'day'):
+            self.assertEqual(queryset.dates('date', kind), list(Attendance.objects.dates('date', kind)))
+        self.assertEqual(
+            queryset.aggregate(first=Min('date'), last=Max('date')),
+            Attendance.objects.aggregate(first=Min('date'), last=Max('date')),
+        )
+
+    def test_paginator_estimates_unfiltered_and_caps_filtered_counts(self):
+        total = Attendance.objects.count()
+        with mock.patch.object(EstimatedCountPaginator, 'estimate_above', 0), \
+                mock.patch.object(EstimatedCountPaginator, 'count_limit', 5):
+            self.assertEqual(EstimatedCountPaginator(Attendance.objects.order_by('id'), 100).count, total)
+            self.assertEqual(EstimatedCountPaginator(Attendance.objects.filter(status='present').order_by('id'), 100).count, 5)
+
+    def test_bulk_status_action_updates_in_batches(self):
+        self.client.force_login(self.admin_user)
+        total = Attendance.objects.count()
+        with override_settings(DB_UPDATE_BATCH_SIZE=total // 3 + 1), CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('admin:face_recognition_attendance_changelist'), {
+                'action': 'mark_late', 'select_across': '1', 'index': '0',
+                '_selected_action': list(Attendance.objects.values_list('pk', flat=True)[:1]),
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Attendance.objects.exclude(status='late').count(), 0)
+        updates = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 3)
+
+    def test_sparse_selection_updates_one_batch_per_batch_size_rows(self):
+        expected = dict(Attendance.objects.values_list('pk', 'status'))
+        pks = sorted(expected)
+        chosen = pks[::50] + pks[-1:]  # Spread over the whole pk range
+        expected.update(dict.fromkeys(chosen, 'late'))
+        with CaptureQueriesContext(connection) as captured:
+            updated = update_in_batches(Attendance.objects.filter(pk__in=chosen), batch_size=4, status='late')
+        self.assertEqual(updated, len(chosen))
+        self.assertEqual(dict(Attendance.objects.values_list('pk', 'status')), expected)
+        updates = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), -(-len(chosen) // 4))
+
+
+class StudentSearchTests(TestCase):
+    """The full-text index follows every kind of Student write; search is ranked and scoped to the lecturer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lecturer = User.objects.create_user('lecturer', 'lecturer@example.com', 'pass')
+        other = User.objects.create_user('other', 'other@example.com', 'pass')
+        cls.maths = Class.objects.create(title='Maths', time='09:00', created_by=cls.lecturer)
+        cls.physics = Class.objects.create(title='Physics', time='11:00', created_by=cls.lecturer)
+        cls.elsewhere = Class.objects.create(title='History', time='09:00', created_by=other)
+        for class_obj, name, student_id, email in [
+            (cls.maths, 'Joanna Kamau', 'S-100', 'joanna@students.example.ac'),
+            (cls.physics, 'Anna Wambui', 'S-200', None),
+            (cls.physics, 'Brian Otieno', 'ANN-300', 'brian@students.example.ac'),
+            (cls.elsewhere, 'Anna Chege', 'S-400', None),
+        ]:
+            cls._enroll(class_obj, name, student_id, email)
+
+    @staticmethod
+    def _enroll(class_obj, name, student_id, email=None):
+        person = Person.objects.create(name=name, student_id=student_id, email=email)
+        return Student.objects.create(person=person, name=name, student_id=student_id, email=email,
+                                      class_enrolled=class_obj)
+
+    def _names(self, query, engine='index'):
+        return [student.name for student in search_students(self.lecturer, query, engine=engine)[0]]
+
+    def _check_integrity(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('integrity-check', 1)")
+
+    def test_index_follows_student_writes(self):
+        student = Student.objects.get(student_id='S-100')
+        student.name = 'Joanna Njeri'
+        student.save()
+        self.assertEqual(self._names('njeri'), ['Joanna Njeri'])
+        self.assertEqual(self._names('kamau'), [])
+
+        Student.objects.filter(student_id='S-200').update(email='anna.w@students.example.ac')
+        self.assertEqual(self._names('anna.w'), ['Anna Wambui'])
+        person = Person.objects.create(name='Zawadi Mutua', student_id='S-500')
+        Student.objects.bulk_create([Student(person=person, name=person.name, student_id=person.student_id,
+                                             class_enrolled=self.maths)])
+        self.assertEqual(self._names('zawadi'), ['Zawadi Mutua'])
+
+        self.physics.delete()
+        self.assertEqual(self._names('ann'), ['Joanna Njeri'])
+        self._check_integrity()
+
+    def test_search_is_ranked_and_scoped(self):
+        self.client.force_login(self.lecturer)
+        response = self.client.get(reverse('search_students'), {'q': 'ann'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        # Student ID prefix, then name prefix, then anywhere; another lecturer's Anna is left out
+        self.assertEqual([r['name'] for r in results], ['Brian Otieno', 'Anna Wambui', 'Joanna Kamau'])
+        self.assertEqual(results[1]['class_title'], 'Physics')
+        self.assertEqual(results[1]['analytics_url'], reverse('student_analytics', args=[results[1]['id']]))
+
+        for query in ('ann', 'anna w', 'students.example', 's-', 'an'):
+            self.assertEqual(sorted(self._names(query)), sorted(self._names(query, engine='like')), query)
+        self.assertEqual(self._names('ann', engine='like'), ['Brian Otieno', 'Anna Wambui', 'Joanna Kamau'])
+        self.assertEqual(self.client.get(reverse('search_students'), {'q': 'ann', 'limit': 'x'}).status_code, 400)
+
+    def test_ensure_index_restores_dropped_triggers(self):
+        # What Django's SQLite schema editor does to triggers when it rebuilds the table
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER face_recognition_student_fts_insert')
+        self._enroll(self.maths, 'Faith Achieng', 'S-600')
+        self.assertEqual(self._names('faith'), [])
+
+        self.assertTrue(ensure_index())
+        self.assertFalse(ensure_index())
+        self.assertEqual(self._names('faith'), ['Faith Achieng'])
+        self._enroll(self.maths, 'Faith Barasa', 'S-700')
+        self.assertEqual(self._names('faith barasa'), ['Faith Barasa'])
+        self._check_integrity()
+
+
+class FakeEnrollmentClient:
+    """FaceAPIClient stand-in for roster imports: students whose ID ends in 'X' fail"""
+
+    def __init__(self, owner=None):
+        pass
+
+    def enroll_student(self, student_id, name, class_code, images):
+        if student_id.endswith('X'):
+            return {'success': False, 'error': 'No face found'}
+        return {'success': True}
+
+    def link_student_to_class(self, student_id, class_code):
+        return {'success': True}
+
+
+def roster_files(lines, photo_ids):
+    """Roster CSV and a photos ZIP with three photos for each of photo_ids"""
+    roster = SimpleUploadedFile('roster.csv', ('\n'.join(lines) + '\n').encode(), 'text/csv')
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for student_id in photo_ids:
+            for n in range(3):
+                archive.writestr(f'{student_id}/{n}.jpg', b'\xff\xd8')
+    return roster, SimpleUploadedFile('photos.zip', buffer.getvalue(), 'application/zip')
+
+
+class RosterImportTests(TestCase):
+    """Rosters are validated in one pass, created in bulk and resumable"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lecturer = User.objects.create_user('lecturer', 'lecturer@example.com', 'pass')
+        cls.class_obj = Class.objects.create(title='Maths', time='09:00', created_by=cls.lecturer)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.enterContext(mock.patch('face_recognition.roster_import.FaceAPIClient', FakeEnrollmentClient))
+        self.client.force_login(self.lecturer)
+
+    def _import(self):
+        roster, photos = roster_files(
+            ['name,student_id,email', 'Amina Kamau,S1,amina@example.com', 'Brian Otieno,S2X,'], ['S1', 'S2X'])
+        rows, errors = parse_roster(roster, photos, self.class_obj)
+        self.assertEqual(errors, [])
+        return create_roster_import(self.class_obj, self.lecturer, rows, photos)
+
+    def test_parse_reports_every_problem_at_once(self):
+        roster, photos = roster_files([
+            'name,student_id,email', 'Amina Kamau,S1,amina@example.com', ',S2,', 'Brian Otieno,S1,',
+            'Chebet Mutua,S3,not-an-email', 'David Wafula,S4,',
+        ], ['S1', 'S3'])
+        rows, errors = parse_roster(roster, photos, self.class_obj)
+        self.assertEqual([row['student_id'] for row in rows], ['S1'])
+        self.assertEqual([e['line'] for e in errors], [3, 4, 5, 6])
+        self.assertIn('0 photo(s)', errors[-1]['error'])
+
+    def test_ragged_row_is_a_line_error(self):
+        roster, photos = roster_files(
+            ['name,student_id', 'Amina Kamau,S1', 'Brian Otieno,S2,brian@example.com,extra'], ['S1', 'S2'])
+        rows, errors = parse_roster(roster, photos, self.class_obj)
+        self.assertEqual([row['student_id'] for row in rows], ['S1'])
+        self.assertEqual(errors, [{'line': 3, 'error': 'Row has 2 more field(s) than the header'}])
+
+    def test_existing_person_needs_their_enrollment_email(self):
+        Person.objects.create(student_id='S1', name='Amina Kamau', email='amina@example.com',
+                              template_enrolled_at=timezone.now())
+        Person.objects.create(student_id='S2', name='Brian Otieno', template_enrolled_at=timezone.now())
+        roster, photos = roster_files(
+            ['name,student_id,email', 'Amina Kamau,S1,someone@example.com', 'Brian Otieno,S2,'], ['S1'])
+        rows, errors = parse_roster(roster, photos, self.class_obj)
+        self.assertEqual(rows, [])
+        self.assertEqual(errors, [{'line': 2, 'error': 'S1 is already registered with a different email'},
+                                  {'line': 3, 'error': 'S2 is already registered with a different email'}])
+
+        roster, photos = roster_files(['name,student_id,email', 'Amina Kamau,S1,Amina@example.com'], [])
+        rows, errors = parse_roster(roster, photos, self.class_obj)
+        self.assertEqual((errors, rows[0]['photo_names']), ([], []))
+
+    def test_run_enrolls_lines_and_resume_retries_failures(self):
+        roster_import = self._import()
+        self.assertEqual(list(self.class_obj.students.order_by('student_id').values_list('student_id', flat=True)),
+                         ['S1', 'S2X'])
+        roster_import = run_roster_import(roster_import.id)
+        self.assertEqual((roster_import.status, roster_import.enrolled, roster_import.failed), ('failed', 1, 1))
+        self.assertIsNotNone(roster_import.progress_at)
+        self.assertIsNotNone(Person.objects.get(student_id='S1').template_enrolled_at)
+
+        with mock.patch('face_recognition.roster_import.start_roster_import') as start:
+            response = self.client.post(reverse('bulk_import_resume', args=[roster_import.id]))
+        self.assertEqual(response.status_code, 200)
+        start.assert_called_once_with(roster_import.id)
+
+    def test_concurrent_import_of_the_same_roster_is_rejected(self):
+        roster, photos = roster_files(['name,student_id', 'Amina Kamau,S1'], ['S1'])
+        rows, _ = parse_roster(roster, photos, self.class_obj)
+        self._import()  # Another upload got in after this one was validated
+        with self.assertRaises(RosterConflict):
+            create_roster_import(self.class_obj, self.lecturer, rows, photos)
+
+        roster, photos = roster_files(['name,student_id', 'Amina Kamau,S1'], ['S1'])
+        with mock.patch('face_recognition.roster_import.parse_roster', return_value=(rows, [])):
+            response = self.client.post(reverse('bulk_import', args=[self.class_obj.id]),
+                                        {'roster': roster, 'photos': photos})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(RosterImport.objects.count(), 1)
+
+    def test_stale_running_import_can_be_resumed(self):
+        roster_import = self._import()
+        started = timezone.now() - datetime.timedelta(hours=1)
+        RosterImport.objects.filter(pk=roster_import.pk).update(status='running', started_at=started,
+                                                                progress_at=started)
+        url = reverse('bulk_import_resume', args=[roster_import.id])
+        with mock.patch('face_recognition.roster_import.start_roster_import') as start:
+            self.assertEqual(self.client.post(url).status_code, 200)
+            start.assert_called_once_with(roster_import.id)
+
+            RosterImport.objects.filter(pk=roster_import.pk).update(status='running', progress_at=timezone.now())
+            self.assertEqual(self.client.post(url).status_code, 400)
+            start.assert_called_once()
+
+
+class RosterImportRunTests(TransactionTestCase):
+    """start_roster_import runs the import on its own thread and database connection"""
+
+    def test_background_run_finishes_the_import(self):
+        lecturer = User.objects.create_user('lecturer', 'lecturer@example.com', 'pass')
+        class_obj = Class.objects.create(title='Maths', time='09:00', created_by=lecturer)
+        roster, photos = roster_files(['name,student_id', 'Amina Kamau,S1', 'Brian Otieno,S2'], ['S1', 'S2'])
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), \
+                mock.patch('face_recognition.roster_import.FaceAPIClient', FakeEnrollmentClient):
+            rows, _ = parse_roster(roster, photos, class_obj)
+            roster_import = create_roster_import(class_obj, lecturer, rows, photos)
+            start_roster_import(roster_import.id).join(timeout=30)
+        roster_import.refresh_from_db()
+        self.assertEqual((roster_import.status, roster_import.enrolled), ('completed', 2))
+        self.assertEqual(set(roster_import.rows.values_list('status', flat=True)), {'enrolled'})
@@ -11,7 +11,18 @@ urlpatterns = [
     path('mark-attendance/<int:class_id>/', views.mark_attendance, name='mark_attendance'),
     path('mark-attendance-facial/<int:class_id>/', views.mark_attendance_facial, name='mark_attendance_facial'),
     path('mark-attendance-manual/<int:class_id>/', views.mark_attendance_manual, name='mark_attendance_manual'),
+    path('attendance-session/<int:session_id>/events/', views.attendance_session_events, name='attendance_session_events'),
+    path('students/search/', views.search_students, name='search_students'),
     path('enroll-manual/<int:class_id>/', views.enroll_student_manual, name='enroll_student_manual'),
     path('save-enrollment/', views.save_enrollment, name='save_enrollment'),
+    path('bulk-import/<int:class_id>/', views.bulk_import, name='bulk_import'),
+    path('bulk-import/status/<int:import_id>/', views.bulk_import_status, name='bulk_import_status'),
+    path('bulk-import/resume/<int:import_id>/', views.bulk_import_resume, name='bulk_import_resume'),
     path('enroll/<str:enrollment_code>/', views.enroll_student, name='enroll_student'),
+    path('enroll/<str:enrollment_code>/template-status/', views.enroll_template_status, name='enroll_template_status'),
+    path('enroll/<str:enrollment_code>/capture/<str:step>/', views.enroll_capture, name='enroll_capture'),
+    path('metrics', views.metrics, name='metrics'),
+    path('analytics/', views.attendance_analytics, name='attendance_analytics'),
+    path('analytics/class/<int:class_id>/', views.class_analytics, name='class_analytics'),
+    path('analytics/student/<int:student_pk>/', views.student_analytics, name='student_analytics'),
 ]
\ No newline at end of file
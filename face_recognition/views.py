@@ -1,8 +1,10 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login as auth_login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.views.decorators.csrf import ensure_csrf_cookie
 from .models import Class, Student, Attendance
 from datetime import datetime
 
@@ -73,56 +75,25 @@ def login_view(request):
 
 @login_required(login_url='login')
 def dashboard(request):
+    import time
+    from django.conf import settings
     from django.utils import timezone
-    from django.db.models import Count, Q
-    
-    classes = Class.objects.filter(created_by=request.user).order_by('-created_at')
-    total_classes = classes.count()
+    from . import metrics
+    from .dashboard import DashboardStats, get_versions
     
-    # Calculate total students across all classes
-    total_students = sum(cls.get_student_count() for cls in classes)
-    
-    # Get today's date
     today = timezone.now().date()
     
-    # Calculate today's attendance statistics
-    today_attendance = Attendance.objects.filter(
-        class_session__created_by=request.user,
-        date=today
-    )
-    
-    total_present_today = today_attendance.filter(status='present').count()
-    total_absent_today = today_attendance.filter(status='absent').count()
-    total_late_today = today_attendance.filter(status='late').count()
-    
-    # Calculate attendance rate for today
-    total_marked_today = today_attendance.count()
-    attendance_rate = round((total_present_today / total_marked_today * 100), 1) if total_marked_today > 0 else 0
-    
-    # Get classes that haven't taken attendance today
-    classes_with_attendance_today = today_attendance.values_list('class_session_id', flat=True).distinct()
-    pending_classes = classes.exclude(id__in=classes_with_attendance_today)
-    
-    # Get today's absences with student details
-    todays_absences = Attendance.objects.filter(
-        class_session__created_by=request.user,
-        date=today,
-        status='absent'
-    ).select_related('student', 'class_session')[:10]  # Limit to 10 recent
-    
+    # Figures are computed lazily, only for fragments missing from the cache
     context = {
-        'classes': classes,
-        'total_classes': total_classes,
-        'total_students': total_students,
-        'attendance_rate': attendance_rate,
-        'total_absent_today': total_absent_today,
-        'pending_classes_count': pending_classes.count(),
-        'pending_classes': pending_classes,
-        'todays_absences': todays_absences,
-        'total_present_today': total_present_today,
-        'total_late_today': total_late_today,
+        'stats': DashboardStats(request.user, today),
+        'versions': get_versions(request.user.id),
+        'today': today.isoformat(),
+        'fragment_timeout': getattr(settings, 'DASHBOARD_FRAGMENT_TIMEOUT', 300),
     }
-    return render(request, 'face_recognition/dashboard.html', context)
+    started = time.perf_counter()
+    response = render(request, 'face_recognition/dashboard.html', context)
+    metrics.observe('template_render_duration_seconds', time.perf_counter() - started, template='dashboard')
+    return response
 
 @login_required(login_url='login')
 def create_class(request):
@@ -174,11 +145,20 @@ def mark_attendance(request, class_id):
 
 @login_required(login_url='login')
 def mark_attendance_facial(request, class_id):
-    """Handle facial recognition attendance via photo upload"""
+    """
+    Accept classroom photos for facial recognition attendance
+    
+    Either three photos (photo1..photo3), or a short video (video) or burst
+    of frames (frames, repeated) from which the three best keyframes are
+    picked (keyframes.py). Keyframe selection and recognition run in the
+    background (attendance_processing.py). Clients that ask for JSON get the
+    session id and the URL of its live status stream; a plain form post is
+    redirected to the dashboard.
+    """
+    from django.core.files.storage import default_storage
+    from django.http import JsonResponse
     from .models import AttendanceSession
-    from .face_api_client import FaceAPIClient
-    from django.utils import timezone
-    import json
+    from .attendance_processing import start_facial_attendance
     
     class_obj = get_object_or_404(Class, id=class_id, created_by=request.user)
     
@@ -186,11 +166,22 @@ def mark_attendance_facial(request, class_id):
         photo1 = request.FILES.get('photo1')
         photo2 = request.FILES.get('photo2')
         photo3 = request.FILES.get('photo3')
+        clip = request.FILES.getlist('video') + request.FILES.getlist('frames')
+        wants_json = 'application/json' in request.headers.get('Accept', '')
         
-        if not all([photo1, photo2, photo3]):
-            messages.error(request, 'Please upload all 3 photos')
+        def reject(error):
+            if wants_json:
+                return JsonResponse({'success': False, 'error': error}, status=400)
+            messages.error(request, error)
             return redirect('mark_attendance', class_id=class_id)
         
+        if clip:
+            # Decoding and scoring the frames is left to the background processing
+            photo1 = photo2 = photo3 = None
+            clip = [default_storage.save(f'attendance_clips/{upload.name}', upload) for upload in clip]
+        elif not all([photo1, photo2, photo3]):
+            return reject('Please upload all 3 photos, or a video or burst of frames')
+        
         # Create attendance session
         session = AttendanceSession.objects.create(
             class_session=class_obj,
@@ -199,64 +190,45 @@ def mark_attendance_facial(request, class_id):
             photo1=photo1,
             photo2=photo2,
             photo3=photo3,
-            processing_status='processing'
+            clip=clip,
+            processing_status='pending'
         )
+        start_facial_attendance(session.id)
         
-        # Call FastAPI to process photos
-        api_client = FaceAPIClient()
-        result = api_client.mark_attendance(
-            class_code=class_obj.enrollment_code,
-            image_files=[photo1, photo2, photo3]
-        )
-        
-        if result['success']:
-            # Mark students as present based on FastAPI response
-            present_student_ids = result.get('present_students', [])
-            
-            for student in class_obj.students.all():
-                if student.student_id in present_student_ids:
-                    Attendance.objects.update_or_create(
-                        student=student,
-                        class_session=class_obj,
-                        date=timezone.now().date(),
-                        defaults={
-                            'status': 'present',
-                            'marked_by': 'facial',
-                            'attendance_session': session
-                        }
-                    )
-                else:
-                    # Mark as absent if not detected
-                    Attendance.objects.update_or_create(
-                        student=student,
-                        class_session=class_obj,
-                        date=timezone.now().date(),
-                        defaults={
-                            'status': 'absent',
-                            'marked_by': 'facial',
-                            'attendance_session': session
-                        }
-                    )
-            
-            session.processed = True
-            session.processing_status = 'completed'
-            session.save()
-            
-            messages.success(request, f'Attendance marked! {len(present_student_ids)} students detected as present.')
-        else:
-            session.processing_status = 'failed'
-            session.save()
-            messages.error(request, f'Face recognition failed: {result.get("error", "Unknown error")}. Please try manual attendance.')
-        
+        if wants_json:
+            return JsonResponse({
+                'success': True,
+                'session_id': session.id,
+                'status': session.processing_status,
+                'events_url': reverse('attendance_session_events', args=[session.id]),
+            }, status=202)
+        messages.info(request, 'Photos received. Attendance will appear on the dashboard once recognition finishes.')
         return redirect('dashboard')
     
     return redirect('mark_attendance', class_id=class_id)
 
 
+@login_required(login_url='login')
+async def attendance_session_events(request, session_id):
+    """Server-Sent Events stream of an attendance session's processing status"""
+    from django.http import Http404, StreamingHttpResponse
+    from .models import AttendanceSession
+    from .session_events import stream
+    
+    user = await request.auser()
+    if not await AttendanceSession.objects.filter(id=session_id, created_by=user).aexists():
+        raise Http404('No such attendance session')
+    
+    response = StreamingHttpResponse(stream(session_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+
 @login_required(login_url='login')
 def mark_attendance_manual(request, class_id):
     """Handle manual attendance marking"""
-    from django.utils import timezone
+    from .db import atomic_with_retry, record_attendance
     
     class_obj = get_object_or_404(Class, id=class_id, created_by=request.user)
     
@@ -275,18 +247,11 @@ def mark_attendance_manual(request, class_id):
         )
         
         # Mark all students
-        for student in class_obj.students.all():
-            status = 'present' if str(student.id) in present_ids else 'absent'
-            Attendance.objects.update_or_create(
-                student=student,
-                class_session=class_obj,
-                date=timezone.now().date(),
-                defaults={
-                    'status': status,
-                    'marked_by': 'manual',
-                    'attendance_session': session
-                }
-            )
+        statuses = {
+            pk: 'present' if str(pk) in present_ids else 'absent'
+            for pk in class_obj.students.values_list('id', flat=True)
+        }
+        atomic_with_retry(record_attendance, class_obj, session, statuses, 'manual')
         
         messages.success(request, 'Attendance marked manually!')
         return redirect('dashboard')
@@ -294,10 +259,101 @@ def mark_attendance_manual(request, class_id):
     return redirect('mark_attendance', class_id=class_id)
 
 
+CAPTURE_SESSION_KEY = 'enrollment_capture'
+CAPTURE_STEPS = ('start', 'frame', 'complete', 'cancel')
+
+
+def _completed_capture(request, class_obj):
+    """Student ID whose face capture for this class completed in this browser session, or None"""
+    capture = request.session.get(CAPTURE_SESSION_KEY) or {}
+    if capture.get('code') == class_obj.enrollment_code and capture.get('complete'):
+        return capture['student_id']
+    return None
+
+
+def _create_enrollment(request, class_obj, data):
+    """
+    Enroll a student in a class after face capture, or by reusing the face
+    template they already have from another class.
+    
+    A student ID that already belongs to a person is only accepted with the
+    email that person enrolled with. Their name and email are never
+    changed here; a fresh capture just renews their template. A fresh
+    capture must have completed through enroll_capture in this session.
+    
+    Returns:
+        JsonResponse
+    """
+    from django.http import JsonResponse
+    from django.utils import timezone
+    from .db import atomic_with_retry
+    from .models import Person
+    from .face_api_client import FaceAPIClient
+    
+    name = data.get('name')
+    student_id = data.get('student_id')
+    email = data.get('email', '')
+    reuse_template = data.get('reuse_template', False)
+    
+    # Check if student already enrolled
+    if Student.objects.filter(student_id=student_id, class_enrolled=class_obj).exists():
+        return JsonResponse({'success': False, 'error': 'Already enrolled in this class'}, status=400)
+    
+    person = Person.objects.filter(student_id=student_id).first()
+    
+    if person is not None and not person.email_matches(email):
+        return JsonResponse({'success': False, 'error': 'This student ID is already registered with a different '
+                             'email. Ask your lecturer to enroll you.'}, status=400)
+    
+    if reuse_template:
+        if person is None or not person.has_valid_template():
+            return JsonResponse({'success': False, 'error': 'No saved face found. Please complete face capture.'}, status=400)
+        
+        # Face service builds the class encoding set from the shared template
+        result = FaceAPIClient(owner=class_obj.created_by_id).link_student_to_class(student_id, class_obj.enrollment_code)
+        if result.get('retry_after'):
+            response = JsonResponse({'success': False, 'error': 'Face service is busy, please try again shortly',
+                                     'retry_after': result['retry_after']}, status=503)
+            response['Retry-After'] = str(result['retry_after'])
+            return response
+        if not result['success']:
+            return JsonResponse({'success': False, 'error': f"Face service error: {result['error']}"}, status=502)
+    elif _completed_capture(request, class_obj) != student_id:
+        return JsonResponse({'success': False, 'error': 'Please complete face capture first'}, status=400)
+    
+    def save(person):
+        if person is None:
+            person = Person.objects.create(
+                student_id=student_id,
+                name=name,
+                email=email,
+                face_encoding='',  # Stored in FastAPI database
+                template_enrolled_at=timezone.now()
+            )
+        elif not reuse_template:
+            # Fresh capture by the same person: the face service re-enrolled their template
+            person.template_enrolled_at = timezone.now()
+            person.save(update_fields=['template_enrolled_at'])
+        
+        # Create student record
+        Student.objects.create(
+            person=person,
+            name=name,
+            student_id=student_id,
+            email=email,
+            class_enrolled=class_obj
+        )
+    
+    atomic_with_retry(save, person)
+    request.session.pop(CAPTURE_SESSION_KEY, None)
+    
+    return JsonResponse({'success': True, 'message': 'Successfully enrolled!', 'reused_template': bool(reuse_template)})
+
+
+@ensure_csrf_cookie  # The page's fetch() calls read the token from the cookie
 def enroll_student(request, enrollment_code):
     """Student self-enrollment page with live webcam - accessed via unique link"""
     from django.http import JsonResponse
-    from django.conf import settings
     import json
     
     # Get the class by enrollment code
@@ -306,48 +362,133 @@ def enroll_student(request, enrollment_code):
     # Handle AJAX save request
     if request.method == 'POST' and request.headers.get('Content-Type') == 'application/json':
         try:
-            data = json.loads(request.body)
-            name = data.get('name')
-            student_id = data.get('student_id')
-            email = data.get('email', '')
-            
-            # Check if student already enrolled
-            if Student.objects.filter(student_id=student_id, class_enrolled=class_obj).exists():
-                return JsonResponse({'success': False, 'error': 'You are already enrolled in this class'}, status=400)
-            
-            # Create student record
-            Student.objects.create(
-                name=name,
-                student_id=student_id,
-                email=email,
-                class_enrolled=class_obj,
-                face_encoding=''  # Stored in FastAPI database
-            )
-            
-            return JsonResponse({'success': True, 'message': 'Successfully enrolled!'})
-            
+            return _create_enrollment(request, class_obj, json.loads(request.body))
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
     
     context = {
         'class': class_obj,
-        'FACE_API_URL': getattr(settings, 'FACE_API_URL', 'http://localhost:8001'),
     }
     return render(request, 'face_recognition/enroll_student.html', context)
 
 
+def enroll_template_status(request, enrollment_code):
+    """
+    Tell the enrollment page whether a student can skip face capture
+    
+    Both answers are only ever true for a student ID given together with its
+    enrollment email, so the page can't be used to probe which IDs exist.
+    """
+    from django.http import JsonResponse
+    from .models import Person
+    
+    class_obj = get_object_or_404(Class, enrollment_code=enrollment_code)
+    student_id = request.GET.get('student_id', '').strip()
+    email = request.GET.get('email', '')
+    
+    person = Person.objects.filter(student_id=student_id).first() if student_id and email.strip() else None
+    return JsonResponse({
+        'success': True,
+        'has_template': bool(person and person.email_matches(email) and person.has_valid_template()),
+        'already_enrolled': bool(person) and Student.objects.filter(
+            student_id=student_id, class_enrolled=class_obj, email__iexact=email.strip()
+        ).exists(),
+    })
+
+
+def enroll_capture(request, enrollment_code, step):
+    """
+    One step of the pose-based face capture on the enrollment pages,
+    relayed to the face service
+    
+    Completing a capture saves the face template the student ID shares
+    across classes, so the browser never talks to the face service itself.
+    start checks the student ID like saving the enrollment does (an
+    existing person's ID only with their enrollment email) and remembers it
+    in the session; frame, complete and cancel only ever act on that ID.
+    The calls wait in the light admission pool, owned by the lecturer, and
+    a full pool answers 503 with Retry-After.
+    
+    Returns:
+        JsonResponse: the face service's answer, or success False with a
+        message
+    """
+    from django.http import JsonResponse
+    from .face_api_client import FaceAPIClient
+    from .models import Person
+    import json
+    
+    class_obj = get_object_or_404(Class, enrollment_code=enrollment_code)
+    if request.method != 'POST' or step not in CAPTURE_STEPS:
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=400)
+    
+    client = FaceAPIClient(owner=class_obj.created_by_id)
+    capture = request.session.get(CAPTURE_SESSION_KEY) or {}
+    
+    if step == 'start':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            data = {}
+        student_id = str(data.get('student_id') or '').strip()
+        email = str(data.get('email') or '')
+        if not student_id:
+            return JsonResponse({'success': False, 'message': 'Student ID is required'}, status=400)
+        if Student.objects.filter(student_id=student_id, class_enrolled=class_obj).exists():
+            return JsonResponse({'success': False, 'message': 'Already enrolled in this class'}, status=400)
+        person = Person.objects.filter(student_id=student_id).first()
+        if person is not None and not person.email_matches(email):
+            return JsonResponse({'success': False, 'message': 'This student ID is already registered with a '
+                                 'different email. Ask your lecturer to enroll you.'}, status=400)
+        
+        if capture.get('student_id'):
+            client.cancel_enrollment(capture['student_id'])  # Drop this browser's previous capture
+        client.cancel_enrollment(student_id)
+        result = client.start_enrollment_session(student_id)
+        if result['success']:
+            request.session[CAPTURE_SESSION_KEY] = {
+                'code': enrollment_code, 'student_id': student_id, 'email': email.strip(), 'complete': False
+            }
+    elif capture.get('code') != enrollment_code:
+        return JsonResponse({'success': False, 'message': 'No face capture in progress'}, status=400)
+    elif step == 'frame':
+        frame = request.FILES.get('file')
+        if frame is None:
+            return JsonResponse({'success': False, 'message': 'No frame received'}, status=400)
+        result = client.process_enrollment_frame(capture['student_id'], (frame.name, frame, frame.content_type))
+    elif step == 'complete':
+        person = Person.objects.filter(student_id=capture['student_id']).first()
+        if person is not None and not person.email_matches(capture['email']):  # Registered since start
+            client.cancel_enrollment(capture['student_id'])
+            request.session.pop(CAPTURE_SESSION_KEY, None)
+            return JsonResponse({'success': False, 'message': 'This student ID is already registered with a '
+                                 'different email. Ask your lecturer to enroll you.'}, status=400)
+        result = client.complete_enrollment(capture['student_id'])
+        if result['success']:
+            request.session[CAPTURE_SESSION_KEY] = {**capture, 'complete': True}
+    else:
+        result = client.cancel_enrollment(capture['student_id'])
+        request.session.pop(CAPTURE_SESSION_KEY, None)
+    
+    if result.get('retry_after'):
+        response = JsonResponse({'success': False, 'message': 'Face service is busy, please try again shortly',
+                                 'retry_after': result['retry_after']}, status=503)
+        response['Retry-After'] = str(result['retry_after'])
+        return response
+    if not result['success']:
+        return JsonResponse({'success': False, 'message': f"Face service error: {result['error']}"}, status=502)
+    return JsonResponse(result['data'])
+
+
 @login_required(login_url='login')
 def enroll_student_manual(request, class_id):
     """
     Manual student enrollment by lecturer using live camera
     """
-    from django.conf import settings
-    
     class_obj = get_object_or_404(Class, id=class_id, created_by=request.user)
     
     context = {
         'class': class_obj,
-        'FACE_API_URL': getattr(settings, 'FACE_API_URL', 'http://localhost:8001'),
     }
     return render(request, 'face_recognition/enroll_manual.html', context)
 
@@ -363,29 +504,11 @@ def save_enrollment(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            name = data.get('name')
-            student_id = data.get('student_id')
-            email = data.get('email', '')
-            class_id = data.get('class_id')
-            enrollment_code = data.get('enrollment_code')
             
             # Get class
-            class_obj = Class.objects.get(id=class_id, created_by=request.user)
-            
-            # Check if student already exists
-            if Student.objects.filter(student_id=student_id, class_enrolled=class_obj).exists():
-                return JsonResponse({'success': False, 'error': 'Student already enrolled'}, status=400)
-            
-            # Create student record
-            Student.objects.create(
-                name=name,
-                student_id=student_id,
-                email=email,
-                class_enrolled=class_obj,
-                face_encoding=''  # Stored in FastAPI database
-            )
+            class_obj = Class.objects.get(id=data.get('class_id'), created_by=request.user)
             
-            return JsonResponse({'success': True, 'message': 'Student enrolled successfully'})
+            return _create_enrollment(request, class_obj, data)
             
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -393,6 +516,299 @@ def save_enrollment(request):
     return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=400)
 
 
+@login_required(login_url='login')
+def bulk_import(request, class_id):
+    """
+    Bulk roster import - CSV roster plus a ZIP of photos per student.
+    Validates everything up front, then enrolls faces in the background.
+    """
+    from django.http import JsonResponse
+    from .roster_import import RosterConflict, parse_roster, create_roster_import, start_roster_import
+
+    class_obj = get_object_or_404(Class, id=class_id, created_by=request.user)
+
+    if request.method == 'POST':
+        roster = request.FILES.get('roster')
+        photos = request.FILES.get('photos')
+
+        if not roster or not photos:
+            return JsonResponse({'success': False, 'error': 'Please upload the roster CSV and the photos ZIP'}, status=400)
+
+        rows, errors = parse_roster(roster, photos, class_obj)
+        if errors:
+            return JsonResponse({'success': False, 'error': 'Roster has errors', 'errors': errors}, status=400)
+
+        try:
+            roster_import = create_roster_import(class_obj, request.user, rows, photos)
+        except RosterConflict as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        start_roster_import(roster_import.id)
+
+        return JsonResponse({'success': True, 'import_id': roster_import.id, 'total': roster_import.total})
+
+    context = {
+        'class': class_obj,
+        'imports': class_obj.roster_imports.order_by('-created_at')[:5],
+    }
+    return render(request, 'face_recognition/bulk_import.html', context)
+
+
+@login_required(login_url='login')
+def bulk_import_status(request, import_id):
+    """JSON progress of a roster import, including per-line enrollment errors"""
+    from django.http import JsonResponse
+    from .models import RosterImport
+
+    roster_import = get_object_or_404(RosterImport, id=import_id, created_by=request.user)
+    failed_rows = roster_import.rows.filter(status='failed').select_related('student')
+
+    return JsonResponse({
+        'success': True,
+        'import_id': roster_import.id,
+        'status': roster_import.status,
+        'total': roster_import.total,
+        'enrolled': roster_import.enrolled,
+        'failed': roster_import.failed,
+        'students_per_minute': roster_import.students_per_minute(),
+        'errors': [
+            {'line': row.line_number, 'student_id': row.student.student_id, 'error': row.error}
+            for row in failed_rows
+        ],
+    })
+
+
+@login_required(login_url='login')
+def bulk_import_resume(request, import_id):
+    """Retry face enrollment for every line of an import that is not yet enrolled"""
+    from django.http import JsonResponse
+    from django.utils import timezone
+    from .models import RosterImport
+    from .roster_import import start_roster_import
+
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=400)
+
+    roster_import = get_object_or_404(RosterImport, id=import_id, created_by=request.user)
+    if roster_import.is_stale():
+        # The worker died mid-run; only the request that flips it back gets to resume it
+        RosterImport.objects.filter(
+            pk=roster_import.pk, status='running', progress_at=roster_import.progress_at
+        ).update(status='failed', finished_at=timezone.now())
+        roster_import.refresh_from_db()
+    if roster_import.status in ('running', 'completed'):
+        return JsonResponse({'success': False, 'error': f'Import is already {roster_import.status}'}, status=400)
+
+    start_roster_import(roster_import.id)
+    return JsonResponse({'success': True, 'import_id': roster_import.id})
+
+
+def _analytics_date_range(request):
+    """
+    Read ?start=YYYY-MM-DD&end=YYYY-MM-DD, defaulting to the last 30 days
+
+    Raises:
+        ValueError: If a date is malformed, start is after end or the range
+            is longer than ANALYTICS_MAX_DAYS
+    """
+    from django.conf import settings
+    from django.utils import timezone
+    from datetime import date, timedelta
+
+    today = timezone.now().date()
+    end = request.GET.get('end')
+    end = date.fromisoformat(end) if end else today
+    start = request.GET.get('start')
+    start = date.fromisoformat(start) if start else end - timedelta(days=29)
+    if start > end:
+        raise ValueError('start must be on or before end')
+    max_days = getattr(settings, 'ANALYTICS_MAX_DAYS', 366)
+    if (end - start).days >= max_days:
+        raise ValueError(f'The date range can be at most {max_days} days')
+    return start, end
+
+
+@login_required(login_url='login')
+def attendance_analytics(request):
+    """JSON attendance summary for every class owned by the lecturer"""
+    from django.http import JsonResponse
+    from .analytics import get_buckets, summarize_buckets
+
+    try:
+        start, end = _analytics_date_range(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    classes = []
+    for class_obj in Class.objects.filter(created_by=request.user).order_by('-created_at'):
+        summary = summarize_buckets(get_buckets(class_obj.id, start, end))
+        classes.append({
+            'class_id': class_obj.id,
+            'title': class_obj.title,
+            **summary['overall'],
+        })
+
+    return JsonResponse({
+        'success': True,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'classes': classes,
+    })
+
+
+@login_required(login_url='login')
+def class_analytics(request, class_id):
+    """JSON attendance rate, weekday pattern and per-student rates for one class"""
+    from django.http import JsonResponse
+    from .analytics import get_buckets, summarize_buckets, empty_summary
+
+    class_obj = get_object_or_404(Class, id=class_id, created_by=request.user)
+
+    try:
+        start, end = _analytics_date_range(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    summary = summarize_buckets(get_buckets(class_obj.id, start, end))
+    students = []
+    for student in class_obj.students.order_by('name'):
+        students.append({
+            'id': student.id,
+            'name': student.name,
+            'student_id': student.student_id,
+            **summary['students'].get(student.id, empty_summary()),
+        })
+
+    return JsonResponse({
+        'success': True,
+        'class_id': class_obj.id,
+        'title': class_obj.title,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'overall': summary['overall'],
+        'weekdays': summary['weekdays'],
+        'students': students,
+    })
+
+
+@login_required(login_url='login')
+def student_analytics(request, student_pk):
+    """JSON attendance rate, weekday pattern and method share for one student"""
+    from django.http import JsonResponse
+    from .analytics import get_buckets, summarize_buckets
+
+    student = get_object_or_404(
+        Student.objects.select_related('class_enrolled'),
+        id=student_pk,
+        class_enrolled__created_by=request.user,
+    )
+
+    try:
+        start, end = _analytics_date_range(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    summary = summarize_buckets(
+        get_buckets(student.class_enrolled_id, start, end),
+        student_id=student.id,
+    )
+
+    return JsonResponse({
+        'success': True,
+        'id': student.id,
+        'name': student.name,
+        'student_id': student.student_id,
+        'class_id': student.class_enrolled_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'overall': summary['overall'],
+        'weekdays': summary['weekdays'],
+    })
+
+
+@login_required(login_url='login')
+def search_students(request):
+    """JSON search-as-you-type over the lecturer's students in all their classes"""
+    from django.http import JsonResponse
+    from .student_search import search_students as find_students
+
+    query = request.GET.get('q', '').strip()[:100]
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'limit must be a number'}, status=400)
+
+    students, engine = find_students(request.user, query, limit)
+    return JsonResponse({
+        'success': True,
+        'query': query,
+        'engine': engine,
+        'results': [
+            {
+                'id': student.id,
+                'name': student.name,
+                'student_id': student.student_id,
+                'email': student.email,
+                'class_id': student.class_enrolled_id,
+                'class_title': student.class_enrolled.title,
+                'analytics_url': reverse('student_analytics', args=[student.id]),
+            }
+            for student in students
+        ],
+    })
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint - for staff users, or from METRICS_ALLOWED_IPS
+    
+    No address is allowed by default: behind a reverse proxy on the same
+    host every request comes from loopback.
+    """
+    from django.http import HttpResponse, HttpResponseForbidden
+    from django.conf import settings
+    from . import metrics as perf_metrics
+    
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', [])
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not request.user.is_staff:
+        return HttpResponseForbidden('Forbidden')
+    
+    return HttpResponse(perf_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def profiles_admin(request):
+    """Admin page listing captured request profiles"""
+    from django.contrib import admin
+    from django.conf import settings
+    from django.utils import timezone
+    from .profiling import list_profiles
+    
+    profiles = list_profiles()
+    for profile in profiles:
+        profile['modified'] = datetime.fromtimestamp(profile['modified'], tz=timezone.get_current_timezone())
+    
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiles,
+        'total_size': sum(p['size'] for p in profiles),
+        'profiler_enabled': getattr(settings, 'PROFILER_ENABLED', False),
+        'sample_rate': getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0),
+        'header': getattr(settings, 'PROFILER_HEADER', 'X-Profile'),
+    }
+    return render(request, 'face_recognition/admin_profiles.html', context)
+
+
+def profile_download(request, view_name, file_name):
+    """Download one captured profile file"""
+    from django.http import FileResponse, Http404
+    from .profiling import resolve_profile
+    
+    path = resolve_profile(view_name, file_name)
+    if path is None:
+        raise Http404('Profile not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{view_name}-{file_name}')
+
+
 @login_required(login_url='login')
 def logout_view(request):
     logout(request)
@@ -41,11 +41,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'face_recognition.middleware.StaticFilesMiddleware',
+    'face_recognition.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'face_recognition.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,13 +59,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Always compile templates once per process. runserver's autoreloader
+            # still clears this cache when a template file changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -73,10 +83,52 @@ WSGI_APPLICATION = 'identiface.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned for concurrent requests: WAL lets readers run alongside the
+# single writer, and IMMEDIATE transactions take the write lock up front so
+# a busy database makes BEGIN wait (up to "timeout" seconds) instead of
+# failing mid-transaction. Connections are kept open, so the pragmas only
+# run once per connection.
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',  # Durable across app crashes; fsync only at checkpoints
+    'PRAGMA cache_size=-20000',  # 20 MB page cache per connection
+    'PRAGMA mmap_size=134217728',  # 128 MB memory-mapped reads
+    'PRAGMA temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+        },
+        # A file, not the in-memory default, so tests with live server threads
+        # run in WAL mode like production instead of failing with "database
+        # table is locked" (in-memory shared cache has no busy timeout)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+
+# The dashboard and analytics caches are invalidated by version stamps kept
+# in the cache, so every worker process must see the same cache: a file
+# cache is shared by the workers on one host (use Redis or Memcached across
+# hosts). Analytics keeps one entry per (class, month) plus its stamp, and
+# the dashboard a few per lecturer. The file cache lists its directory
+# before every write, so keep MAX_ENTRIES in the thousands.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
@@ -116,6 +168,20 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic writes content-hashed copies plus .gz/.br versions (brotli if
+# installed) to STATIC_ROOT; StaticFilesMiddleware serves them with far-future
+# cache headers. With DEBUG on, runserver serves the app directories as-is.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'face_recognition.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+STATIC_MAX_AGE = 365 * 24 * 60 * 60  # Hashed names never change
+SERVE_STATIC = True  # Set to False when nginx etc. serves STATIC_URL from STATIC_ROOT
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -129,6 +195,46 @@ LOGOUT_REDIRECT_URL = 'landing_page'
 
 # Face Recognition API Configuration
 FACE_API_URL = 'http://localhost:8001'  # FastAPI face service URL
+FACE_API_BATCH_MAX_BYTES = 20 * 1024 * 1024  # Max image bytes per /api/enroll/batch request
+FACE_API_BATCH_MAX_STUDENTS = 50  # Max students per /api/enroll/batch request
+FACE_TEMPLATE_MAX_AGE_DAYS = 365  # Face templates older than this must be captured again (None = never expire)
+
+# Admission control for face service calls (face_recognition/admission.py).
+# Heavy calls (classroom recognition, enrollment uploads) and light calls
+# (enrollment frames/sessions, template links) get separate slot pools, so
+# a roll-call burst can't hold up enrollment. max_wait is seconds before a
+# queued call is rejected with a retry-after hint. None disables limiting.
+FACE_API_ADMISSION = {
+    'heavy': {'max_in_flight': 4, 'max_queue': 32, 'max_wait': 30},
+    'light': {'max_in_flight': 16, 'max_queue': 64, 'max_wait': 5},
+}
+FACE_API_ADMISSION_DIR = None  # Slot/queue lock files; defaults to <tmp>/identiface-face-admission, shared by every worker on the host
+
+# Idempotent face service reads (e.g. class encodings): concurrent identical
+# calls share one request; results are served from the cache for
+# FACE_API_READ_CACHE_TTL seconds, then served stale for up to
+# FACE_API_READ_STALE_TTL more while one background call refreshes them.
+FACE_API_READ_CACHE_TTL = 5  # 0 = coalesce only, never cache
+FACE_API_READ_STALE_TTL = 30
+
+# Live attendance-session status streams (Server-Sent Events, needs ASGI).
+# Each process checks for status changes made by other processes this often
+# while any stream is open; comments keep idle connections alive.
+SESSION_EVENTS_POLL_INTERVAL = 1.0
+SESSION_EVENTS_KEEPALIVE = 15
+# An unfinished session whose status hasn't changed for this long lost its
+# worker (e.g. a restart) and is marked failed; see expire_attendance_sessions
+SESSION_PROCESSING_TIMEOUT = 300
+
+# Video / burst attendance: frames scored per upload (videos are sampled at
+# KEYFRAME_SAMPLE_FPS) and scene candidates kept for the final pick of three
+KEYFRAME_SAMPLE_FPS = 10
+KEYFRAME_MAX_FRAMES = 600
+KEYFRAME_POOL_SIZE = 12
+
+# Lecturers with more students than this search them through the SQLite
+# full-text index; smaller rosters are scanned with LIKE (student_search.py)
+STUDENT_SEARCH_SCAN_LIMIT = 5000
 
 # CORS Settings for cross-origin requests from frontend
 CORS_ALLOWED_ORIGINS = [
@@ -151,3 +257,53 @@ CSRF_TRUSTED_ORIGINS = [
 # File upload settings
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
+
+# Attendance analytics: cache lifetime (seconds) of per-month aggregates. Edits
+# to past attendance replace the version stamp of the (class, month) instead.
+ANALYTICS_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+ANALYTICS_MAX_DAYS = 366  # Longest ?start..end range the analytics API accepts
+
+# Bulk roster import: concurrent FastAPI enrollment calls, and how many
+# finished students to batch per progress write.
+BULK_ENROLL_WORKERS = 4
+BULK_ENROLL_PROGRESS_EVERY = 10
+BULK_ENROLL_STALE_AFTER = 600  # Seconds without progress before a running import counts as crashed
+
+# Performance metrics (served at /metrics in Prometheus text format)
+# Addresses that may scrape /metrics without logging in as staff, e.g. the
+# Prometheus server. Leave loopback out when a reverse proxy runs on the
+# same host: every proxied request comes from 127.0.0.1.
+METRICS_ALLOWED_IPS = []
+METRICS_MULTIPROC_DIR = None  # Shared directory when running several worker processes
+METRICS_DUMP_INTERVAL = 1.0  # Seconds between per-process dumps to METRICS_MULTIPROC_DIR
+PERF_DEFAULT_QUERY_BUDGET = 50  # Max DB queries per request before it is flagged (None = no limit)
+PERF_QUERY_BUDGETS = {
+    'dashboard': 20,
+    'mark_attendance': 10,
+    'mark_attendance_facial': 20,
+    'mark_attendance_manual': 20,
+    'save_enrollment': 10,
+    'search_students': 5,
+}
+
+# Request profiling (face_recognition.middleware.ProfilingMiddleware)
+# Off by default; when off the middleware removes itself from the chain.
+PROFILER_ENABLED = False
+PROFILER_SAMPLE_RATE = 0.0  # Fraction of requests to profile, e.g. 0.01
+PROFILER_HEADER = 'X-Profile'  # Staff users can send "X-Profile: 1" to profile one request
+PROFILER_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILER_DIR = BASE_DIR / 'profiles'
+PROFILER_MAX_BYTES = 100 * 1024 * 1024  # Oldest profiles are deleted above this
+
+# Write transactions that still find SQLite locked after its own timeout
+# are retried this many times with jittered exponential backoff
+# (face_recognition.db.atomic_with_retry).
+DB_BUSY_RETRIES = 3
+DB_BUSY_BACKOFF = 0.05  # Seconds before the first retry
+DB_UPDATE_BATCH_SIZE = 20000  # Rows per transaction in admin bulk updates (db.update_in_batches)
+
+# Dashboard fragment caching (face_recognition.dashboard). Fragments are
+# invalidated by version stamps whenever their data changes; the timeout
+# only bounds how long an unused fragment is kept. The stamps are shared
+# through CACHES, so every worker process sees an invalidation.
+DASHBOARD_FRAGMENT_TIMEOUT = 300
@@ -15,9 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
 from django.urls import path,include
+from face_recognition import views as face_views
 
 urlpatterns = [
+    path('admin/profiles/', staff_member_required(face_views.profiles_admin), name='profiles_admin'),
+    path('admin/profiles/<str:view_name>/<str:file_name>', staff_member_required(face_views.profile_download), name='profile_download'),
     path('admin/', admin.site.urls),
     path('', include('face_recognition.urls')), 
 ]